@@ -1,43 +1,23 @@
 #!/usr/bin/env python3
-"""Generate correlation plots for all MolProbity and PoseBusters continuous metrics."""
+"""Generate correlation plots for all MolProbity and PoseBusters continuous metrics.
 
-import pandas as pd
+Paired data come from the summary cubes, or from the query service when it is
+running. Each plot is a figure job (see figure_jobs.py): jobs render across a
+process pool, unchanged plots are skipped unless --force, and --plot-mode
+hexbin or hist2d draws density grids instead of points.
+"""
+
+import argparse
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
-from scipy import stats
+from density_plots import PLOT_MODES, Layer, scatter_panel
+from figure_jobs import MANIFEST, WORKERS, FigureJob, run_jobs, summarize
+from paired_deltas import metric_deltas
+from query_service import connect
 
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
 FIGURES_DIR = Path(__file__).parent.parent / "figures"
 
-# Load data
-mp_df = pd.read_csv(RESULTS_DIR / "molprobity_full.csv")
-
-# Load PoseBusters from per-protein directories (has protein column)
-PROTEINS_DIR = Path(__file__).parent.parent / "proteins"
-pb_dfs = []
-for protein_dir in sorted(PROTEINS_DIR.iterdir()):
-    if not protein_dir.is_dir():
-        continue
-    pb_file = protein_dir / "analysis" / "posebusters_raw.csv"
-    if pb_file.exists():
-        df = pd.read_csv(pb_file)
-        df['protein'] = protein_dir.name
-        pb_dfs.append(df)
-pb_df = pd.concat(pb_dfs, ignore_index=True) if pb_dfs else pd.DataFrame()
-
-# Load PoseBusters pass/fail from per-protein directories
-pb_pf_dfs = []
-for protein_dir in sorted(PROTEINS_DIR.iterdir()):
-    if not protein_dir.is_dir():
-        continue
-    pb_file = protein_dir / "analysis" / "posebusters_results.csv"
-    if pb_file.exists():
-        df = pd.read_csv(pb_file)
-        df['protein'] = protein_dir.name
-        pb_pf_dfs.append(df)
-pb_pf_df = pd.concat(pb_pf_dfs, ignore_index=True) if pb_pf_dfs else pd.DataFrame()
-
 # MolProbity metrics - ALL 36 columns
 MP_METRICS = [
     # Core metrics
@@ -136,129 +116,20 @@ PB_PASSFAIL_METRICS = [
 ]
 
 
-def collect_metric_data(df, metric_col, category_col='category', subcat_col='subcategory',
-                        model_col='model', protein_col='protein', is_molprobity=True):
-    """Collect paired data for a metric: initial value vs change after relaxation."""
-    data = []
-
-    for category in ['Experimental', 'AlphaFold', 'Boltz']:
-        cat_df = df[df[category_col] == category]
-
-        if category == 'Experimental':
-            baseline = cat_df[cat_df[subcat_col] == 'original']
-            relaxed = cat_df[cat_df[subcat_col] == 'relaxed_normal_beta']
-
-            for protein in baseline[protein_col].unique():
-                base_val = baseline[baseline[protein_col] == protein][metric_col].mean()
-                rel_data = relaxed[relaxed[protein_col] == protein][metric_col]
-                if len(rel_data) == 0:
-                    continue
-                rel_mean = rel_data.mean()
-                change = rel_mean - base_val
-                change_min = rel_data.min() - base_val
-                change_max = rel_data.max() - base_val
-
-                if pd.notna(base_val) and pd.notna(rel_mean):
-                    data.append({
-                        'protein': protein,
-                        'category': category,
-                        'af_type': None,
-                        'initial': base_val,
-                        'final': rel_mean,
-                        'change': change,
-                        'change_lo': change - change_min,
-                        'change_hi': change_max - change,
-                    })
-
-        elif category == 'AlphaFold':
-            baseline = cat_df[cat_df[subcat_col] == 'raw']
-            relaxed = cat_df[cat_df[subcat_col] == 'relaxed_normal_beta']
-
-            for protein in baseline[protein_col].unique():
-                # ranked_0 (AMBER-relaxed)
-                if is_molprobity:
-                    base_r0 = baseline[(baseline[protein_col] == protein) & (baseline[model_col] == 'ranked_0')]
-                    rel_r0 = relaxed[(relaxed[protein_col] == protein) & (relaxed[model_col].str.startswith('ranked_0'))]
-                else:
-                    base_r0 = baseline[(baseline[protein_col] == protein) & (baseline[model_col] == 'model0')]
-                    rel_r0 = relaxed[(relaxed[protein_col] == protein) & (relaxed[model_col].str.startswith('ranked_0'))]
-
-                if len(base_r0) and len(rel_r0):
-                    base_val = base_r0[metric_col].mean()
-                    rel_mean = rel_r0[metric_col].mean()
-                    change = rel_mean - base_val
-                    change_min = rel_r0[metric_col].min() - base_val
-                    change_max = rel_r0[metric_col].max() - base_val
-
-                    if pd.notna(base_val) and pd.notna(rel_mean):
-                        data.append({
-                            'protein': protein,
-                            'category': category,
-                            'af_type': 'ranked_0 (AMBER)',
-                            'initial': base_val,
-                            'final': rel_mean,
-                            'change': change,
-                            'change_lo': change - change_min,
-                            'change_hi': change_max - change,
-                        })
-
-                # ranked_1-4 (unrelaxed)
-                if is_molprobity:
-                    base_rest = baseline[(baseline[protein_col] == protein) & (~baseline[model_col].isin(['ranked_0']))]
-                    rel_rest = relaxed[(relaxed[protein_col] == protein) & (~relaxed[model_col].str.startswith('ranked_0'))]
-                else:
-                    base_rest = baseline[(baseline[protein_col] == protein) & (~baseline[model_col].isin(['model0']))]
-                    rel_rest = relaxed[(relaxed[protein_col] == protein) & (~relaxed[model_col].str.startswith('ranked_0'))]
-
-                if len(base_rest) and len(rel_rest):
-                    base_val = base_rest[metric_col].mean()
-                    rel_mean = rel_rest[metric_col].mean()
-                    change = rel_mean - base_val
-                    change_min = rel_rest[metric_col].min() - base_val
-                    change_max = rel_rest[metric_col].max() - base_val
-
-                    if pd.notna(base_val) and pd.notna(rel_mean):
-                        data.append({
-                            'protein': protein,
-                            'category': category,
-                            'af_type': 'ranked_1-4 (unrelaxed)',
-                            'initial': base_val,
-                            'final': rel_mean,
-                            'change': change,
-                            'change_lo': change - change_min,
-                            'change_hi': change_max - change,
-                        })
-        else:  # Boltz
-            baseline = cat_df[cat_df[subcat_col] == 'raw']
-            relaxed = cat_df[cat_df[subcat_col] == 'relaxed_normal_beta']
-
-            for protein in baseline[protein_col].unique():
-                base_val = baseline[baseline[protein_col] == protein][metric_col].mean()
-                rel_data = relaxed[relaxed[protein_col] == protein][metric_col]
-                if len(rel_data) == 0:
-                    continue
-                rel_mean = rel_data.mean()
-                change = rel_mean - base_val
-                change_min = rel_data.min() - base_val
-                change_max = rel_data.max() - base_val
-
-                if pd.notna(base_val) and pd.notna(rel_mean):
-                    data.append({
-                        'protein': protein,
-                        'category': category,
-                        'af_type': None,
-                        'initial': base_val,
-                        'final': rel_mean,
-                        'change': change,
-                        'change_lo': change - change_min,
-                        'change_hi': change_max - change,
-                    })
-
-    return pd.DataFrame(data)
-
-
-def plot_correlation(data_df, metric_name, lower_is_better, filename):
-    """Create 3-panel correlation plot."""
+def collect_metric_data(pairs, metric_col):
+    """Paired data for a metric (initial value vs change after relaxation) from a pairing table."""
+    return metric_deltas(pairs, metric_col).drop(columns='protocol')
+
+
+def plot_correlation(data_df, metric_name, lower_is_better, filename, mode='auto'):
+    """Create 3-panel correlation plot (mode: see density_plots.PLOT_MODES).
+
+    Returns the overall r and p and, per category, r_{category}/p_{category}
+    (NaN when the category has too little data).
+    """
+    import matplotlib.pyplot as plt
+    from scipy import stats
+    panel_stats = {}
     fig, axes = plt.subplots(1, 3, figsize=(15, 5))
     colors = {'Experimental': 'green', 'AlphaFold': 'blue', 'Boltz': 'red'}
 
@@ -277,24 +148,16 @@ def plot_correlation(data_df, metric_name, lower_is_better, filename):
             continue
 
         if cat == 'AlphaFold':
-            r0_data = cat_data[cat_data['af_type'] == 'ranked_0 (AMBER)']
-            rest_data = cat_data[cat_data['af_type'] == 'ranked_1-4 (unrelaxed)']
-
-            if len(r0_data):
-                ax.errorbar(r0_data['initial'], r0_data['change'],
-                            yerr=[r0_data['change_lo'].clip(lower=0), r0_data['change_hi'].clip(lower=0)],
-                            fmt='o', c='black', alpha=0.7, markersize=8,
-                            label='ranked_0 (AMBER)', capsize=3)
-            if len(rest_data):
-                ax.errorbar(rest_data['initial'], rest_data['change'],
-                            yerr=[rest_data['change_lo'].clip(lower=0), rest_data['change_hi'].clip(lower=0)],
-                            fmt='o', c='darkblue', alpha=0.7, markersize=8,
-                            label='ranked_1-4 (unrelaxed)', capsize=3)
-            ax.legend(loc='best', fontsize=7)
+            parts = [(cat_data[cat_data['af_type'] == 'ranked_0 (AMBER)'], 'black', 'ranked_0 (AMBER)'),
+                     (cat_data[cat_data['af_type'] == 'ranked_1-4 (unrelaxed)'], 'darkblue', 'ranked_1-4 (unrelaxed)')]
         else:
-            ax.errorbar(cat_data['initial'], cat_data['change'],
-                        yerr=[cat_data['change_lo'].clip(lower=0), cat_data['change_hi'].clip(lower=0)],
-                        fmt='o', c=colors[cat], alpha=0.7, markersize=8, capsize=3)
+            parts = [(cat_data, colors[cat], None)]
+        layers = [Layer(part['initial'], part['change'], color, label,
+                        yerr=[part['change_lo'].clip(lower=0), part['change_hi'].clip(lower=0)])
+                  for part, color, label in parts if len(part)]
+        handles = scatter_panel(ax, layers, mode, alpha=0.7, size=64, capsize=3)
+        if handles:
+            ax.legend(handles=handles, loc='best', fontsize=7)
 
         ax.axhline(0, color='black', linestyle='--', alpha=0.5)
         ax.set_xlabel(f'Initial {metric_name}')
@@ -305,6 +168,7 @@ def plot_correlation(data_df, metric_name, lower_is_better, filename):
         # Correlation for this category
         if len(cat_data) > 2 and cat_data['initial'].std() > 0 and cat_data['change'].std() > 0:
             r, p = stats.pearsonr(cat_data['initial'], cat_data['change'])
+            panel_stats[f'r_{cat}'], panel_stats[f'p_{cat}'] = r, p
             ax.set_title(f'{cat} (r={r:.2f})')
         else:
             ax.set_title(f'{cat}')
@@ -324,66 +188,70 @@ def plot_correlation(data_df, metric_name, lower_is_better, filename):
     plt.savefig(FIGURES_DIR / filename, dpi=150)
     plt.close()
 
-    return r_all, p_all
+    return {'r': r_all, 'p': p_all, **panel_stats}
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Correlation plots for every metric")
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS, help='Render processes')
+    parser.add_argument('--plot-mode', choices=PLOT_MODES, default='auto',
+                        help='Panels as points or density grids (auto: by point count)')
+    parser.add_argument('--force', action='store_true', help='Re-render unchanged plots too')
+    parser.add_argument('--stale', action='store_true', help='List plots that need re-rendering, render nothing')
+    args = parser.parse_args()
+
     print("=" * 70)
     print("GENERATING CORRELATION PLOTS FOR ALL METRICS")
     print("=" * 70)
 
-    results = []
-
-    # MolProbity metrics
-    print("\n--- MolProbity Metrics ---")
-    for col, name, lower_better in MP_METRICS:
-        if col not in mp_df.columns:
-            print(f"  {name}: column not found, skipping")
-            continue
-
-        data = collect_metric_data(mp_df, col, is_molprobity=True)
-        if len(data) == 0:
-            print(f"  {name}: no data")
-            continue
-
-        filename = f'corr_mp_{col}.png'
-        r, p = plot_correlation(data, name, lower_better, filename)
-        print(f"  {name}: r={r:.3f}, p={p:.6f} -> {filename}")
-        results.append({'metric': name, 'source': 'MolProbity', 'r': r, 'p': p, 'lower_better': lower_better})
-
-    # PoseBusters RAW metrics
-    print("\n--- PoseBusters RAW Continuous Metrics ---")
-    for col, name, lower_better in PB_RAW_METRICS:
-        if col not in pb_df.columns:
-            print(f"  {name}: column not found, skipping")
-            continue
-
-        data = collect_metric_data(pb_df, col, is_molprobity=False)
-        if len(data) == 0:
-            print(f"  {name}: no data")
-            continue
-
-        filename = f'corr_pbraw_{col.replace("raw_", "")}.png'
-        r, p = plot_correlation(data, name, lower_better, filename)
-        print(f"  {name}: r={r:.3f}, p={p:.6f} -> {filename}")
-        results.append({'metric': name, 'source': 'PB-Raw', 'r': r, 'p': p, 'lower_better': lower_better})
-
-    # PoseBusters PASS/FAIL metrics
-    print("\n--- PoseBusters Pass/Fail Metrics ---")
-    for col, name, lower_better in PB_PASSFAIL_METRICS:
-        if col not in pb_pf_df.columns:
-            print(f"  {name}: column not found, skipping")
-            continue
-
-        data = collect_metric_data(pb_pf_df, col, is_molprobity=False)
-        if len(data) == 0:
-            print(f"  {name}: no data")
-            continue
-
-        filename = f'corr_pbpf_{col}.png'
-        r, p = plot_correlation(data, name, lower_better, filename)
-        print(f"  {name}: r={r:.3f}, p={p:.6f} -> {filename}")
-        results.append({'metric': name, 'source': 'PB-PassFail', 'r': r, 'p': p, 'lower_better': lower_better})
+    # Baseline vs relaxed aggregates for every metric, rolled up once per source
+    queries = connect()
+    mp_pairs = queries.pairing_table('molprobity', [c for c, _, _ in MP_METRICS])
+    pb_pairs = queries.pairing_table('posebusters', [c for c, _, _ in PB_RAW_METRICS + PB_PASSFAIL_METRICS])
+
+    # One figure job per metric, with its paired data precomputed
+    groups = [
+        ('MolProbity', 'MolProbity', MP_METRICS, mp_pairs, lambda col: f'corr_mp_{col}.png'),
+        ('PoseBusters RAW Continuous', 'PB-Raw', PB_RAW_METRICS, pb_pairs,
+         lambda col: f'corr_pbraw_{col.replace("raw_", "")}.png'),
+        ('PoseBusters Pass/Fail', 'PB-PassFail', PB_PASSFAIL_METRICS, pb_pairs,
+         lambda col: f'corr_pbpf_{col}.png'),
+    ]
+    jobs = []
+    for title, source, metrics, pairs, figure_name in groups:
+        print(f"\n--- {title} Metrics ---")
+        for col, name, lower_better in metrics:
+            if f'{col}_baseline' not in pairs.columns:
+                print(f"  {name}: column not found, skipping")
+                continue
+
+            data = collect_metric_data(pairs, col)
+            if len(data) == 0:
+                print(f"  {name}: no data")
+                continue
+
+            filename = figure_name(col)
+            jobs.append(FigureJob(filename, plot_correlation, (data, name, lower_better, filename, args.plot_mode),
+                                  labels={'metric': name, 'source': source, 'lower_better': lower_better},
+                                  path=FIGURES_DIR / filename))
+        print(f"  {sum(job.labels['source'] == source for job in jobs)} plots queued")
+
+    manifest = FIGURES_DIR / MANIFEST
+    if args.stale:
+        table = run_jobs(jobs, manifest=manifest, force=args.force, dry_run=True)
+        stale = table[table['status'] == 'stale']
+        print(f"\n{len(stale)} of {len(jobs)} plots stale")
+        for figure in stale['figure']:
+            print(f"  {figure}")
+        return
+
+    print(f"\nRendering {len(jobs)} plots with {args.workers} workers...")
+    table = run_jobs(jobs, args.workers, manifest=manifest, force=args.force)
+    print(f"  {summarize(table)}")
+    for _, row in table.iterrows():
+        print(f"  {row['metric']}: r={row['r']:.3f}, p={row['p']:.6f} -> {row['figure']}")
+    table.to_csv(FIGURES_DIR / "correlation_summary.csv", index=False)
+    print("Saved correlation_summary.csv")
 
     # Summary table
     print("\n" + "=" * 70)
@@ -392,7 +260,7 @@ def main():
     print(f"\n{'Metric':<35} {'r':>8} {'p-value':>12} {'Interpretation':<30}")
     print("-" * 90)
 
-    for res in results:
+    for _, res in table.iterrows():
         if res['r'] < -0.7:
             interp = "Strong convergence (regression to mean)"
         elif res['r'] < -0.3:
@@ -404,7 +272,7 @@ def main():
 
         print(f"{res['metric']:<35} {res['r']:>8.3f} {res['p']:>12.6f} {interp:<30}")
 
-    print(f"\nGenerated {len(results)} correlation plots in figures/")
+    print(f"\nGenerated {len(table)} correlation plots in figures/")
 
 
 if __name__ == "__main__":
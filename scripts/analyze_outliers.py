@@ -1,20 +1,22 @@
 #!/usr/bin/env python3
 """Analyze why certain structures degrade after relaxation."""
 
+import argparse
 import pandas as pd
 from pathlib import Path
+from datasets import load_dataset
+from results_store import KEYS
 
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
 
-df = pd.read_csv(RESULTS_DIR / "molprobity_full.csv")
-
 outliers = ['2I25', '1AY7', '1AVX', '1VFB', '1BVN']
 
-print("=" * 60)
-print("OUTLIER ANALYSIS: Structures that got worse after relaxation")
-print("=" * 60)
+metrics = ['clashscore', 'rama_outliers_pct', 'rota_outliers_pct', 'cbeta_outliers',
+           'bond_rmsz', 'angle_rmsz', 'molprobity_score']
+
 
-for prot in outliers:
+def print_outlier(df: pd.DataFrame, prot: str):
+    """Unrelaxed vs relaxed_normal_beta means of one protein, per source."""
     prot_df = df[df['protein'] == prot]
     print(f'\n{"=" * 40}')
     print(f'{prot}')
@@ -42,22 +44,40 @@ for prot in outliers:
         print(f'    Angle RMSZ: {raw["angle_rmsz"].mean():.2f} → {relaxed["angle_rmsz"].mean():.2f}')
         print(f'    MolProbity: {raw["molprobity_score"].mean():.2f} → {relaxed["molprobity_score"].mean():.2f}')
 
-# Summary table
-print("\n" + "=" * 60)
-print("METRIC BREAKDOWN FOR WORST CASE: 2I25 Experimental")
-print("=" * 60)
 
-prot_df = df[(df['protein'] == '2I25') & (df['category'] == 'Experimental')]
-orig = prot_df[prot_df['subcategory'] == 'original']
-relax = prot_df[prot_df['subcategory'] == 'relaxed_normal_beta']
+def print_breakdown(df: pd.DataFrame, prot: str = '2I25', category: str = 'Experimental'):
+    """Every metric of one structure group, original vs relaxed_normal_beta."""
+    prot_df = df[(df['protein'] == prot) & (df['category'] == category)]
+    orig = prot_df[prot_df['subcategory'] == 'original']
+    relax = prot_df[prot_df['subcategory'] == 'relaxed_normal_beta']
+
+    print(f'{"Metric":<20} {"Original":>10} {"Relaxed":>10} {"Change":>10}')
+    print("-" * 52)
+    for m in metrics:
+        o = orig[m].mean()
+        r = relax[m].mean()
+        change = r - o
+        print(f'{m:<20} {o:>10.2f} {r:>10.2f} {change:>+10.2f}')
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__).parse_args()
+
+    df = load_dataset('molprobity', KEYS + metrics, {'protein': outliers})
+
+    print("=" * 60)
+    print("OUTLIER ANALYSIS: Structures that got worse after relaxation")
+    print("=" * 60)
+
+    for prot in outliers:
+        print_outlier(df, prot)
+
+    # Summary table
+    print("\n" + "=" * 60)
+    print("METRIC BREAKDOWN FOR WORST CASE: 2I25 Experimental")
+    print("=" * 60)
+    print_breakdown(df)
 
-metrics = ['clashscore', 'rama_outliers_pct', 'rota_outliers_pct', 'cbeta_outliers',
-           'bond_rmsz', 'angle_rmsz', 'molprobity_score']
 
-print(f'{"Metric":<20} {"Original":>10} {"Relaxed":>10} {"Change":>10}')
-print("-" * 52)
-for m in metrics:
-    o = orig[m].mean()
-    r = relax[m].mean()
-    change = r - o
-    print(f'{m:<20} {o:>10.2f} {r:>10.2f} {change:>+10.2f}')
+if __name__ == "__main__":
+    main()
@@ -4,138 +4,133 @@ Characterize structures that got WORSE after relaxation.
 Question under test: are they all AF? Is it a ceiling effect?
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
+from query_service import connect
 
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
 FIGURES_DIR = Path(__file__).parent.parent / "figures"
 
-df = pd.read_csv(RESULTS_DIR / "molprobity_full.csv")
-
-# Collect structures that degraded
-degraded = []
-improved = []
-
-for category in ['Experimental', 'AlphaFold', 'Boltz']:
-    cat_df = df[df['category'] == category]
-
-    if category == 'Experimental':
-        baseline = cat_df[cat_df['subcategory'] == 'original']
-    else:
-        baseline = cat_df[cat_df['subcategory'] == 'raw']
-
-    relaxed = cat_df[cat_df['subcategory'] == 'relaxed_normal_beta']
-
-    for protein in baseline['protein'].unique():
-        base_score = baseline[baseline['protein'] == protein]['molprobity_score'].mean()
-        rel_score = relaxed[relaxed['protein'] == protein]['molprobity_score'].mean()
-        base_clash = baseline[baseline['protein'] == protein]['clashscore'].mean()
-
-        if pd.notna(base_score) and pd.notna(rel_score):
-            change = rel_score - base_score
-            record = {
-                'protein': protein,
-                'category': category,
-                'initial_molprobity': base_score,
-                'final_molprobity': rel_score,
-                'change': change,
-                'initial_clashscore': base_clash
-            }
-            if change > 0:
-                degraded.append(record)
-            else:
-                improved.append(record)
-
-degraded_df = pd.DataFrame(degraded)
-improved_df = pd.DataFrame(improved)
-
-print("=" * 70)
-print("OUTLIER CHARACTERIZATION: Structures that got WORSE after relaxation")
-print("=" * 70)
-
-# Q1: Are they all AF?
-print("\n### Q1: Category distribution of degraded structures")
-print(degraded_df['category'].value_counts())
-print(f"\nTotal degraded: {len(degraded_df)}")
-print(f"AF: {len(degraded_df[degraded_df['category'] == 'AlphaFold'])} ({100*len(degraded_df[degraded_df['category'] == 'AlphaFold'])/len(degraded_df):.0f}%)")
-print(f"Boltz: {len(degraded_df[degraded_df['category'] == 'Boltz'])} ({100*len(degraded_df[degraded_df['category'] == 'Boltz'])/len(degraded_df):.0f}%)")
-print(f"Exp: {len(degraded_df[degraded_df['category'] == 'Experimental'])} ({100*len(degraded_df[degraded_df['category'] == 'Experimental'])/len(degraded_df):.0f}%)")
-
-# Q2: Ceiling effect - are degraded structures already good?
-print("\n### Q2: Ceiling effect analysis")
-print(f"\nDegraded structures - initial MolProbity score:")
-print(f"  Mean: {degraded_df['initial_molprobity'].mean():.2f}")
-print(f"  Median: {degraded_df['initial_molprobity'].median():.2f}")
-print(f"  Range: {degraded_df['initial_molprobity'].min():.2f} - {degraded_df['initial_molprobity'].max():.2f}")
-
-print(f"\nImproved structures - initial MolProbity score:")
-print(f"  Mean: {improved_df['initial_molprobity'].mean():.2f}")
-print(f"  Median: {improved_df['initial_molprobity'].median():.2f}")
-print(f"  Range: {improved_df['initial_molprobity'].min():.2f} - {improved_df['initial_molprobity'].max():.2f}")
-
-print(f"\n>>> Degraded structures start BETTER (lower score): {degraded_df['initial_molprobity'].mean():.2f} vs {improved_df['initial_molprobity'].mean():.2f}")
-print(">>> This confirms CEILING EFFECT")
-
-# Q3: Clashscore pattern
-print("\n### Q3: Initial clashscore comparison")
-print(f"\nDegraded - initial clashscore: {degraded_df['initial_clashscore'].mean():.1f}")
-print(f"Improved - initial clashscore: {improved_df['initial_clashscore'].mean():.1f}")
-print(f"\n>>> Degraded structures start with LOW clashscore - confirms convergence to ~14")
-
-# Create visualization
-fig, axes = plt.subplots(1, 3, figsize=(15, 5))
-
-# Panel 1: Category breakdown
-ax1 = axes[0]
-categories = ['Experimental', 'AlphaFold', 'Boltz']
-degraded_counts = [len(degraded_df[degraded_df['category'] == c]) for c in categories]
-improved_counts = [len(improved_df[improved_df['category'] == c]) for c in categories]
-
-x = np.arange(len(categories))
-width = 0.35
-ax1.bar(x - width/2, degraded_counts, width, label='Degraded', color='red', alpha=0.7)
-ax1.bar(x + width/2, improved_counts, width, label='Improved', color='green', alpha=0.7)
-ax1.set_ylabel('Count')
-ax1.set_title('A) Degraded vs Improved by Category')
-ax1.set_xticks(x)
-ax1.set_xticklabels(categories)
-ax1.legend()
-
-# Panel 2: Initial score distribution
-ax2 = axes[1]
-ax2.hist(degraded_df['initial_molprobity'], bins=15, alpha=0.5, label='Degraded', color='red')
-ax2.hist(improved_df['initial_molprobity'], bins=15, alpha=0.5, label='Improved', color='green')
-ax2.axvline(degraded_df['initial_molprobity'].mean(), color='red', linestyle='--', label=f'Deg mean: {degraded_df["initial_molprobity"].mean():.2f}')
-ax2.axvline(improved_df['initial_molprobity'].mean(), color='green', linestyle='--', label=f'Imp mean: {improved_df["initial_molprobity"].mean():.2f}')
-ax2.set_xlabel('Initial MolProbity Score')
-ax2.set_ylabel('Count')
-ax2.set_title('B) Initial Score Distribution (Ceiling Effect)')
-ax2.legend(fontsize=8)
-
-# Panel 3: Clashscore distribution
-ax3 = axes[2]
-ax3.hist(degraded_df['initial_clashscore'], bins=15, alpha=0.5, label='Degraded', color='red')
-ax3.hist(improved_df['initial_clashscore'], bins=15, alpha=0.5, label='Improved', color='green')
-ax3.axvline(14, color='black', linestyle='--', label='Convergence point (~14)')
-ax3.set_xlabel('Initial Clashscore')
-ax3.set_ylabel('Count')
-ax3.set_title('C) Initial Clashscore (Convergence Effect)')
-ax3.legend(fontsize=8)
-
-plt.suptitle('Characterization of "Relaxation-Sensitive" Structures', fontsize=14)
-plt.tight_layout()
-plt.savefig(FIGURES_DIR / 'outlier_characterization.png', dpi=150)
-plt.close()
-
-print(f"\nSaved outlier_characterization.png")
-
-# Summary for chat
-print("\n" + "=" * 70)
-print("SUMMARY")
-print("=" * 70)
-print("""
+CATEGORIES = ['Experimental', 'AlphaFold', 'Boltz']
+
+
+def load_records() -> pd.DataFrame:
+    """Per protein and source: unrelaxed vs relaxed_normal_beta means."""
+    pairs = connect().pairing_table('molprobity', ['molprobity_score', 'clashscore'], split_af=False)
+    pairs = pairs[pairs['molprobity_score_baseline'].notna() & pairs['molprobity_score_mean'].notna()]
+    return pd.DataFrame({
+        'protein': pairs['protein'],
+        'category': pairs['category'],
+        'initial_molprobity': pairs['molprobity_score_baseline'],
+        'final_molprobity': pairs['molprobity_score_mean'],
+        'change': pairs['molprobity_score_mean'] - pairs['molprobity_score_baseline'],
+        'initial_clashscore': pairs['clashscore_baseline'],
+    })
+
+
+def print_questions(degraded_df: pd.DataFrame, improved_df: pd.DataFrame):
+    # Q1: Are they all AF?
+    print("\n### Q1: Category distribution of degraded structures")
+    print(degraded_df['category'].value_counts())
+    print(f"\nTotal degraded: {len(degraded_df)}")
+    print(f"AF: {len(degraded_df[degraded_df['category'] == 'AlphaFold'])} ({100*len(degraded_df[degraded_df['category'] == 'AlphaFold'])/len(degraded_df):.0f}%)")
+    print(f"Boltz: {len(degraded_df[degraded_df['category'] == 'Boltz'])} ({100*len(degraded_df[degraded_df['category'] == 'Boltz'])/len(degraded_df):.0f}%)")
+    print(f"Exp: {len(degraded_df[degraded_df['category'] == 'Experimental'])} ({100*len(degraded_df[degraded_df['category'] == 'Experimental'])/len(degraded_df):.0f}%)")
+
+    # Q2: Ceiling effect - are degraded structures already good?
+    print("\n### Q2: Ceiling effect analysis")
+    print(f"\nDegraded structures - initial MolProbity score:")
+    print(f"  Mean: {degraded_df['initial_molprobity'].mean():.2f}")
+    print(f"  Median: {degraded_df['initial_molprobity'].median():.2f}")
+    print(f"  Range: {degraded_df['initial_molprobity'].min():.2f} - {degraded_df['initial_molprobity'].max():.2f}")
+
+    print(f"\nImproved structures - initial MolProbity score:")
+    print(f"  Mean: {improved_df['initial_molprobity'].mean():.2f}")
+    print(f"  Median: {improved_df['initial_molprobity'].median():.2f}")
+    print(f"  Range: {improved_df['initial_molprobity'].min():.2f} - {improved_df['initial_molprobity'].max():.2f}")
+
+    print(f"\n>>> Degraded structures start BETTER (lower score): {degraded_df['initial_molprobity'].mean():.2f} vs {improved_df['initial_molprobity'].mean():.2f}")
+    print(">>> This confirms CEILING EFFECT")
+
+    # Q3: Clashscore pattern
+    print("\n### Q3: Initial clashscore comparison")
+    print(f"\nDegraded - initial clashscore: {degraded_df['initial_clashscore'].mean():.1f}")
+    print(f"Improved - initial clashscore: {improved_df['initial_clashscore'].mean():.1f}")
+    print(f"\n>>> Degraded structures start with LOW clashscore - confirms convergence to ~14")
+
+
+def plot_characterization(degraded_df: pd.DataFrame, improved_df: pd.DataFrame):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+
+    # Panel 1: Category breakdown
+    ax1 = axes[0]
+    degraded_counts = [len(degraded_df[degraded_df['category'] == c]) for c in CATEGORIES]
+    improved_counts = [len(improved_df[improved_df['category'] == c]) for c in CATEGORIES]
+
+    x = np.arange(len(CATEGORIES))
+    width = 0.35
+    ax1.bar(x - width/2, degraded_counts, width, label='Degraded', color='red', alpha=0.7)
+    ax1.bar(x + width/2, improved_counts, width, label='Improved', color='green', alpha=0.7)
+    ax1.set_ylabel('Count')
+    ax1.set_title('A) Degraded vs Improved by Category')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(CATEGORIES)
+    ax1.legend()
+
+    # Panel 2: Initial score distribution
+    ax2 = axes[1]
+    ax2.hist(degraded_df['initial_molprobity'], bins=15, alpha=0.5, label='Degraded', color='red')
+    ax2.hist(improved_df['initial_molprobity'], bins=15, alpha=0.5, label='Improved', color='green')
+    ax2.axvline(degraded_df['initial_molprobity'].mean(), color='red', linestyle='--', label=f'Deg mean: {degraded_df["initial_molprobity"].mean():.2f}')
+    ax2.axvline(improved_df['initial_molprobity'].mean(), color='green', linestyle='--', label=f'Imp mean: {improved_df["initial_molprobity"].mean():.2f}')
+    ax2.set_xlabel('Initial MolProbity Score')
+    ax2.set_ylabel('Count')
+    ax2.set_title('B) Initial Score Distribution (Ceiling Effect)')
+    ax2.legend(fontsize=8)
+
+    # Panel 3: Clashscore distribution
+    ax3 = axes[2]
+    ax3.hist(degraded_df['initial_clashscore'], bins=15, alpha=0.5, label='Degraded', color='red')
+    ax3.hist(improved_df['initial_clashscore'], bins=15, alpha=0.5, label='Improved', color='green')
+    ax3.axvline(14, color='black', linestyle='--', label='Convergence point (~14)')
+    ax3.set_xlabel('Initial Clashscore')
+    ax3.set_ylabel('Count')
+    ax3.set_title('C) Initial Clashscore (Convergence Effect)')
+    ax3.legend(fontsize=8)
+
+    plt.suptitle('Characterization of "Relaxation-Sensitive" Structures', fontsize=14)
+    plt.tight_layout()
+    plt.savefig(FIGURES_DIR / 'outlier_characterization.png', dpi=150)
+    plt.close()
+
+    print(f"\nSaved outlier_characterization.png")
+
+
+def main():
+    argparse.ArgumentParser(description="Characterize structures that got worse after relaxation").parse_args()
+
+    records = load_records()
+
+    # Structures that degraded vs improved
+    degraded_df = records[records['change'] > 0].reset_index(drop=True)
+    improved_df = records[~(records['change'] > 0)].reset_index(drop=True)
+
+    print("=" * 70)
+    print("OUTLIER CHARACTERIZATION: Structures that got WORSE after relaxation")
+    print("=" * 70)
+
+    print_questions(degraded_df, improved_df)
+    plot_characterization(degraded_df, improved_df)
+
+    # Summary for chat
+    print("\n" + "=" * 70)
+    print("SUMMARY")
+    print("=" * 70)
+    print("""
 Key findings:
 1. NOT all AF - degraded structures are evenly distributed across categories
 2. CEILING EFFECT CONFIRMED - degraded structures start with better scores
@@ -145,3 +140,7 @@ Key findings:
 Conclusion: Relaxation hurts structures that are ALREADY GOOD.
 These aren't failures of relaxation - they're victims of regression to mean.
 """)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Structural convergence: CA and backbone RMSD between crystal-derived and
+predicted models of the same target.
+
+Residues are mapped onto the experimental structure by sequence once per
+target. Every crystal model is then compared with every AlphaFold/Boltz model
+from the matching stage (original vs raw, and relaxed_X vs relaxed_X) in one
+batched Kabsch fit.
+
+Output: the convergence_rmsd table of the results store (results_store.py)
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from coords import BACKBONE, read_chains, sequence, map_chains, atom_coordinates
+from superpose import fit_rmsd
+from manifest import refresh_manifest
+from run_validation_parallel import find_structures, RELAX_PROTOCOLS
+from results_store import STORE_DIR, read_table, write_table
+
+TABLE = 'convergence_rmsd'
+WORKERS = 12
+
+PREDICTORS = ['AlphaFold', 'Boltz']
+
+# (crystal subcategory, predicted subcategory) compared at each stage
+STAGES = [('original', 'raw')] + [(f'relaxed_{p}', f'relaxed_{p}') for p in RELAX_PROTOCOLS]
+
+
+class ResidueMap:
+    """Backbone atom keys of the reference structure and cached chain mappings onto it."""
+
+    def __init__(self, ref_chains: dict):
+        self.ref_chains = ref_chains
+        self.sequences = {c: sequence(r) for c, r in ref_chains.items()}
+        self.keys = [(c, i, a) for c, res in ref_chains.items()
+                     for i, r in enumerate(res) for a in BACKBONE if a in r['atoms']]
+        self.is_ca = np.array([k[2] == 'CA' for k in self.keys], dtype=bool)
+        self.mappings = {}
+
+    def coordinates(self, chains: dict) -> np.ndarray:
+        key = tuple((c, sequence(r)) for c, r in chains.items())
+        if key not in self.mappings:
+            self.mappings[key] = map_chains(self.ref_chains, chains, self.sequences)
+        return atom_coordinates(self.keys, chains, self.mappings[key])
+
+
+def pairwise_rmsd(ref_xyz: np.ndarray, xyz: np.ndarray, is_ca: np.ndarray):
+    """All-pairs (Nr, Nm) CA and backbone RMSD, fitting models onto references."""
+    A = ref_xyz[:, None]
+    B = xyz[None]
+    present = ~np.isnan(A).any(axis=-1) & ~np.isnan(B).any(axis=-1)
+    bb = fit_rmsd(B, A, present)
+    ca = fit_rmsd(B, A, present & is_ca)
+    return ca, bb, (present & is_ca).sum(axis=-1)
+
+
+def target_rmsd(pdb_id: str) -> list:
+    structs = find_structures(pdb_id)
+    exp = [s for s in structs if s['category'] == 'Experimental' and s['subcategory'] == 'original']
+    if not exp:
+        return []
+
+    residue_map = ResidueMap(read_chains(exp[0]['path']))
+
+    groups = {}
+    for s in structs:
+        try:
+            xyz = residue_map.coordinates(read_chains(s['path']))
+        except Exception:
+            continue
+        groups.setdefault((s['category'], s['subcategory']), []).append((s['model'], xyz))
+
+    rows = []
+    for ref_sub, pred_sub in STAGES:
+        refs = sorted(groups.get(('Experimental', ref_sub), []), key=lambda t: t[0])
+        if not refs:
+            continue
+        ref_xyz = np.stack([x for _, x in refs])
+        for category in PREDICTORS:
+            models = sorted(groups.get((category, pred_sub), []), key=lambda t: t[0])
+            if not models:
+                continue
+            ca, bb, n_ca = pairwise_rmsd(ref_xyz, np.stack([x for _, x in models]),
+                                         residue_map.is_ca)
+            for i, (ref_model, _) in enumerate(refs):
+                for j, (model, _) in enumerate(models):
+                    rows.append({
+                        'protein': pdb_id, 'category': category,
+                        'subcategory': pred_sub, 'reference_model': ref_model, 'model': model,
+                        'ca_rmsd': round(float(ca[i, j]), 3),
+                        'backbone_rmsd': round(float(bb[i, j]), 3),
+                        'n_ca': int(n_ca[i, j]),
+                    })
+    return rows
+
+
+def load_convergence(root: Path = STORE_DIR):
+    """Convergence RMSD table, or None if it has not been computed yet."""
+    df = read_table(TABLE, root=root)
+    return None if df.empty else df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crystal vs predicted model RMSD per target")
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS)
+    parser.add_argument('--store', type=Path, default=STORE_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Convergence RMSD (crystal vs predicted)")
+    print("=" * 60)
+    print(f"Start: {datetime.now().strftime('%H:%M:%S')}")
+
+    manifest = refresh_manifest()
+    proteins = manifest.proteins()
+    manifest.close()
+    print(f"Proteins: {len(proteins)}")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        futs = {ex.submit(target_rmsd, pid): pid for pid in proteins}
+        for fut in as_completed(futs):
+            pid = futs[fut]
+            try:
+                target_rows = fut.result()
+            except Exception as e:
+                print(f"  {pid}: failed ({e})")
+                continue
+            rows.extend(target_rows)
+            print(f"  {pid}: {len(target_rows)} pairs")
+
+    df = pd.DataFrame(rows)
+    write_table(TABLE, df, args.store)
+    print(f"\nSaved: {args.store / TABLE} ({len(df)} pairs)")
+
+    if not df.empty:
+        print("\n=== Mean backbone RMSD to crystal (A) ===")
+        print(df.groupby(['category', 'subcategory'])['backbone_rmsd'].mean().unstack(0).round(2))
+
+    print(f"\nDone: {datetime.now().strftime('%H:%M:%S')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Residue-level coordinate parsing and sequence-based residue mapping.
+
+Shared by the in-process structural comparisons (DockQ, RMSD) so that every
+model of a target is mapped onto the reference residues the same way.
+"""
+
+import difflib
+import numpy as np
+
+from shards import open_structure
+
+THREE_TO_ONE = {
+    'ALA': 'A', 'ARG': 'R', 'ASN': 'N', 'ASP': 'D', 'CYS': 'C', 'GLN': 'Q', 'GLU': 'E',
+    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LEU': 'L', 'LYS': 'K', 'MET': 'M', 'PHE': 'F',
+    'PRO': 'P', 'SER': 'S', 'THR': 'T', 'TRP': 'W', 'TYR': 'Y', 'VAL': 'V', 'MSE': 'M',
+}
+
+BACKBONE = ('N', 'CA', 'C', 'O')
+
+
+def read_chains(path) -> dict:
+    """Heavy-atom residues of the first model, grouped by chain in file order.
+
+    Returns {chain: [{'resname', 'resid', 'atoms': {name: (x, y, z)}}, ...]}.
+    Hydrogens and alternate locations other than the first are skipped.
+    """
+    chains = {}
+    with open_structure(path) as f:
+        for line in f:
+            if line.startswith('ENDMDL'):
+                break
+            if not line.startswith('ATOM'):
+                continue
+            name = line[12:16].strip()
+            element = line[76:78].strip() if len(line) > 76 else ''
+            if element == 'H' or (not element and name.startswith('H')):
+                continue
+            if line[16] not in (' ', 'A'):
+                continue
+            chain = line[21].strip()
+            resid = line[22:27].strip()
+            residues = chains.setdefault(chain, [])
+            if not residues or residues[-1]['resid'] != resid:
+                residues.append({'resname': line[17:20].strip(), 'resid': resid, 'atoms': {}})
+            try:
+                xyz = (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+            except ValueError:
+                continue
+            residues[-1]['atoms'].setdefault(name, xyz)
+    return chains
+
+
+def sequence(residues: list) -> str:
+    return ''.join(THREE_TO_ONE.get(r['resname'], 'X') for r in residues)
+
+
+def map_sequences(ref_seq: str, seq: str) -> list:
+    """(ref_index, index) pairs of identical residues in the optimal matching blocks."""
+    matcher = difflib.SequenceMatcher(None, ref_seq, seq, autojunk=False)
+    pairs = []
+    for block in matcher.get_matching_blocks():
+        pairs.extend((block.a + k, block.b + k) for k in range(block.size))
+    return pairs
+
+
+def map_chains(ref_chains: dict, chains: dict, ref_seqs: dict = None) -> dict:
+    """Assign each reference chain the most similar unused chain, by sequence.
+
+    Returns {ref_chain: (chain, [(ref_index, index), ...])}.
+    """
+    if ref_seqs is None:
+        ref_seqs = {c: sequence(r) for c, r in ref_chains.items()}
+    seqs = {c: sequence(r) for c, r in chains.items()}
+
+    scored = []
+    for rc, rs in ref_seqs.items():
+        for c, s in seqs.items():
+            ratio = difflib.SequenceMatcher(None, rs, s, autojunk=False).ratio()
+            scored.append((ratio, rc, c))
+
+    mapping, used = {}, set()
+    for ratio, rc, c in sorted(scored, key=lambda t: -t[0]):
+        if rc in mapping or c in used or ratio == 0:
+            continue
+        mapping[rc] = (c, map_sequences(ref_seqs[rc], seqs[c]))
+        used.add(c)
+    return mapping
+
+
+def atom_coordinates(ref_keys: list, chains: dict, mapping: dict) -> np.ndarray:
+    """Coordinates for (ref_chain, ref_index, atom) keys; NaN where unmapped or missing."""
+    lookup = {rc: dict(pairs) for rc, (_, pairs) in mapping.items()}
+    xyz = np.full((len(ref_keys), 3), np.nan)
+    for k, (rc, ri, atom) in enumerate(ref_keys):
+        if rc not in mapping:
+            continue
+        mi = lookup[rc].get(ri)
+        if mi is None:
+            continue
+        pos = chains[mapping[rc][0]][mi]['atoms'].get(atom)
+        if pos is not None:
+            xyz[k] = pos
+    return xyz
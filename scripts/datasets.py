@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Typed, cached analysis datasets shared by the analysis scripts.
+
+Each dataset is built once from the results store (and the legacy CSVs for
+proteins not stored yet) and cached as a single Parquet file in
+validation_results/cache/. The cache records the size and mtime of every
+source file it was built from and is rebuilt when any of them changes, so
+scripts always see the current results without re-reading and re-merging the
+per-protein partitions on every run. Caches are built one protein at a time,
+so a rebuild never holds the whole joined dataset in memory either.
+
+iter_dataset() streams a cached dataset in chunks and aggregate_dataset()
+folds those chunks into per-group running statistics, so summaries over the
+full wide tables are computed without ever loading them whole.
+
+Datasets:
+    molprobity    molprobity_full (core + extended MolProbity metrics)
+    posebusters   posebusters_raw joined with posebusters_results
+
+Usage:
+    python scripts/datasets.py             # build stale caches and list them
+    python scripts/datasets.py --rebuild   # rebuild every cache
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from results_store import (PROTEINS, RESULTS_DIR, STORE_DIR, KEYS, PER_PROTEIN_CSV, COMBINED_CSV,
+                           BATCH_ROWS, filter_expression, finish, iter_batches, legacy_filters, load_columns,
+                           to_frame)
+from streaming_stats import GroupedStats
+
+CACHE_DIR = RESULTS_DIR / "cache"
+
+# Dataset name -> results tables joined on KEYS
+DATASETS = {
+    'molprobity': ['molprobity_full'],
+    'posebusters': ['posebusters_raw', 'posebusters_results'],
+}
+
+FINGERPRINT_KEY = b'datasets.fingerprint'
+
+
+def source_files(table: str, root: Path = STORE_DIR) -> list:
+    """Files a table is read from: its store partitions, and the legacy CSVs of unstored proteins."""
+    base = Path(root) / table
+    files = []
+    if base.is_dir():
+        files = sorted(str(p) for p in base.rglob('*') if p.is_file())
+        legacy = legacy_filters(table, None, root)
+        if legacy is None:
+            return files
+        proteins = legacy['protein']
+    else:
+        proteins = None
+    if table in COMBINED_CSV:
+        return files + ([str(COMBINED_CSV[table])] if COMBINED_CSV[table].exists() else [])
+    return files + sorted(str(p) for p in PROTEINS.glob(f"*/analysis/{PER_PROTEIN_CSV[table]}")
+                          if proteins is None or p.parent.parent.name in proteins)
+
+
+def fingerprint(name: str, root: Path = STORE_DIR) -> str:
+    """Digest of the path, size and mtime of every source file of a dataset."""
+    h = hashlib.sha256()
+    for table in DATASETS[name]:
+        h.update(table.encode())
+        for path in source_files(table, root):
+            st = os.stat(path)
+            h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def cache_path(name: str) -> Path:
+    return CACHE_DIR / f"{name}.parquet"
+
+
+def cached_fingerprint(path: Path):
+    if not path.exists():
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(FINGERPRINT_KEY, b'').decode() or None
+
+
+def spool_table(table: str, spool: Path, root: Path = STORE_DIR) -> set:
+    """Stream a table once into spool/<table>/<protein>/part-N.parquet files.
+
+    Every source (store partitions, per-protein and combined legacy CSVs) is
+    read a single time in chunks, so a combined CSV is not re-parsed for each
+    protein. Returns the proteins that have rows.
+    """
+    proteins = set()
+    for i, chunk in enumerate(iter_batches(table, root=root)):
+        if 'protein' not in chunk.columns:
+            continue
+        for protein, part in chunk.groupby('protein', sort=False):
+            out = Path(spool) / table / protein
+            out.mkdir(parents=True, exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), out / f"part-{i}.parquet")
+            proteins.add(protein)
+    return proteins
+
+
+def join_protein(name: str, protein: str, spool: Path) -> pd.DataFrame:
+    """One protein's spooled rows of the dataset's tables, joined on KEYS."""
+    df = None
+    for table in DATASETS[name]:
+        files = sorted((Path(spool) / table / protein).glob("part-*.parquet"),
+                       key=lambda f: int(f.stem.split('-')[1]))
+        if not files:
+            continue
+        part = finish(pd.concat([to_frame(pq.read_table(f)) for f in files], ignore_index=True),
+                      None, False)
+        if not set(KEYS) <= set(part.columns):
+            continue
+        if df is None:
+            df = part
+            continue
+        part = part.drop(columns=[c for c in part.columns if c in df.columns and c not in KEYS])
+        df = df.merge(part, on=KEYS, how='outer')
+    return df
+
+
+def conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """table with schema's columns, in order and type; missing columns are null."""
+    columns = [table.column(f.name).cast(f.type) if f.name in table.column_names
+               else pa.nulls(len(table), f.type) for f in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def build(name: str, digest: str, root: Path = STORE_DIR, path: Path = None) -> Path:
+    """Write the join of the dataset's tables on KEYS to its cache, one protein at a time.
+
+    Each table is first streamed once into per-protein spool files (see
+    spool_table). Each protein's joined rows are then written to a temporary
+    file, which is copied into the cache in batches under the union of the
+    columns, so memory holds one protein's rows (or one batch) rather than
+    the dataset.
+    """
+    path = cache_path(name) if path is None else path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.parquet.tmp')
+    with tempfile.TemporaryDirectory(dir=path.parent) as spool:
+        proteins = set()
+        for table in DATASETS[name]:
+            proteins |= spool_table(table, Path(spool) / "tables", root)
+        files = []
+        for protein in sorted(proteins):
+            df = join_protein(name, protein, Path(spool) / "tables")
+            if df is None or df.empty:
+                continue
+            files.append(Path(spool) / f"{protein}.parquet")
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), files[-1])
+
+        schema = pa.unify_schemas([pq.read_schema(f).remove_metadata() for f in files]) if files else pa.schema([])
+        schema = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), pa.string())) if f.name in KEYS else f
+                            for f in schema], metadata={FINGERPRINT_KEY: digest.encode()})
+        with pq.ParquetWriter(tmp, schema) as writer:
+            for f in files:
+                for batch in pq.ParquetFile(f).iter_batches(batch_size=BATCH_ROWS):
+                    writer.write_table(conform(pa.Table.from_batches([batch]), schema))
+    os.replace(tmp, path)
+    return path
+
+
+def write_cache(name: str, df: pd.DataFrame, digest: str, path: Path = None) -> Path:
+    path = cache_path(name) if path is None else path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), FINGERPRINT_KEY: digest.encode()})
+    tmp = path.with_suffix('.parquet.tmp')
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def ensure(name: str, rebuild: bool = False, root: Path = STORE_DIR) -> Path:
+    """Path of an up-to-date cache for the dataset, rebuilding it if stale."""
+    digest = fingerprint(name, root)
+    path = cache_path(name)
+    if rebuild or cached_fingerprint(path) != digest:
+        build(name, digest, root)
+    return path
+
+
+def load_dataset(name: str, columns=None, filters=None, categorical: bool = False,
+                 root: Path = STORE_DIR) -> pd.DataFrame:
+    """Columns of a dataset for rows matching filters ({column: value or list}).
+
+    Requested columns that the dataset does not have are skipped. Keys are
+    plain strings unless categorical.
+    """
+    dataset = ds.dataset(ensure(name, root=root), format='parquet')
+    data = dataset.to_table(columns=load_columns(dataset, columns, filters),
+                            filter=filter_expression(filters))
+    return finish(to_frame(data), columns, categorical)
+
+
+def iter_dataset(name: str, columns=None, filters=None, batch_size: int = BATCH_ROWS,
+                 categorical: bool = False, root: Path = STORE_DIR):
+    """load_dataset() as a stream of DataFrames of at most batch_size rows."""
+    dataset = ds.dataset(ensure(name, root=root), format='parquet')
+    for batch in dataset.to_batches(columns=load_columns(dataset, columns, filters),
+                                    filter=filter_expression(filters), batch_size=batch_size):
+        if batch.num_rows:
+            yield finish(to_frame(batch), columns, categorical)
+
+
+def aggregate_dataset(name: str, by: list, metrics: list, filters=None, prepare=None,
+                      digest: bool = False, batch_size: int = BATCH_ROWS,
+                      root: Path = STORE_DIR) -> GroupedStats:
+    """Per-group statistics of metrics over a dataset, one chunk in memory at a time.
+
+    prepare, if given, maps each chunk to the frame that is grouped (e.g. to
+    derive the group columns); its output must have the by columns. With
+    digest, quantiles are tracked as well.
+    """
+    stats = GroupedStats(by, metrics, digest)
+    columns = KEYS + [c for c in by if c not in KEYS] + list(metrics)
+    for chunk in iter_dataset(name, columns, filters, batch_size, root=root):
+        stats.update(chunk if prepare is None else prepare(chunk))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the cached analysis datasets")
+    parser.add_argument('--rebuild', action='store_true', help='Ignore existing caches')
+    parser.add_argument('--store', type=Path, default=STORE_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Analysis Datasets")
+    print("=" * 60)
+    for name in DATASETS:
+        fresh = not args.rebuild and cached_fingerprint(cache_path(name)) == fingerprint(name, args.store)
+        path = ensure(name, args.rebuild, args.store)
+        meta = pq.ParquetFile(path).metadata
+        print(f"  {name}: {meta.num_rows} rows x {meta.num_columns} columns "
+              f"({path.stat().st_size / 1e6:.1f} MB, {'cached' if fresh else 'rebuilt'})")
+
+
+if __name__ == "__main__":
+    main()
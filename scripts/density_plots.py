@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Scatter panels that stay fast and readable at full scale.
+
+A panel is a list of layers, one per category (or AF model type): x and y
+values, a color and a legend label. scatter_panel() draws them in one of the
+plot modes:
+
+    points   one scatter collection per layer (plus one line collection for
+             error bars), never one artist per point
+    hexbin   one hexagonal density grid per layer, shaded in the layer color
+    hist2d   2D histograms of every layer on a shared grid, composited into a
+             single image for the panel
+    auto     points up to AUTO_POINTS points in the panel, hexbin above
+
+Density modes shade by log count, so overlapping categories stay visible
+where they share a region.
+"""
+
+import numpy as np
+
+PLOT_MODES = ['auto', 'points', 'hexbin', 'hist2d']
+AUTO_POINTS = 5000
+GRIDSIZE = 60
+DENSITY_ALPHA = 0.8
+
+
+class Layer:
+    """Points of one category in a panel, with optional asymmetric y errors."""
+
+    def __init__(self, x, y, color, label: str = None, yerr=None):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.color = color
+        self.label = label
+        self.yerr = None if yerr is None else np.asarray(yerr, dtype=float)
+
+
+def resolve_mode(mode: str, n_points: int) -> str:
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode {mode!r}; expected one of {PLOT_MODES}")
+    if mode == 'auto':
+        return 'points' if n_points <= AUTO_POINTS else 'hexbin'
+    return mode
+
+
+def panel_extent(layers: list) -> tuple:
+    """(xmin, xmax, ymin, ymax) over the finite values of all layers."""
+    xs = np.concatenate([l.x[np.isfinite(l.x)] for l in layers] + [np.zeros(0)])
+    ys = np.concatenate([l.y[np.isfinite(l.y)] for l in layers] + [np.zeros(0)])
+    if not len(xs) or not len(ys):
+        return 0.0, 1.0, 0.0, 1.0
+    extent = []
+    for values in (xs, ys):
+        lo, hi = values.min(), values.max()
+        if hi <= lo:
+            lo, hi = lo - 0.5, hi + 0.5
+        extent += [lo, hi]
+    return tuple(extent)
+
+
+def point_layer(ax, layer: Layer, alpha: float = 0.7, size: float = 30, capsize: float = 0):
+    """One scatter collection for the points, one line collection for the error bars.
+
+    Returns the point collection, for the legend.
+    """
+    from matplotlib.collections import LineCollection
+    if layer.yerr is not None:
+        lo, hi = layer.yerr
+        segments = np.stack([np.column_stack([layer.x, layer.y - lo]),
+                             np.column_stack([layer.x, layer.y + hi])], axis=1)
+        ax.add_collection(LineCollection(segments, colors=layer.color, alpha=alpha))
+        if capsize:
+            caps_x = np.concatenate([layer.x, layer.x])
+            caps_y = np.concatenate([layer.y - lo, layer.y + hi])
+            ax.scatter(caps_x, caps_y, marker='_', s=(2 * capsize) ** 2, c=layer.color, alpha=alpha)
+    return ax.scatter(layer.x, layer.y, c=layer.color, alpha=alpha, s=size, label=layer.label)
+
+
+def hexbin_layer(ax, layer: Layer, extent: tuple, gridsize: int = GRIDSIZE):
+    """Log-count hexagonal density of one layer, transparent to the layer color."""
+    from matplotlib.colors import LinearSegmentedColormap, to_rgb
+    cmap = LinearSegmentedColormap.from_list('', [(*to_rgb(layer.color), 0.15), (*to_rgb(layer.color), 1.0)])
+    keep = np.isfinite(layer.x) & np.isfinite(layer.y)
+    if keep.any():
+        ax.hexbin(layer.x[keep], layer.y[keep], gridsize=gridsize, extent=extent, bins='log',
+                  mincnt=1, cmap=cmap, alpha=DENSITY_ALPHA, linewidths=0)
+
+
+def hist2d_image(layers: list, extent: tuple, gridsize: int = GRIDSIZE) -> np.ndarray:
+    """RGBA image of all layers' log-count histograms, composited in layer order."""
+    from matplotlib.colors import to_rgb
+    xmin, xmax, ymin, ymax = extent
+    rgb = np.zeros((gridsize, gridsize, 3))
+    alpha = np.zeros((gridsize, gridsize))
+    for layer in layers:
+        keep = np.isfinite(layer.x) & np.isfinite(layer.y)
+        counts, _, _ = np.histogram2d(layer.y[keep], layer.x[keep], bins=gridsize,
+                                      range=[[ymin, ymax], [xmin, xmax]])
+        if not counts.any():
+            continue
+        a = DENSITY_ALPHA * np.log1p(counts) / np.log1p(counts.max())
+        a[counts > 0] = np.maximum(a[counts > 0], 0.15)
+        # Premultiplied "over": later layers on top
+        rgb = np.asarray(to_rgb(layer.color)) * a[..., None] + rgb * (1 - a[..., None])
+        alpha = a + alpha * (1 - a)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        straight = np.where(alpha[..., None] > 0, rgb / alpha[..., None], 1.0)
+    return np.dstack([straight, alpha])
+
+
+def scatter_panel(ax, layers: list, mode: str = 'auto', gridsize: int = GRIDSIZE, **point_kw) -> list:
+    """Draw layers in one panel; returns legend handles, one per labelled layer.
+
+    Handles are the point markers in points mode and color patches in the
+    density modes.
+    """
+    mode = resolve_mode(mode, sum(len(l.x) for l in layers))
+    if mode == 'points':
+        points = [point_layer(ax, layer, **point_kw) for layer in layers]
+        return [p for p, l in zip(points, layers) if l.label]
+
+    extent = panel_extent(layers)
+    if mode == 'hexbin':
+        for layer in layers:
+            hexbin_layer(ax, layer, extent, gridsize)
+    else:
+        ax.imshow(hist2d_image(layers, extent, gridsize), extent=extent, origin='lower',
+                  aspect='auto', interpolation='nearest')
+    ax.set_xlim(extent[:2])
+    ax.set_ylim(extent[2:])
+
+    from matplotlib.patches import Patch
+    return [Patch(facecolor=l.color, label=l.label) for l in layers if l.label]
@@ -7,20 +7,26 @@ Analyzes whether relaxation improves docking accuracy (not just MolProbity metri
 
 Usage:
     python dockq_analysis.py --predictions <dir> --references <dir> --output <csv>
+    python dockq_analysis.py ... --validate 50   # compare engine vs DockQ CLI
 
 Requirements:
-    - DockQ installed (https://github.com/bjornwallner/DockQ)
     - Bound structures from BM5.5 benchmark
+    - DockQ CLI (https://github.com/bjornwallner/DockQ) only for --engine cli / --validate
 """
 
 import argparse
+import os
+import random
 import subprocess
 import pandas as pd
 from pathlib import Path
 from concurrent.futures import ProcessPoolExecutor, as_completed
-import json
 import re
 
+from dockq_engine import load_native, score_models
+
+DOCKQ_COLUMNS = ["dockq", "fnat", "irms", "lrms"]
+
 
 def run_dockq(model_pdb: Path, native_pdb: Path) -> dict:
     """Run DockQ on a single model-native pair."""
@@ -74,30 +80,69 @@ def run_dockq(model_pdb: Path, native_pdb: Path) -> dict:
         }
 
 
-def find_native_structure(target_id: str, references_dir: Path) -> Path:
-    """Find the bound structure for a target."""
+def score_target(native, model_pdbs: list) -> list:
+    """Score every model of one target in-process against its preprocessed native."""
+    return score_models(native, model_pdbs)
+
+
+def validate_engine(pairs: list, n: int, seed: int = 0) -> pd.DataFrame:
+    """Run the DockQ CLI and the in-process engine on a random sample of model-native pairs."""
+    sample = random.Random(seed).sample(pairs, min(n, len(pairs)))
+    rows = []
+    for model_pdb, native_pdb in sample:
+        cli = run_dockq(model_pdb, native_pdb)
+        engine = score_target(load_native(native_pdb), [model_pdb])[0]
+        row = {"model": str(model_pdb), "native": native_pdb.name}
+        for col in DOCKQ_COLUMNS:
+            row[f"{col}_cli"] = cli[col]
+            row[f"{col}_engine"] = engine[col]
+            if cli[col] is not None and engine[col] is not None:
+                row[f"{col}_absdiff"] = abs(cli[col] - engine[col])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def native_candidates(target_id: str) -> list:
     # BM5.5 naming: <PDB>_l_b.pdb (ligand bound) or <PDB>_r_b.pdb (receptor bound)
     # For complex, we need the bound complex
-    patterns = [
+    return [
         f"{target_id}_bound.pdb",
         f"{target_id}.pdb",
         f"{target_id}_complex.pdb",
     ]
 
-    for pattern in patterns:
-        candidate = references_dir / pattern
-        if candidate.exists():
-            return candidate
 
-    # Try subdirectory structure
-    subdir = references_dir / target_id
-    if subdir.exists():
-        for pattern in patterns:
-            candidate = subdir / pattern
-            if candidate.exists():
-                return candidate
+def index_native_structures(targets, references_dir: Path) -> dict:
+    """Resolve the bound structure of every target from one listing per directory.
 
-    return None
+    The first native_candidates name found at the top level wins, then the
+    first one in the target's own subdirectory; no candidate is stat-ed.
+    """
+    top_files, subdirs = set(), set()
+    for entry in os.scandir(references_dir):
+        (subdirs if entry.is_dir() else top_files).add(entry.name)
+
+    index = {}
+    for target in targets:
+        patterns = native_candidates(target)
+        found = next((references_dir / p for p in patterns if p in top_files), None)
+        if found is None and target in subdirs:
+            sub_files = set(os.listdir(references_dir / target))
+            found = next((references_dir / target / p for p in patterns if p in sub_files), None)
+        if found is not None:
+            index[target] = found
+    return index
+
+
+def load_natives(index: dict, cache_dir: Path) -> dict:
+    """Parse (or load from cache) each native once; failures are reported and skipped."""
+    natives = {}
+    for target, path in index.items():
+        try:
+            natives[target] = load_native(path, cache_dir)
+        except Exception as e:
+            print(f"Warning: Could not preprocess native for {target}: {e}")
+    return natives
 
 
 def collect_predictions(predictions_dir: Path) -> list:
@@ -197,37 +242,73 @@ def main():
                         help="Output CSV file")
     parser.add_argument("--workers", type=int, default=8,
                         help="Number of parallel workers")
+    parser.add_argument("--engine", choices=["numpy", "cli"], default="numpy",
+                        help="In-process NumPy DockQ (default) or the DockQ CLI")
+    parser.add_argument("--native-cache", type=Path,
+                        help="Directory for preprocessed natives (default: next to --output)")
+    parser.add_argument("--validate", type=int, metavar="N",
+                        help="Compare the engine against the DockQ CLI on N sampled pairs and exit")
     args = parser.parse_args()
 
     print(f"Collecting predictions from {args.predictions}")
     predictions = collect_predictions(args.predictions)
     print(f"Found {len(predictions)} prediction files")
 
+    by_target = {}
+    for pred in predictions:
+        by_target.setdefault(pred["target"], []).append(pred)
+
+    native_paths = index_native_structures(sorted(by_target), args.references)
+    for target in sorted(set(by_target) - set(native_paths)):
+        print(f"Warning: No native structure for {target}")
+
+    if args.validate:
+        pairs = [(p["path"], native_paths[t]) for t, preds in by_target.items()
+                 if t in native_paths for p in preds]
+        comparison = validate_engine(pairs, args.validate)
+        out = args.output.with_name(args.output.stem + "_validation.csv")
+        comparison.to_csv(out, index=False)
+        print(f"\n=== Engine vs DockQ CLI ({len(comparison)} pairs) ===")
+        for col in DOCKQ_COLUMNS:
+            diff = comparison.get(f"{col}_absdiff")
+            if diff is not None and diff.notna().any():
+                print(f"  {col}: mean |diff| {diff.mean():.4f}, max |diff| {diff.max():.4f}")
+        print(f"Saved {out}")
+        return
+
     results = []
 
     with ProcessPoolExecutor(max_workers=args.workers) as executor:
         futures = {}
 
-        for pred in predictions:
-            native = find_native_structure(pred["target"], args.references)
-            if native is None:
-                print(f"Warning: No native structure for {pred['target']}")
-                continue
-
-            future = executor.submit(run_dockq, pred["path"], native)
-            futures[future] = pred
+        if args.engine == "numpy":
+            cache_dir = args.native_cache or args.output.parent / "dockq_native_cache"
+            natives = load_natives(native_paths, cache_dir)
+            print(f"Preprocessed {len(natives)} natives (cache: {cache_dir})")
+            for target, native in natives.items():
+                preds = by_target[target]
+                future = executor.submit(score_target, native, [p["path"] for p in preds])
+                futures[future] = preds
+        else:
+            for target, native in native_paths.items():
+                for pred in by_target[target]:
+                    future = executor.submit(run_dockq, pred["path"], native)
+                    futures[future] = [pred]
 
         for future in as_completed(futures):
-            pred = futures[future]
-            dockq_result = future.result()
-
-            results.append({
-                "target": pred["target"],
-                "source": pred["source"],
-                "protocol": pred["protocol"],
-                "model": pred["model"],
-                **dockq_result
-            })
+            preds = futures[future]
+            dockq_results = future.result()
+            if not isinstance(dockq_results, list):
+                dockq_results = [dockq_results]
+
+            for pred, dockq_result in zip(preds, dockq_results):
+                results.append({
+                    "target": pred["target"],
+                    "source": pred["source"],
+                    "protocol": pred["protocol"],
+                    "model": pred["model"],
+                    **dockq_result
+                })
 
     # Create DataFrame and save
     df = pd.DataFrame(results)
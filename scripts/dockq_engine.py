@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+In-process DockQ (Fnat, iRMS, LRMS) for many models of one target.
+
+Follows the DockQ v1 definitions (Basu & Wallner 2016):
+- Fnat: fraction of native residue-residue contacts (heavy atoms < 5 A)
+  between receptor and ligand that are present in the model
+- iRMS: backbone RMSD over interface residues (< 10 A from the partner)
+  after superposing on them
+- LRMS: ligand backbone RMSD after superposing on the receptor backbone
+
+The native is analysed once and can be persisted with load_native(); model
+backbones are stacked into one array and superposed in batch.
+"""
+
+import hashlib
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from coords import BACKBONE, read_chains, sequence, map_chains, atom_coordinates
+from superpose import fit_rmsd
+
+CONTACT_CUTOFF = 5.0
+INTERFACE_CUTOFF = 10.0
+
+# Bump when NativeReference changes so stale pickles are rebuilt
+NATIVE_CACHE_VERSION = 1
+
+
+def dockq_score(fnat, irms, lrms):
+    return (fnat + 1 / (1 + (irms / 1.5) ** 2) + 1 / (1 + (lrms / 8.5) ** 2)) / 3
+
+
+def heavy_atoms(chains: dict, chain_ids: list):
+    """Stacked heavy-atom coordinates and their (chain, residue index) labels."""
+    xyz, labels = [], []
+    for c in chain_ids:
+        for i, res in enumerate(chains.get(c, [])):
+            for pos in res['atoms'].values():
+                xyz.append(pos)
+                labels.append((c, i))
+    return np.array(xyz, dtype=float).reshape(-1, 3), labels
+
+
+def residue_contacts(chains: dict, receptor: list, ligand: list, cutoff: float) -> set:
+    """((rec_chain, rec_index), (lig_chain, lig_index)) residue pairs within cutoff."""
+    from scipy.spatial import cKDTree
+    rec_xyz, rec_labels = heavy_atoms(chains, receptor)
+    lig_xyz, lig_labels = heavy_atoms(chains, ligand)
+    if not len(rec_xyz) or not len(lig_xyz):
+        return set()
+    hits = cKDTree(rec_xyz).query_ball_tree(cKDTree(lig_xyz), cutoff)
+    return {(rec_labels[i], lig_labels[j]) for i, js in enumerate(hits) for j in js}
+
+
+def split_chains(chains: dict, receptor_chains=None, ligand_chains=None):
+    """Receptor/ligand chain groups; by default the longer of two chains is the receptor.
+
+    With more than two chains and no explicit grouping, the first chain is the
+    receptor and all others form the ligand.
+    """
+    ids = list(chains)
+    if receptor_chains and ligand_chains:
+        return list(receptor_chains), list(ligand_chains)
+    if len(ids) < 2:
+        raise ValueError(f"need two chains for DockQ, found {len(ids)}")
+    if len(ids) == 2 and len(chains[ids[1]]) > len(chains[ids[0]]):
+        return [ids[1]], [ids[0]]
+    return [ids[0]], ids[1:]
+
+
+class NativeReference:
+    """Native complex preprocessed once per target: contacts, interface and backbone keys."""
+
+    def __init__(self, path, receptor_chains=None, ligand_chains=None):
+        self.path = str(path)
+        self.chains = read_chains(path)
+        self.sequences = {c: sequence(r) for c, r in self.chains.items()}
+        self.receptor, self.ligand = split_chains(self.chains, receptor_chains, ligand_chains)
+        self.mappings = {}
+
+        self.contacts = residue_contacts(self.chains, self.receptor, self.ligand, CONTACT_CUTOFF)
+        near = residue_contacts(self.chains, self.receptor, self.ligand, INTERFACE_CUTOFF)
+        interface = {r for pair in near for r in pair}
+
+        keys, side, in_interface = [], [], []
+        for group, label in ((self.receptor, 'R'), (self.ligand, 'L')):
+            for c in group:
+                for i, res in enumerate(self.chains[c]):
+                    for atom in BACKBONE:
+                        if atom in res['atoms']:
+                            keys.append((c, i, atom))
+                            side.append(label)
+                            in_interface.append((c, i) in interface)
+        self.backbone_keys = keys
+        self.backbone_xyz = np.array([self.chains[c][i]['atoms'][a] for c, i, a in keys],
+                                     dtype=float).reshape(-1, 3)
+        side = np.array(side)
+        self.receptor_mask = side == 'R'
+        self.ligand_mask = side == 'L'
+        self.interface_mask = np.array(in_interface, dtype=bool)
+
+    def chain_mapping(self, chains: dict) -> dict:
+        """Model-to-native chain/residue mapping, memoised by model sequences."""
+        key = tuple((c, sequence(r)) for c, r in chains.items())
+        if key not in self.mappings:
+            self.mappings[key] = map_chains(self.chains, chains, self.sequences)
+        return self.mappings[key]
+
+
+def load_native(path, cache_dir=None) -> NativeReference:
+    """NativeReference for path, read from or written to cache_dir when given.
+
+    Cache entries are keyed by resolved path, size and mtime, so an edited
+    native is re-analysed on the next run.
+    """
+    path = Path(path)
+    if cache_dir is None:
+        return NativeReference(path)
+
+    st = path.stat()
+    key = f"{path.resolve()}:{st.st_size}:{st.st_mtime_ns}:{NATIVE_CACHE_VERSION}"
+    cache_file = Path(cache_dir) / f"{path.stem}_{hashlib.sha1(key.encode()).hexdigest()[:16]}.pkl"
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            pass
+
+    native = NativeReference(path)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_file, 'wb') as f:
+        pickle.dump(native, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return native
+
+
+def model_contacts(native: NativeReference, chains: dict, mapping: dict) -> set:
+    """Model contacts translated into native (chain, residue index) labels."""
+    back = {}
+    for rc, (mc, pairs) in mapping.items():
+        for ri, mi in pairs:
+            back[(mc, mi)] = (rc, ri)
+    rec = [mapping[c][0] for c in native.receptor if c in mapping]
+    lig = [mapping[c][0] for c in native.ligand if c in mapping]
+    found = set()
+    for a, b in residue_contacts(chains, rec, lig, CONTACT_CUTOFF):
+        if a in back and b in back:
+            found.add((back[a], back[b]))
+    return found
+
+
+def score_models(native: NativeReference, model_paths: list) -> list:
+    """DockQ, Fnat, iRMS and LRMS for every model against one native."""
+    results, stacked, ok = [], [], []
+    for path in model_paths:
+        entry = {'model': path.name if hasattr(path, 'name') else str(path),
+                 'native': native.path.split('/')[-1],
+                 'dockq': None, 'fnat': None, 'irms': None, 'lrms': None,
+                 'success': False, 'error': None}
+        try:
+            chains = read_chains(path)
+            mapping = native.chain_mapping(chains)
+            xyz = atom_coordinates(native.backbone_keys, chains, mapping)
+            found = model_contacts(native, chains, mapping)
+            if native.contacts:
+                entry['fnat'] = len(found & native.contacts) / len(native.contacts)
+            stacked.append(xyz)
+            ok.append(len(results))
+        except Exception as e:
+            entry['error'] = str(e)
+        results.append(entry)
+
+    if not stacked:
+        return results
+
+    X = np.stack(stacked)
+    present = ~np.isnan(X).any(axis=-1)
+    ref = native.backbone_xyz[None]
+
+    irms = fit_rmsd(X, ref, present & native.interface_mask)
+    lrms = fit_rmsd(X, ref, present & native.receptor_mask, present & native.ligand_mask)
+
+    for k, idx in enumerate(ok):
+        entry = results[idx]
+        if entry['fnat'] is None or np.isnan(irms[k]) or np.isnan(lrms[k]):
+            entry['error'] = 'no interface or unmapped chains'
+            continue
+        entry['irms'] = round(float(irms[k]), 3)
+        entry['lrms'] = round(float(lrms[k]), 3)
+        entry['dockq'] = round(float(dockq_score(entry['fnat'], irms[k], lrms[k])), 3)
+        entry['fnat'] = round(entry['fnat'], 3)
+        entry['success'] = True
+    return results
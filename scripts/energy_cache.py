@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of Rosetta internal-energy scores.
+
+Scores are keyed by structure content hash (manifest.content_hash), Rosetta
+binary identity and score function, so re-running posebusters.py after an unrelated change skips the
+score_jd2 call for every structure whose file has not changed.
+"""
+
+import argparse
+import shutil
+import sqlite3
+from pathlib import Path
+
+DEFAULT_CACHE = Path(__file__).parent.parent / "validation_results" / "energy_cache.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS energies (
+    content_hash TEXT NOT NULL,
+    rosetta TEXT NOT NULL,
+    score_function TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (content_hash, rosetta, score_function)
+) WITHOUT ROWID
+"""
+
+
+def rosetta_identity(rosetta_bin: str) -> str:
+    """Name, size and mtime of the resolved Rosetta executable.
+
+    score_jd2 has no cheap version query, so a rebuilt or replaced binary is
+    detected from its file metadata instead.
+    """
+    if not rosetta_bin:
+        return 'none'
+    path = Path(shutil.which(rosetta_bin) or rosetta_bin)
+    try:
+        st = path.resolve().stat()
+    except OSError:
+        return path.name
+    return f"{path.name}:{st.st_size}:{int(st.st_mtime)}"
+
+
+class EnergyCache:
+    """SQLite-backed energy cache, written only by the parent process."""
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def preload(self, rosetta: str, score_function: str) -> dict:
+        """All cached scores for one binary and score function, as {content_hash: score}."""
+        rows = self.conn.execute(
+            "SELECT content_hash, score FROM energies WHERE rosetta = ? AND score_function = ?",
+            (rosetta, score_function))
+        return dict(rows)
+
+    def put_many(self, rows, rosetta: str, score_function: str):
+        """Insert (content_hash, score) pairs."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO energies VALUES (?, ?, ?, ?)",
+                [(digest, rosetta, score_function, score) for digest, score in rows])
+
+    def record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the Rosetta energy cache")
+    parser.add_argument('--cache', type=Path, default=DEFAULT_CACHE)
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    cache = EnergyCache(args.cache)
+    if args.clear:
+        with cache.conn:
+            cache.conn.execute("DELETE FROM energies")
+        print(f"Cleared {args.cache}")
+
+    rows = cache.conn.execute(
+        "SELECT rosetta, score_function, COUNT(*) FROM energies GROUP BY rosetta, score_function")
+    for rosetta, score_function, n in rows:
+        print(f"  {rosetta} / {score_function}: {n} scores")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Figure jobs rendered in parallel, and only when their inputs change.
+
+A FigureJob is one figure: a module-level render function plus the data it
+plots, already sliced and aggregated by the caller, so a job needs no
+database or dataset access of its own. run_jobs() renders the jobs across a
+process pool with the headless Agg backend and collects what each render
+function returns (a dict of statistics such as r and p, or None) into one
+table, in job order.
+
+Incremental runs: every job has a digest of its input data, its parameters
+and the source of its render function. Given a manifest path, run_jobs()
+skips jobs whose digest matches the one recorded at their last render (and
+whose output file still exists), reusing the recorded statistics. The
+manifest (figure_manifest.json in the figures directory) maps each figure to
+that digest, its statistics and a stale flag; a dry run only updates the
+flags, so the manifest says which figures would be re-rendered.
+
+Render functions save their figure themselves and must close it.
+
+Usage:
+    python scripts/figure_jobs.py            # list figures/figure_manifest.json
+    python scripts/figure_jobs.py --stale    # only the stale figures
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+WORKERS = 12
+FIGURES_DIR = Path(__file__).parent.parent / "figures"
+MANIFEST = "figure_manifest.json"
+
+
+def update_digest(h, value):
+    """Feed a canonical encoding of value (frames, arrays, containers, scalars) into h."""
+    if isinstance(value, pd.DataFrame):
+        h.update(b'frame')
+        h.update(repr([(str(c), str(t)) for c, t in value.dtypes.items()]).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (pd.Series, pd.Index)):
+        h.update(b'series')
+        update_digest(h, value.to_frame() if isinstance(value, pd.Series) else value.to_series().to_frame())
+    elif isinstance(value, np.ndarray):
+        h.update(f"array{value.dtype}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes() if value.dtype != object else repr(value.tolist()).encode())
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for key in sorted(value, key=repr):
+            update_digest(h, key)
+            update_digest(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            update_digest(h, item)
+    else:
+        h.update(repr(value).encode())
+
+
+class FigureJob:
+    """A render call, the labels its statistics are reported under and its output file."""
+
+    def __init__(self, name: str, render, args: tuple = (), kwargs: dict = None,
+                 labels: dict = None, path=None):
+        self.name = name
+        self.render = render
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.labels = dict(labels or {})
+        self.path = None if path is None else Path(path)
+
+    def __call__(self):
+        return self.render(*self.args, **self.kwargs)
+
+    def digest(self) -> str:
+        """Hash of the render function's source, the arguments and the output path."""
+        h = hashlib.sha256()
+        h.update(f"{self.render.__module__}.{self.render.__qualname__}\n".encode())
+        try:
+            h.update(inspect.getsource(self.render).encode())
+        except (OSError, TypeError):
+            pass
+        update_digest(h, self.args)
+        update_digest(h, self.kwargs)
+        update_digest(h, str(self.path))
+        return h.hexdigest()
+
+
+def init_worker():
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+
+def run_job(job: FigureJob) -> dict:
+    stats = job() or {}
+    return {k: v.item() if isinstance(v, np.generic) else v for k, v in stats.items()}
+
+
+def load_manifest(path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest: dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_current(job: FigureJob, digest: str, entry: dict) -> bool:
+    return (entry is not None and entry.get('digest') == digest and 'stats' in entry
+            and (job.path is None or job.path.exists()))
+
+
+def run_jobs(jobs: list, workers: int = WORKERS, manifest=None, force: bool = False,
+             dry_run: bool = False) -> pd.DataFrame:
+    """Render every job; one row per job: name, labels, status and statistics.
+
+    With a manifest path, jobs whose digest is unchanged are skipped
+    (status 'current') unless force is set; rendered jobs have status
+    'rendered'. With dry_run nothing is rendered: changed jobs are reported
+    (and flagged in the manifest) as 'stale'.
+    """
+    entries = load_manifest(manifest) if manifest else {}
+    digests = [job.digest() for job in jobs] if manifest else [None] * len(jobs)
+    todo = [i for i, (job, digest) in enumerate(zip(jobs, digests))
+            if force or not manifest or not is_current(job, digest, entries.get(job.name))]
+
+    results = {}
+    if not dry_run:
+        pending = [jobs[i] for i in todo]
+        if workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=init_worker) as ex:
+                results = dict(zip(todo, ex.map(run_job, pending)))
+        else:
+            init_worker()
+            results = {i: run_job(jobs[i]) for i in todo}
+
+    rows = []
+    for i, (job, digest) in enumerate(zip(jobs, digests)):
+        entry = entries.get(job.name, {})
+        if i in results:
+            status, stats = 'rendered', results[i]
+            entries[job.name] = {'digest': digest, 'stats': stats, 'stale': False}
+        elif i in todo:
+            status, stats = 'stale', entry.get('stats', {})
+            if manifest:
+                entries[job.name] = {**entry, 'stale': True}
+        else:
+            status, stats = 'current', entry.get('stats', {})
+            entries[job.name] = {**entry, 'stale': False}
+        rows.append({'figure': job.name, **job.labels, 'status': status, **stats})
+
+    if manifest:
+        save_manifest(manifest, entries)
+    return pd.DataFrame(rows)
+
+
+def summarize(table: pd.DataFrame) -> str:
+    counts = table['status'].value_counts() if len(table) else {}
+    return ", ".join(f"{counts.get(s, 0)} {s}" for s in ('rendered', 'current', 'stale') if counts.get(s, 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the figure manifest")
+    parser.add_argument('directory', nargs='?', type=Path, default=FIGURES_DIR)
+    parser.add_argument('--stale', action='store_true', help='Only list stale figures')
+    args = parser.parse_args()
+
+    entries = load_manifest(args.directory / MANIFEST)
+    if not entries:
+        print(f"No manifest in {args.directory}")
+        return
+    n_stale = sum(bool(e.get('stale')) for e in entries.values())
+    print(f"{len(entries)} figures, {n_stale} stale")
+    for name, entry in sorted(entries.items()):
+        if entry.get('stale') or not args.stale:
+            print(f"  {'STALE  ' if entry.get('stale') else 'current'} {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Persistent manifest of the structure files under proteins/.
+
+One SQLite row per .pdb / .pdb.gz file holds its path, size, mtime,
+compression flag, atom count and content hash, and the category/subcategory
+it belongs to. refresh() walks the protein directories in parallel with
+os.scandir and only re-lists directories whose mtime changed. The files of
+unchanged directories are re-stat'ed, since a file rewritten in place does not
+change its directory's mtime. Only new or modified files (by size and mtime)
+are re-read for atom counts and hashes, so an unchanged tree costs one stat per
+directory and file. Replicates packed into a tar shard (shards.py) are listed
+from the shard index under their original paths; re-packing replaces the shard,
+which changes the directory's mtime.
+
+Each pipeline keeps its own model naming on top of these rows (see the
+find_structures functions).
+
+Usage:
+    python scripts/manifest.py             # refresh and summarise
+    python scripts/manifest.py --rebuild   # discard and rebuild from scratch
+"""
+
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from shards import SHARD_INDEX, open_shard, read_bytes
+
+ROOT = Path(__file__).parent.parent
+PROTEINS = ROOT / "proteins"
+DEFAULT_MANIFEST = ROOT / "validation_results" / "structure_manifest.sqlite"
+WORKERS = 12
+
+RELAX_PROTOCOLS = ['cartesian_beta', 'cartesian_ref15', 'dualspace_beta',
+                   'dualspace_ref15', 'normal_beta', 'normal_ref15']
+
+# Unrelaxed prediction directories: (category, file pattern)
+RAW_DIRS = {'AF': ('AlphaFold', 'ranked_*.pdb'), 'Boltz': ('Boltz', 'boltz_input_model_*.pdb')}
+PREDICTED = {'AF': 'AlphaFold', 'Boltz': 'Boltz'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    protein TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS structures (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    protein TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    category TEXT,
+    subcategory TEXT,
+    stem TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    compressed INTEGER NOT NULL,
+    atom_count INTEGER,
+    content_hash TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS structures_group ON structures (protein, category, subcategory);
+CREATE INDEX IF NOT EXISTS structures_directory ON structures (directory);
+CREATE INDEX IF NOT EXISTS directories_protein ON directories (protein);
+"""
+
+STRUCTURE_COLUMNS = ['path', 'directory', 'protein', 'rel_path', 'category', 'subcategory',
+                     'stem', 'size', 'mtime_ns', 'compressed', 'atom_count', 'content_hash']
+
+
+def content_hash(path) -> str:
+    """SHA-256 of the file as stored on disk (or in its shard)."""
+    return hashlib.sha256(read_bytes(path)).hexdigest()
+
+
+def is_structure(name: str) -> bool:
+    return name.endswith('.pdb') or name.endswith('.pdb.gz')
+
+
+def classify(protein: str, parts: tuple):
+    """(category, subcategory) for a file path relative to its protein directory.
+
+    (None, None) for files that are not part of the validation set.
+    """
+    name = parts[-1]
+    if len(parts) == 1:
+        return ('Experimental', 'original') if name == f"{protein}.pdb" else (None, None)
+    top = parts[0]
+    if len(parts) == 2 and top in RAW_DIRS and fnmatch.fnmatchcase(name, RAW_DIRS[top][1]):
+        return RAW_DIRS[top][0], 'raw'
+    if len(parts) == 2 and top in RELAX_PROTOCOLS and fnmatch.fnmatchcase(name, f"{protein}_r*.pdb.gz"):
+        return 'Experimental', f'relaxed_{top}'
+    if top == 'relax' and len(parts) > 2 and parts[1] in PREDICTED and name.endswith('.pdb.gz'):
+        proto = next((p for p in parts[2:-1] if p in RELAX_PROTOCOLS), 'unknown')
+        return PREDICTED[parts[1]], f'relaxed_{proto}'
+    return None, None
+
+
+def scan_file(path: str):
+    """(atom_count, content_hash) from a single read of the file."""
+    data = read_bytes(path)
+    digest = hashlib.sha256(data).hexdigest()
+    if path.endswith('.gz'):
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError):
+            return None, digest
+    atoms = data.count(b'\nATOM  ') + data.count(b'\nHETATM')
+    atoms += data.startswith(b'ATOM  ') + data.startswith(b'HETATM')
+    return atoms, digest
+
+
+def walk_protein(protein_dir: str, known: dict, stored: dict = None):
+    """Directory tree of one protein, re-listing only directories whose mtime changed.
+
+    known maps directory path to (mtime_ns, [subdirs]) from the last refresh,
+    stored maps directory path to {file path: (size, mtime_ns)}. Files of
+    unchanged directories are re-stat'ed against stored (shard members, which
+    are not on disk, are skipped). Returns ({dir: (mtime_ns, [subdirs])},
+    {re-listed dir: [(path, size, mtime_ns)]}, [(dir, path, size, mtime_ns)]
+    of modified files in unchanged directories).
+    """
+    dirs, listed, modified = {}, {}, []
+    stack = [protein_dir]
+    while stack:
+        d = stack.pop()
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
+            continue
+        if d in known and known[d][0] == mtime:
+            subdirs = known[d][1]
+            for path, stat in (stored or {}).get(d, {}).items():
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if (st.st_size, st.st_mtime_ns) != stat:
+                    modified.append((d, path, st.st_size, st.st_mtime_ns))
+        else:
+            subdirs, files = [], {}
+            shard = None
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name == SHARD_INDEX:
+                        shard = open_shard(d)
+                    elif is_structure(entry.name) and entry.is_file():
+                        st = entry.stat()
+                        files[entry.path] = (entry.path, st.st_size, st.st_mtime_ns)
+            if shard is not None:
+                files.update((path, (path, size, mtime)) for path, size, mtime in shard.entries())
+            listed[d] = list(files.values())
+        dirs[d] = (mtime, subdirs)
+        stack.extend(subdirs)
+    return dirs, listed, modified
+
+
+class Manifest:
+    """SQLite structure manifest, written only by the process calling refresh()."""
+
+    def __init__(self, path=DEFAULT_MANIFEST, root=PROTEINS):
+        self.path = Path(path)
+        self.root = Path(root)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def refresh(self, workers: int = WORKERS, rehash: bool = False) -> dict:
+        """Bring the manifest up to date with the tree. Returns change counts."""
+        proteins = sorted(e.name for e in os.scandir(self.root) if e.is_dir())
+        known = {}
+        for row in self.conn.execute("SELECT path, protein, mtime_ns, subdirs FROM directories"):
+            subdirs = row['subdirs'].split('\n') if row['subdirs'] else []
+            known.setdefault(row['protein'], {})[row['path']] = (row['mtime_ns'], subdirs)
+        stored = {}
+        for row in self.conn.execute("SELECT path, directory, size, mtime_ns FROM structures"):
+            stored.setdefault(row['directory'], {})[row['path']] = (row['size'], row['mtime_ns'])
+
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            walks = list(ex.map(lambda p: walk_protein(str(self.root / p), {} if rehash else known.get(p, {}),
+                                                       stored), proteins))
+
+        stats = {'proteins': len(proteins), 'directories_listed': 0, 'scanned': 0, 'removed': 0}
+        to_scan = []
+        with self.conn:
+            self.conn.execute(f"DELETE FROM structures WHERE protein NOT IN ({','.join('?' * len(proteins))})",
+                              proteins)
+            self.conn.execute(f"DELETE FROM directories WHERE protein NOT IN ({','.join('?' * len(proteins))})",
+                              proteins)
+            for protein, (dirs, listed, modified) in zip(proteins, walks):
+                gone = [d for d in known.get(protein, {}) if d not in dirs]
+                for d in gone:
+                    stats['removed'] += self.conn.execute(
+                        "DELETE FROM structures WHERE directory = ?", (d,)).rowcount
+                    self.conn.execute("DELETE FROM directories WHERE path = ?", (d,))
+
+                for d, files in listed.items():
+                    before = stored.get(d, {})
+                    current = {path for path, _, _ in files}
+                    for path in set(before) - current:
+                        self.conn.execute("DELETE FROM structures WHERE path = ?", (path,))
+                        stats['removed'] += 1
+                    for path, size, mtime in files:
+                        if rehash or before.get(path) != (size, mtime):
+                            to_scan.append((protein, d, path, size, mtime))
+                to_scan.extend((protein, d, path, size, mtime) for d, path, size, mtime in modified)
+
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)",
+                    [(d, protein, mtime, '\n'.join(subdirs)) for d, (mtime, subdirs) in dirs.items()])
+                stats['directories_listed'] += len(listed)
+
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            scans = list(ex.map(lambda t: scan_file(t[2]), to_scan))
+
+        rows = []
+        for (protein, d, path, size, mtime), (atoms, digest) in zip(to_scan, scans):
+            parts = Path(os.path.relpath(path, self.root / protein)).parts
+            category, subcategory = classify(protein, parts)
+            name = parts[-1]
+            stem = name[:-len('.pdb.gz')] if name.endswith('.pdb.gz') else name[:-len('.pdb')]
+            rows.append((path, d, protein, '/'.join(parts), category, subcategory, stem,
+                         size, mtime, int(name.endswith('.gz')), atoms, digest))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO structures VALUES ({','.join('?' * len(STRUCTURE_COLUMNS))})", rows)
+        stats['scanned'] = len(rows)
+        return stats
+
+    def proteins(self) -> list:
+        """Protein directory names, in sorted order."""
+        rows = self.conn.execute("SELECT DISTINCT protein FROM directories ORDER BY protein")
+        return [r[0] for r in rows]
+
+    def structures(self, protein: str = None, category: str = None) -> list:
+        """Classified structure rows as dicts, ordered by path."""
+        query = "SELECT * FROM structures WHERE category IS NOT NULL"
+        params = []
+        if protein is not None:
+            query += " AND protein = ?"
+            params.append(protein)
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        return [dict(r) for r in self.conn.execute(query + " ORDER BY path", params)]
+
+    def summary(self):
+        return self.conn.execute(
+            "SELECT category, subcategory, COUNT(*), SUM(size), SUM(atom_count) FROM structures "
+            "WHERE category IS NOT NULL GROUP BY category, subcategory ORDER BY category, subcategory"
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def refresh_manifest(path=DEFAULT_MANIFEST, root=PROTEINS, workers: int = WORKERS) -> Manifest:
+    """Open and refresh the manifest, printing a one-line summary."""
+    manifest = Manifest(path, root)
+    t0 = datetime.now()
+    stats = manifest.refresh(workers)
+    print(f"Manifest: {stats['proteins']} proteins, {stats['directories_listed']} directories listed, "
+          f"{stats['scanned']} files scanned, {stats['removed']} removed "
+          f"({(datetime.now() - t0).total_seconds():.1f}s)")
+    return manifest
+
+
+def load_structures(protein: str = None, path=DEFAULT_MANIFEST) -> list:
+    """Structure rows of one protein (or all), building the manifest on first use."""
+    if not Path(path).exists():
+        refresh_manifest(path).close()
+    manifest = Manifest(path)
+    try:
+        return manifest.structures(protein)
+    finally:
+        manifest.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the structure manifest")
+    parser.add_argument('--manifest', type=Path, default=DEFAULT_MANIFEST)
+    parser.add_argument('--root', type=Path, default=PROTEINS)
+    parser.add_argument('--rebuild', action='store_true', help='Discard the manifest first')
+    parser.add_argument('--rehash', action='store_true', help='Re-read every file')
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Structure Manifest")
+    print("=" * 60)
+
+    if args.rebuild and args.manifest.exists():
+        args.manifest.unlink()
+
+    manifest = Manifest(args.manifest, args.root)
+    t0 = datetime.now()
+    stats = manifest.refresh(args.workers, rehash=args.rehash)
+    elapsed = (datetime.now() - t0).total_seconds()
+    print(f"Proteins: {stats['proteins']}")
+    print(f"Directories listed: {stats['directories_listed']}")
+    print(f"Files scanned: {stats['scanned']}, removed: {stats['removed']}")
+    print(f"Refresh: {elapsed:.2f}s")
+
+    print(f"\n{'category':<14}{'subcategory':<26}{'files':>7}{'MB':>10}{'atoms':>14}")
+    for category, subcategory, n, size, atoms in manifest.summary():
+        print(f"{category:<14}{subcategory:<26}{n:>7}{(size or 0) / 1e6:>10.1f}{atoms or 0:>14}")
+    manifest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,8 @@ Extended MolProbity geometry metrics via Python API.
 Adds C-beta deviation, omega distributions, and bond/angle RMSZ.
 """
 
+import argparse
 import os
-import gzip
 import tempfile
 import math
 import pandas as pd
@@ -13,8 +13,12 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from manifest import refresh_manifest, load_structures
+from shards import read_structure
+from results_store import write_table, refresh_molprobity_full
+from summary_cube import ensure_cube
 
-os.environ['CLIBD_MON'] = os.path.expanduser('~/miniconda3/envs/molprobity/chem_data/mon_lib')
+MON_LIB = os.path.expanduser('~/miniconda3/envs/molprobity/chem_data/mon_lib')
 
 ROOT = Path(__file__).parent.parent
 PROTEINS = ROOT / "proteins"
@@ -132,8 +136,7 @@ def process(info):
     try:
         if gz:
             tmp = tempfile.NamedTemporaryFile(suffix='.pdb', delete=False, mode='wb')
-            with gzip.open(path, 'rb') as f:
-                tmp.write(f.read())
+            tmp.write(read_structure(path))
             tmp.close()
             pdb_path = tmp.name
         else:
@@ -150,50 +153,28 @@ def process(info):
 
 
 def find_structures(pdb_id):
-    """Find all structure variants."""
-    pdir = PROTEINS / pdb_id
+    """Find all structure variants (from the structure manifest)."""
     structs = []
-
-    exp = pdir / f"{pdb_id}.pdb"
-    if exp.exists():
-        structs.append((str(exp), pdb_id, 'Experimental', 'original', 'exp', False))
-
-    for name, cat, pat in [('AF', 'AlphaFold', 'ranked_*.pdb'),
-                            ('Boltz', 'Boltz', 'boltz_input_model_*.pdb')]:
-        d = pdir / name
-        if d.exists():
-            for f in d.glob(pat):
-                structs.append((str(f), pdb_id, cat, 'raw', f.stem, False))
-
-    for proto in RELAX_PROTOCOLS:
-        d = pdir / proto
-        if d.exists():
-            for f in d.glob(f"{pdb_id}_r*.pdb.gz"):
-                structs.append((str(f), pdb_id, 'Experimental',
-                               f'relaxed_{proto}', f.stem.replace('.pdb', ''), True))
-
-    relax = pdir / "relax"
-    if relax.exists():
-        for name, cat in [('AF', 'AlphaFold'), ('Boltz', 'Boltz')]:
-            d = relax / name
-            if not d.exists():
-                continue
-            for f in d.rglob("*.pdb.gz"):
-                proto = next((p for p in f.parts if p in RELAX_PROTOCOLS), 'unknown')
-                structs.append((str(f), pdb_id, cat,
-                               f'relaxed_{proto}', f.stem.replace('.pdb', ''), True))
-
+    for row in load_structures(pdb_id):
+        model = 'exp' if row['subcategory'] == 'original' else row['stem']
+        structs.append((row['path'], pdb_id, row['category'], row['subcategory'],
+                        model, bool(row['compressed'])))
     return structs
 
 
 def main():
+    argparse.ArgumentParser(description="Extended MolProbity geometry metrics").parse_args()
+    os.environ['CLIBD_MON'] = MON_LIB
+
     print("=" * 60)
     print("MolProbity Extended Metrics")
     print("=" * 60)
     t0 = datetime.now()
     print(f"Start: {t0.strftime('%H:%M:%S')}")
 
-    proteins = sorted(d.name for d in PROTEINS.iterdir() if d.is_dir())
+    manifest = refresh_manifest()
+    proteins = manifest.proteins()
+    manifest.close()
     print(f"Proteins: {len(proteins)}")
 
     all_structs = []
@@ -215,9 +196,12 @@ def main():
                 print(f"  {done}/{len(all_structs)}")
 
     df = pd.DataFrame(results)
-    out = ROOT / "validation_results" / "molprobity_extended.csv"
-    df.to_csv(out, index=False)
-    print(f"\nSaved: {out}")
+    write_table('molprobity_extended', df)
+    print(f"\nStored: molprobity_extended ({len(df)} rows)")
+    n_full = refresh_molprobity_full()
+    if n_full:
+        print(f"Stored: molprobity_full ({n_full} rows)")
+        print(f"Summary cube: {ensure_cube('molprobity')}")
 
     # summary
     print("\n=== Summary (raw/original only) ===")
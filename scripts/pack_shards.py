@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pack relaxation replicate directories into tar shards (see shards.py).
+
+Every directory holding .pdb.gz replicates gets a structures.tar with an
+offset index next to the loose files. With --remove the packed loose files are
+deleted after the shard has been verified, so a validation pass opens one
+file per directory instead of one per replicate. Unpacked directories keep
+working as before.
+
+--benchmark copies the selected proteins into a scratch directory twice,
+packs one copy, and times discovery (manifest walk) and reading every
+structure in each layout.
+
+Usage:
+    python scripts/pack_shards.py                       # pack, keep loose files
+    python scripts/pack_shards.py --remove              # pack and delete loose files
+    python scripts/pack_shards.py --benchmark --proteins 1AK4 1ATN
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from manifest import PROTEINS, WORKERS, refresh_manifest, walk_protein
+from shards import open_shard, pack_directory, read_bytes, replicate_directories
+
+
+def pack_tree(root: Path, proteins: list, remove: bool = False, workers: int = WORKERS) -> Counter:
+    """Pack every replicate directory of proteins under root. Returns status counts."""
+    dirs = [d for p in proteins for d in replicate_directories(root / p)]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        results = list(ex.map(lambda d: pack_directory(d, remove), dirs))
+    counts = Counter(status for status, _ in results)
+    counts['members'] = sum(n for _, n in results)
+    return counts
+
+
+def count_inodes(root: Path) -> int:
+    return sum(1 for _ in root.rglob('*'))
+
+
+def time_layout(root: Path, proteins: list, repeat: int) -> dict:
+    """Best-of-repeat discovery and read times over one copy of the tree."""
+    best = {'discover': float('inf'), 'read': float('inf')}
+    for _ in range(repeat):
+        open_shard.cache_clear()
+        t0 = time.perf_counter()
+        paths = []
+        for p in proteins:
+            _, listed, _ = walk_protein(str(root / p), {})
+            paths.extend(path for files in listed.values() for path, _, _ in files)
+        t1 = time.perf_counter()
+        n_bytes = sum(len(read_bytes(path)) for path in paths)
+        t2 = time.perf_counter()
+        best['discover'] = min(best['discover'], t1 - t0)
+        best['read'] = min(best['read'], t2 - t1)
+    best.update(files=len(paths), bytes=n_bytes, inodes=count_inodes(root))
+    return best
+
+
+def benchmark(proteins: list, repeat: int, workers: int):
+    scratch = Path(tempfile.mkdtemp(prefix='shard_bench_'))
+    try:
+        layouts = {}
+        for layout in ['loose', 'sharded']:
+            root = scratch / layout
+            for p in proteins:
+                shutil.copytree(PROTEINS / p, root / p)
+            if layout == 'sharded':
+                pack_tree(root, proteins, remove=True, workers=workers)
+            layouts[layout] = time_layout(root, proteins, repeat)
+
+        print(f"\n{'layout':<10}{'inodes':>9}{'structures':>12}{'MB':>9}{'discover s':>12}{'read s':>10}")
+        for layout, r in layouts.items():
+            print(f"{layout:<10}{r['inodes']:>9}{r['files']:>12}{r['bytes'] / 1e6:>9.1f}"
+                  f"{r['discover']:>12.3f}{r['read']:>10.3f}")
+        loose, sharded = layouts['loose'], layouts['sharded']
+        if sharded['discover'] > 0 and sharded['read'] > 0:
+            print(f"\nSpeedup: discovery {loose['discover'] / sharded['discover']:.1f}x, "
+                  f"read {loose['read'] / sharded['read']:.1f}x")
+        print("(warm page cache; on a networked filesystem the loose layout also pays "
+              "one metadata lookup per file)")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack replicate .pdb.gz files into tar shards")
+    parser.add_argument('--proteins', nargs='+', help='Protein IDs (default: all)')
+    parser.add_argument('--remove', action='store_true', help='Delete loose files once packed')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare loose and sharded layouts on a scratch copy')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    proteins = args.proteins or sorted(p.name for p in PROTEINS.iterdir() if p.is_dir())
+
+    print("=" * 60)
+    print("Replicate Shards" + (" (benchmark)" if args.benchmark else ""))
+    print("=" * 60)
+    print(f"Proteins: {len(proteins)}")
+
+    if args.benchmark:
+        benchmark(proteins, args.repeat, args.workers)
+        return
+
+    t0 = datetime.now()
+    counts = pack_tree(PROTEINS, proteins, args.remove, args.workers)
+    print(f"Directories: {counts['packed']} packed, {counts['current']} up to date "
+          f"({counts['members']} structures, {(datetime.now() - t0).total_seconds():.1f}s)")
+    if args.remove:
+        print("Loose replicate files removed")
+    refresh_manifest().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Baseline vs relaxed pairing of per-structure metrics.
+
+pairing_table() groups a results frame once, for every metric at the same
+time: the unrelaxed baseline mean per (protein, category, AF split) and the
+relaxed mean/min/max per (protein, category, AF split, protocol), joined on
+the shared keys. AlphaFold is split into ranked_0 (AMBER-relaxed by
+AlphaFold) and ranked_1-4 (unrelaxed); the other sources have no split.
+
+metric_deltas() turns one metric of the table into initial value vs change
+rows, the form used by the correlation scripts.
+"""
+
+import numpy as np
+import pandas as pd
+
+from results_store import BASELINE
+
+CATEGORIES = ['Experimental', 'AlphaFold', 'Boltz']
+
+AF_RANKED_0 = 'ranked_0 (AMBER)'
+AF_RANKED_REST = 'ranked_1-4 (unrelaxed)'
+AF_TYPES = [AF_RANKED_0, AF_RANKED_REST]
+
+# Unrelaxed ranked_0 model name under the MolProbity and PoseBusters naming
+RANKED_0_BASELINE = ['ranked_0', 'model0']
+
+GROUP = ['protein', 'category', 'af_type']
+
+
+def af_type(df: pd.DataFrame) -> pd.Series:
+    """AF split label for AlphaFold rows, None elsewhere."""
+    model = df['model'].astype(str)
+    ranked_0 = np.where(df['subcategory'].isin(BASELINE.values()),
+                        model.isin(RANKED_0_BASELINE), model.str.startswith('ranked_0'))
+    labels = np.where(ranked_0, AF_RANKED_0, AF_RANKED_REST).astype(object)
+    labels[(df['category'] != 'AlphaFold').to_numpy()] = None
+    return pd.Series(labels, index=df.index)
+
+
+def pairing_table(df: pd.DataFrame, metrics: list, relaxed='relaxed_normal_beta',
+                  split_af: bool = True, baseline: dict = BASELINE) -> pd.DataFrame:
+    """Baseline and relaxed aggregates for all metrics, one row per paired group.
+
+    Columns: protein, category, af_type, protocol, n_baseline, n_relaxed and,
+    per metric, {metric}_baseline (mean), {metric}_mean, {metric}_min and
+    {metric}_max over the relaxed replicates. Groups need at least one
+    baseline and one relaxed row; means may still be NaN. Rows are ordered by
+    category, protein (first baseline appearance), AF split and protocol.
+    """
+    relaxed = [relaxed] if isinstance(relaxed, str) else list(relaxed)
+    metrics = [m for m in metrics if m in df.columns]
+    is_base = df['subcategory'] == df['category'].map(baseline)
+    df = df[is_base | df['subcategory'].isin(relaxed)]
+    is_base = is_base[df.index]
+
+    keyed = df[['protein', 'category']].copy()
+    keyed['af_type'] = af_type(df) if split_af else None
+    keyed['protocol'] = df['subcategory']
+    values = df[metrics].astype(float)
+
+    base_keys = keyed[is_base]
+    base = values[is_base].groupby([base_keys[k] for k in GROUP], sort=False, dropna=False)
+    base_table = base.mean().add_suffix('_baseline')
+    base_table.insert(0, 'n_baseline', base.size())
+
+    rel_keys = keyed[~is_base]
+    rel = values[~is_base].groupby([rel_keys[k] for k in GROUP + ['protocol']], sort=False, dropna=False)
+    stats = {s: getattr(rel, s)() for s in ['mean', 'min', 'max']}
+    rel_table = pd.concat([stats[s].add_suffix(f'_{s}') for s in stats], axis=1)
+    rel_table.insert(0, 'n_relaxed', rel.size())
+
+    table = base_table.reset_index().merge(rel_table.reset_index(), on=GROUP, how='inner')
+    return order_pairs(table, pd.unique(base_keys['protein']), relaxed)
+
+
+def order_pairs(table: pd.DataFrame, proteins, relaxed: list) -> pd.DataFrame:
+    """Sort a pairing table by category, protein (in the given order), AF split and protocol."""
+    protein_order = {p: i for i, p in enumerate(proteins)}
+    order = pd.DataFrame({
+        'category': table['category'].map({c: i for i, c in enumerate(CATEGORIES)}).fillna(len(CATEGORIES)),
+        'protein': table['protein'].map(protein_order),
+        'af_type': table['af_type'].map({t: i for i, t in enumerate(AF_TYPES)}).fillna(-1),
+        'protocol': table['protocol'].map({p: i for i, p in enumerate(relaxed)}),
+    })
+    table = table.loc[order.sort_values(list(order.columns), kind='stable').index]
+    table['af_type'] = table['af_type'].astype(object).where(table['af_type'].notna(), None)
+    return table.reset_index(drop=True)
+
+
+def metric_deltas(table: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """Initial value vs change for one metric of a pairing table.
+
+    Columns: protein, category, af_type, protocol, initial, final, change and
+    the distances from the mean change to the lowest/highest replicate
+    (change_lo, change_hi). Groups with a missing mean are dropped.
+    """
+    initial = table[f'{metric}_baseline']
+    final = table[f'{metric}_mean']
+    out = table[['protein', 'category', 'af_type', 'protocol']].copy()
+    out['initial'] = initial
+    out['final'] = final
+    out['change'] = final - initial
+    out['change_lo'] = out['change'] - (table[f'{metric}_min'] - initial)
+    out['change_hi'] = (table[f'{metric}_max'] - initial) - out['change']
+    return out[initial.notna() & final.notna()].reset_index(drop=True)
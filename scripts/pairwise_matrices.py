@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+All-vs-all CA RMSD and TM-score matrices per target.
+
+Every structure of a target (crystal, raw AF/Boltz, all protocols and
+replicates) is mapped onto the experimental residues, stacked into one CA
+coordinate array, and compared pairwise in blocks spread over a process pool.
+Matrices are stored condensed (upper triangle, scipy order) as float32 .npy
+files that can be reopened memory-mapped.
+
+Output: validation_results/pairwise/{PDB}/{ca.npy, rmsd.npy, tm.npy, models.csv}
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from coords import read_chains
+from superpose import fit_rmsd, tm_score
+from convergence_rmsd import ResidueMap
+from manifest import refresh_manifest
+from run_validation_parallel import find_structures
+
+ROOT = Path(__file__).parent.parent
+OUTPUT_DIR = ROOT / "validation_results" / "pairwise"
+WORKERS = 12
+BLOCK = 32
+
+
+def condensed_index(i, j, n):
+    """Position of pair (i, j), i < j, in a condensed n x n matrix."""
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def stack_target(pdb_id: str, out_dir: Path):
+    """Write the target's stacked CA coordinates (N, L, 3) and model labels.
+
+    None (nothing written) when the target has no experimental structure or
+    none of its structures can be read.
+    """
+    structs = find_structures(pdb_id)
+    exp = [s for s in structs if s['category'] == 'Experimental' and s['subcategory'] == 'original']
+    if not exp:
+        return None
+
+    residue_map = ResidueMap(read_chains(exp[0]['path']))
+    labels, coords = [], []
+    for s in sorted(structs, key=lambda s: (s['category'], s['subcategory'], s['model'])):
+        try:
+            xyz = residue_map.coordinates(read_chains(s['path']))
+        except Exception:
+            continue
+        coords.append(xyz[residue_map.is_ca])
+        labels.append({k: s[k] for k in ['category', 'subcategory', 'model']})
+    if not coords:
+        print(f"  {pdb_id}: no structure could be read, skipped")
+        return None
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ca = np.stack(coords).astype(np.float32)
+    np.save(out_dir / "ca.npy", ca)
+    pd.DataFrame(labels).to_csv(out_dir / "models.csv", index=False)
+    return ca.shape
+
+
+def compute_block(ca_path, i0, i1, j0, j1, length):
+    """RMSD and TM-score for rows i0:i1 against columns j0:j1."""
+    X = np.load(ca_path, mmap_mode='r')
+    A = np.asarray(X[i0:i1], dtype=float)[:, None]
+    B = np.asarray(X[j0:j1], dtype=float)[None]
+    present = ~np.isnan(A).any(axis=-1) & ~np.isnan(B).any(axis=-1)
+    rmsd = fit_rmsd(B, A, present)
+    tm = tm_score(B, A, present, length)
+    return i0, i1, j0, j1, rmsd, tm
+
+
+def all_vs_all(pdb_id: str, workers: int = WORKERS, block: int = BLOCK, out_root: Path = OUTPUT_DIR):
+    out_dir = out_root / pdb_id
+    shape = stack_target(pdb_id, out_dir)
+    if shape is None:
+        return 0
+    n, length = shape[0], shape[1]
+    n_pairs = n * (n - 1) // 2
+
+    rmsd = np.lib.format.open_memmap(out_dir / "rmsd.npy", mode='w+', dtype=np.float32, shape=(n_pairs,))
+    tm = np.lib.format.open_memmap(out_dir / "tm.npy", mode='w+', dtype=np.float32, shape=(n_pairs,))
+
+    starts = range(0, n, block)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(compute_block, str(out_dir / "ca.npy"), i0, min(i0 + block, n),
+                          j0, min(j0 + block, n), length)
+                for i0 in starts for j0 in starts if j0 >= i0]
+        for fut in as_completed(futs):
+            i0, i1, j0, j1, r, t = fut.result()
+            ii, jj = np.meshgrid(np.arange(i0, i1), np.arange(j0, j1), indexing='ij')
+            upper = ii < jj
+            idx = condensed_index(ii[upper], jj[upper], n)
+            rmsd[idx] = r[upper]
+            tm[idx] = t[upper]
+
+    rmsd.flush()
+    tm.flush()
+    return n_pairs
+
+
+def open_matrices(pdb_id: str, out_root: Path = OUTPUT_DIR):
+    """Memory-mapped condensed (rmsd, tm) arrays and the model labels for a target."""
+    out_dir = out_root / pdb_id
+    return (np.load(out_dir / "rmsd.npy", mmap_mode='r'),
+            np.load(out_dir / "tm.npy", mmap_mode='r'),
+            pd.read_csv(out_dir / "models.csv"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="All-vs-all RMSD/TM-score matrices per target")
+    parser.add_argument('proteins', nargs='*', help='PDB IDs (default: all)')
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS)
+    parser.add_argument('--block', type=int, default=BLOCK, help='Structures per block side')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("All-vs-all RMSD / TM-score")
+    print("=" * 60)
+    print(f"Start: {datetime.now().strftime('%H:%M:%S')}")
+
+    manifest = refresh_manifest()
+    proteins = args.proteins or manifest.proteins()
+    manifest.close()
+    for pid in proteins:
+        n_pairs = all_vs_all(pid, args.workers, args.block)
+        print(f"  {pid}: {n_pairs} pairs")
+
+    print(f"\nSaved under {OUTPUT_DIR}")
+    print(f"Done: {datetime.now().strftime('%H:%M:%S')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,18 +8,21 @@ Paper figure generation for BM5.5 relaxation benchmark.
 3. Convergence test (crystal→relax vs AF→relax)
 4. MSA depth effect (full_dbs vs reduced_dbs)
 5. Bound vs unbound (does relaxation help docking?)
+
+Each figure's data is queried up front; the figures are then rendered as
+independent jobs across a process pool (see figure_jobs.py).
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
+from figure_jobs import MANIFEST, WORKERS, FigureJob, run_jobs, summarize
+from results_query import ResultsQuery, BASELINE
 
 # Config
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
 FIGURES_DIR = Path(__file__).parent.parent / "figures"
-FIGURES_DIR.mkdir(exist_ok=True)
 
 # Actual data structure from molprobity_full.csv:
 # category: Experimental, AlphaFold, Boltz
@@ -64,63 +67,55 @@ METRIC_DIRECTION = {
 }
 
 
-def load_validation_data(csv_path: str = None) -> pd.DataFrame:
-    """Load consolidated MolProbity results."""
-    if csv_path is None:
-        csv_path = RESULTS_DIR / "molprobity_full.csv"
-    return pd.read_csv(csv_path)
+def load_validation_data(csv_path: str = None) -> ResultsQuery:
+    """Query connection over consolidated MolProbity results (store, or a CSV if given)."""
+    if csv_path is not None:
+        return ResultsQuery(sources={"molprobity_full": csv_path})
+    return ResultsQuery()
 
 
 # =============================================================================
 # Figure 1: Relaxation Delta
 # =============================================================================
-def figure1_relaxation_delta(df: pd.DataFrame):
+def relaxation_deltas(db: ResultsQuery) -> dict:
+    """Per metric: per-protein relaxed - unrelaxed deltas (positive = improvement)."""
+    per_metric = {}
+    for metric in METRICS:
+        deltas = []
+
+        # Per-protein unrelaxed vs relaxed means for every protocol
+        pairs = db.paired("molprobity_full", metric, RELAXED_PROTOCOLS)
+
+        for category in CATEGORIES:
+            for protocol in RELAXED_PROTOCOLS:
+                matched = pairs[(pairs["category"] == category) & (pairs["subcategory"] == protocol)]
+                delta = matched["relaxed"] - matched["baseline"]
+                # Flip sign so positive = improvement
+                if METRIC_DIRECTION[metric] == -1:
+                    delta = -delta
+                deltas.append(pd.DataFrame({
+                    "protocol": protocol.replace("relaxed_", ""),
+                    "category": category,
+                    "delta": delta.to_numpy()
+                }))
+        per_metric[metric] = pd.concat(deltas, ignore_index=True)
+    return per_metric
+
+
+def figure1_relaxation_delta(deltas: dict):
     """
     Box plots showing MolProbity metric changes after relaxation.
     Compares each relaxed protocol against its unrelaxed baseline.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     fig, axes = plt.subplots(2, 4, figsize=(16, 8))
     axes = axes.flatten()
 
     for i, metric in enumerate(METRICS):
         ax = axes[i]
-        deltas = []
-
-        for category in CATEGORIES:
-            cat_df = df[df["category"] == category]
-
-            # Get unrelaxed baseline
-            if category == "Experimental":
-                unrelaxed = cat_df[cat_df["subcategory"] == "original"]
-            else:
-                unrelaxed = cat_df[cat_df["subcategory"] == "raw"]
-
-            if unrelaxed.empty:
-                continue
-
-            # Calculate deltas for each relaxed protocol
-            for protocol in RELAXED_PROTOCOLS:
-                relaxed = cat_df[cat_df["subcategory"] == protocol]
-                if relaxed.empty:
-                    continue
-
-                # Match by protein and model where possible
-                for protein in unrelaxed["protein"].unique():
-                    unrel_vals = unrelaxed[unrelaxed["protein"] == protein][metric].mean()
-                    rel_vals = relaxed[relaxed["protein"] == protein][metric].mean()
-                    if pd.notna(unrel_vals) and pd.notna(rel_vals):
-                        delta = rel_vals - unrel_vals
-                        # Flip sign so positive = improvement
-                        if METRIC_DIRECTION[metric] == -1:
-                            delta = -delta
-                        deltas.append({
-                            "protocol": protocol.replace("relaxed_", ""),
-                            "category": category,
-                            "delta": delta
-                        })
-
-        if deltas:
-            delta_df = pd.DataFrame(deltas)
+        delta_df = deltas[metric]
+        if len(delta_df):
             sns.boxplot(data=delta_df, x="protocol", y="delta", hue="category", ax=ax)
             ax.axhline(0, color="red", linestyle="--", alpha=0.5)
             ax.legend(fontsize=6)
@@ -138,13 +133,10 @@ def figure1_relaxation_delta(df: pd.DataFrame):
 # =============================================================================
 # Figure 2: Protocol Ranking
 # =============================================================================
-def figure2_protocol_ranking(df: pd.DataFrame):
-    """
-    Heatmap showing mean metric values by subcategory (protocol).
-    Protocols ranked by composite score.
-    """
+def protocol_rankings(db: ResultsQuery) -> pd.DataFrame:
+    """Normalized mean metrics per subcategory (1 = best) and composite score, best first."""
     # Aggregate by subcategory
-    agg = df.groupby("subcategory")[METRICS].mean()
+    agg = db.grouped("molprobity_full", METRICS, ["subcategory"]).set_index("subcategory")[METRICS]
 
     # Normalize each metric to 0-1 scale where 1 = best
     normalized = agg.copy()
@@ -156,8 +148,16 @@ def figure2_protocol_ranking(df: pd.DataFrame):
 
     # Composite score
     normalized["composite"] = normalized[METRICS].mean(axis=1)
-    normalized = normalized.sort_values("composite", ascending=False)
+    return normalized.sort_values("composite", ascending=False)
 
+
+def figure2_protocol_ranking(normalized: pd.DataFrame):
+    """
+    Heatmap showing mean metric values by subcategory (protocol).
+    Protocols ranked by composite score.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     # Create heatmap
     fig, axes = plt.subplots(1, 2, figsize=(16, 8), gridspec_kw={"width_ratios": [3, 1]})
 
@@ -182,23 +182,23 @@ def figure2_protocol_ranking(df: pd.DataFrame):
     plt.close()
 
     print("  Saved fig2_protocol_ranking.png")
-    return normalized
 
 
 # =============================================================================
 # Figure 3: Convergence Test
 # =============================================================================
-def figure3_convergence(df: pd.DataFrame):
+def figure3_convergence(relaxed: pd.DataFrame):
     """
     Do crystal and AF/Boltz structures converge to same geometry after relaxation?
-    Compare experimental→relax vs predicted→relax endpoint distributions.
+    Compare experimental→relax vs predicted→relax endpoint distributions
+    (relaxed: category and metric columns of the relaxed rows).
+    Structural distances between the endpoints come from convergence_rmsd.py
+    (see paper_figures_v2.fig3_convergence_rmsd).
     """
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(2, 4, figsize=(16, 8))
     axes = axes.flatten()
 
-    # Filter to relaxed only
-    relaxed = df[df["subcategory"].str.startswith("relaxed_")]
-
     for i, metric in enumerate(METRICS):
         ax = axes[i]
 
@@ -229,9 +229,11 @@ def figure3_convergence(df: pd.DataFrame):
 # =============================================================================
 def figure4_predictor_comparison(df: pd.DataFrame):
     """
-    Compare AlphaFold vs Boltz predictions before and after relaxation.
+    Compare AlphaFold vs Boltz predictions before and after relaxation
+    (df: AlphaFold/Boltz rows, raw and relaxed_cartesian_ref15).
     (MSA depth analysis requires BM5.5 full run with both full_dbs and reduced_dbs)
     """
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(2, 4, figsize=(16, 8))
     axes = axes.flatten()
 
@@ -275,29 +277,27 @@ def figure4_predictor_comparison(df: pd.DataFrame):
 # =============================================================================
 # Figure 5: Protocol Improvement Summary
 # =============================================================================
-def figure5_protocol_improvement(df: pd.DataFrame):
+def figure5_protocol_improvement(summary: pd.DataFrame):
     """
     Summary: which protocol improves structures the most?
-    Shows improvement in MolProbity score (lower = better).
+    Shows improvement in MolProbity score (lower = better), from the mean
+    score per category and subcategory.
 
     Note: For BM5.5 docking analysis, will need RMSD to bound structures.
     """
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
 
     # Left: MolProbity score by category and protocol
     ax1 = axes[0]
     plot_data = []
+    means = summary.set_index(["category", "subcategory"])["molprobity_score"]
     for category in CATEGORIES:
-        cat_df = df[df["category"] == category]
-
         # Get unrelaxed baseline
-        if category == "Experimental":
-            baseline = cat_df[cat_df["subcategory"] == "original"]["molprobity_score"].mean()
-        else:
-            baseline = cat_df[cat_df["subcategory"] == "raw"]["molprobity_score"].mean()
+        baseline = means.get((category, BASELINE[category]), np.nan)
 
         for protocol in RELAXED_PROTOCOLS:
-            relaxed_score = cat_df[cat_df["subcategory"] == protocol]["molprobity_score"].mean()
+            relaxed_score = means.get((category, protocol), np.nan)
             if pd.notna(baseline) and pd.notna(relaxed_score):
                 improvement = baseline - relaxed_score  # Positive = improved
                 plot_data.append({
@@ -319,7 +319,6 @@ def figure5_protocol_improvement(df: pd.DataFrame):
 
     # Right: Best protocol by category
     ax2 = axes[1]
-    summary = df.groupby(["category", "subcategory"])["molprobity_score"].mean().reset_index()
     summary = summary[summary["subcategory"].str.startswith("relaxed_")]
 
     best = summary.loc[summary.groupby("category")["molprobity_score"].idxmin()]
@@ -347,35 +346,64 @@ def figure5_protocol_improvement(df: pd.DataFrame):
 # =============================================================================
 # Main
 # =============================================================================
-def generate_all_figures(csv_path: str = None):
-    """Generate all 5 paper figures."""
+def generate_all_figures(csv_path: str = None, workers: int = WORKERS, force: bool = False):
+    """Generate all 5 paper figures; figures whose inputs are unchanged are kept unless force."""
+    FIGURES_DIR.mkdir(exist_ok=True)
     print("Loading data...")
-    df = load_validation_data(csv_path)
-    print(f"Loaded {len(df)} rows")
-    print(f"Categories: {df['category'].unique().tolist()}")
-    print(f"Subcategories: {df['subcategory'].unique().tolist()}")
+    db = load_validation_data(csv_path)
+    counts = db.grouped("molprobity_full", [], ["category", "subcategory"])
+    print(f"Loaded {counts['n'].sum()} rows")
+    categories = counts['category'].unique().tolist()
+    categories = [c for c in CATEGORIES if c in categories] + sorted(set(categories) - set(CATEGORIES))
+    print(f"Categories: {categories}")
+    print(f"Subcategories: {sorted(counts['subcategory'].unique())}")
     print()
 
-    print("Generating Figure 1: Relaxation Delta...")
-    figure1_relaxation_delta(df)
+    jobs = []
+    print("Preparing Figure 1: Relaxation Delta...")
+    jobs.append(FigureJob("fig1_relaxation_delta.png", figure1_relaxation_delta, (relaxation_deltas(db),),
+                          path=FIGURES_DIR / "fig1_relaxation_delta.png"))
 
-    print("Generating Figure 2: Protocol Ranking...")
-    rankings = figure2_protocol_ranking(df)
+    print("Preparing Figure 2: Protocol Ranking...")
+    rankings = protocol_rankings(db)
+    jobs.append(FigureJob("fig2_protocol_ranking.png", figure2_protocol_ranking, (rankings,),
+                          path=FIGURES_DIR / "fig2_protocol_ranking.png"))
     print("\nTop protocols by composite score:")
     print(rankings[["composite"]].head(5))
     print()
 
-    print("Generating Figure 3: Convergence...")
-    figure3_convergence(df)
+    print("Preparing Figure 3: Convergence...")
+    relaxed = db.select("molprobity_full", ["category"] + METRICS, {"subcategory": RELAXED_PROTOCOLS})
+    jobs.append(FigureJob("fig3_convergence.png", figure3_convergence, (relaxed,),
+                          path=FIGURES_DIR / "fig3_convergence.png"))
+
+    print("Preparing Figure 4: Predictor Comparison...")
+    predictors = db.select("molprobity_full", ["category", "subcategory"] + METRICS,
+                           {"category": ["AlphaFold", "Boltz"],
+                            "subcategory": ["raw", "relaxed_cartesian_ref15"]})
+    jobs.append(FigureJob("fig4_predictor_comparison.png", figure4_predictor_comparison, (predictors,),
+                          path=FIGURES_DIR / "fig4_predictor_comparison.png"))
 
-    print("Generating Figure 4: Predictor Comparison...")
-    figure4_predictor_comparison(df)
+    print("Preparing Figure 5: Protocol Improvement...")
+    summary = db.grouped("molprobity_full", ["molprobity_score"], ["category", "subcategory"])
+    jobs.append(FigureJob("fig5_protocol_improvement.png", figure5_protocol_improvement, (summary,),
+                          path=FIGURES_DIR / "fig5_protocol_improvement.png"))
 
-    print("Generating Figure 5: Protocol Improvement...")
-    figure5_protocol_improvement(df)
+    print(f"\nRendering {len(jobs)} figures...")
+    table = run_jobs(jobs, workers, manifest=FIGURES_DIR / MANIFEST, force=force)
+    print(f"Figures: {summarize(table)}")
 
     print(f"\nAll figures saved to {FIGURES_DIR}")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Generate the 5 paper figures")
+    parser.add_argument('--csv', help='Consolidated MolProbity CSV instead of the results store')
+    parser.add_argument('-j', '--workers', type=int, default=WORKERS, help='Render processes')
+    parser.add_argument('--force', action='store_true', help='Re-render unchanged figures too')
+    args = parser.parse_args()
+    generate_all_figures(args.csv, args.workers, args.force)
+
+
 if __name__ == "__main__":
-    generate_all_figures()
+    main()
@@ -5,23 +5,32 @@ Paper figures v2 - aligned with the original spec.
 Original spec:
 - Fig 1: Heatmap, clashscore improvement by (protocol) x (prediction method)
 - Fig 2: Paired scatter, pre vs post relaxation MolProbity scores per structure
-- Fig 3: Convergence, RMSD between crystal-relaxed and AF-relaxed (needs structural data)
+- Fig 3: Convergence, RMSD between crystal-relaxed and AF-relaxed (from convergence_rmsd.py)
 - Fig 4: Box plots, per-protocol delta_toward_bound (needs bound structures)
 - Table 1: Summary statistics
+- Table 2: Relaxation deltas with bootstrap 95% CIs
 
 This script adds what's missing from v1 and can run with current data.
+Figure data is rolled up from the MolProbity summary cube (see
+summary_cube.py); the figures are rendered as parallel jobs
+(see figure_jobs.py). --plot-mode hexbin or hist2d draws the scatter panels
+as density grids (see density_plots.py).
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
+
+from bootstrap import mean_ci
+from convergence_rmsd import load_convergence
+from density_plots import PLOT_MODES, Layer, scatter_panel
+from figure_jobs import MANIFEST, FigureJob, run_jobs, summarize
+from results_store import BASELINE
+from summary_cube import load_cube
 
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
 FIGURES_DIR = Path(__file__).parent.parent / "figures"
-FIGURES_DIR.mkdir(exist_ok=True)
 
 CATEGORIES = ["Experimental", "AlphaFold", "Boltz"]
 RELAXED_PROTOCOLS = [
@@ -37,27 +46,24 @@ KEY_METRICS = ["clashscore", "molprobity_score", "rama_outliers_pct", "rota_outl
 
 
 def load_data():
-    return pd.read_csv(RESULTS_DIR / "molprobity_full.csv")
+    """Summary cube of the MolProbity results; figures pull aggregates, not rows."""
+    return load_cube("molprobity")
 
 
 # =============================================================================
 # Fig 1: Clashscore improvement heatmap (protocol x category)
 # =============================================================================
-def fig1_clashscore_heatmap(df):
-    """Heatmap: mean clashscore improvement by protocol and category."""
+def clashscore_improvements(cube):
+    """Mean clashscore improvement, protocol x category (None if there is no data)."""
     improvements = []
+    means = cube.grouped(["category", "subcategory"], ["clashscore"]).wide()
+    means = means.set_index(["category", "subcategory"])["clashscore_mean"]
 
     for category in CATEGORIES:
-        cat_df = df[df["category"] == category]
-
-        # Baseline
-        if category == "Experimental":
-            baseline = cat_df[cat_df["subcategory"] == "original"]["clashscore"].mean()
-        else:
-            baseline = cat_df[cat_df["subcategory"] == "raw"]["clashscore"].mean()
+        baseline = means.get((category, BASELINE[category]), np.nan)
 
         for protocol in RELAXED_PROTOCOLS:
-            relaxed = cat_df[cat_df["subcategory"] == protocol]["clashscore"].mean()
+            relaxed = means.get((category, protocol), np.nan)
             if pd.notna(baseline) and pd.notna(relaxed):
                 improvement = baseline - relaxed  # Positive = improved
                 improvements.append({
@@ -69,12 +75,16 @@ def fig1_clashscore_heatmap(df):
                 })
 
     if not improvements:
-        print("  No data for clashscore heatmap")
-        return
+        return None
 
     imp_df = pd.DataFrame(improvements)
-    pivot = imp_df.pivot(index="protocol", columns="category", values="improvement")
+    return imp_df.pivot(index="protocol", columns="category", values="improvement")
 
+
+def fig1_clashscore_heatmap(pivot):
+    """Heatmap: mean clashscore improvement by protocol and category."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     fig, ax = plt.subplots(figsize=(10, 6))
     sns.heatmap(pivot, annot=True, fmt=".1f", cmap="RdYlGn", center=0, ax=ax,
                 cbar_kws={"label": "Clashscore Reduction"})
@@ -87,39 +97,30 @@ def fig1_clashscore_heatmap(df):
     plt.close()
     print("  Saved fig1_clashscore_heatmap.png")
 
-    return pivot
-
 
 # =============================================================================
 # Fig 2: Paired scatter (pre vs post per structure)
 # =============================================================================
-def fig2_paired_scatter(df):
-    """Scatter plot: unrelaxed vs relaxed MolProbity score per structure."""
+def fig2_paired_scatter(pairs, mode="auto"):
+    """Scatter plot: unrelaxed vs relaxed MolProbity score per structure.
+
+    pairs: baseline vs relaxed values, e.g. per-protein means (ResultsQuery.paired).
+    mode: plot mode per panel (density_plots.PLOT_MODES); density modes for full-scale pairs.
+    """
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(2, 3, figsize=(15, 10))
     axes = axes.flatten()
+    colors = {"Experimental": "green", "AlphaFold": "blue", "Boltz": "red"}
+    groups = dict(list(pairs.groupby(["subcategory", "category"], sort=False)))
 
     for i, protocol in enumerate(RELAXED_PROTOCOLS):
         ax = axes[i]
 
+        layers = []
         for category in CATEGORIES:
-            cat_df = df[df["category"] == category]
-
-            # Get baseline
-            if category == "Experimental":
-                baseline_df = cat_df[cat_df["subcategory"] == "original"]
-            else:
-                baseline_df = cat_df[cat_df["subcategory"] == "raw"]
-
-            relaxed_df = cat_df[cat_df["subcategory"] == protocol]
-
-            # Match by protein
-            for protein in baseline_df["protein"].unique():
-                base_score = baseline_df[baseline_df["protein"] == protein]["molprobity_score"].mean()
-                rel_score = relaxed_df[relaxed_df["protein"] == protein]["molprobity_score"].mean()
-
-                if pd.notna(base_score) and pd.notna(rel_score):
-                    color = {"Experimental": "green", "AlphaFold": "blue", "Boltz": "red"}[category]
-                    ax.scatter(base_score, rel_score, c=color, alpha=0.6, s=30)
+            matched = groups.get((protocol, category), pairs.iloc[:0])
+            layers.append(Layer(matched["baseline"], matched["relaxed"], colors[category]))
+        scatter_panel(ax, layers, mode, alpha=0.6, size=30)
 
         # Diagonal line (no change)
         lims = [0, max(ax.get_xlim()[1], ax.get_ylim()[1])]
@@ -147,53 +148,72 @@ def fig2_paired_scatter(df):
     print("  Saved fig2_paired_scatter.png")
 
 
+# =============================================================================
+# Fig 3: Convergence (RMSD between crystal-derived and predicted models)
+# =============================================================================
+def fig3_convergence_rmsd(rmsd_df):
+    """Box plots: backbone RMSD to crystal-derived models, raw vs each protocol."""
+    import matplotlib.pyplot as plt
+    stages = ["raw"] + RELAXED_PROTOCOLS
+    fig, axes = plt.subplots(1, 2, figsize=(14, 5), sharey=True)
+
+    for ax, category in zip(axes, ["AlphaFold", "Boltz"]):
+        cat_df = rmsd_df[rmsd_df["category"] == category]
+        data = [cat_df[cat_df["subcategory"] == s]["backbone_rmsd"].dropna() for s in stages]
+        labels = [s.replace("relaxed_", "") for s in stages]
+        keep = [i for i, d in enumerate(data) if len(d)]
+        if keep:
+            ax.boxplot([data[i] for i in keep], tick_labels=[labels[i] for i in keep],
+                       showfliers=False)
+        ax.set_title(f"{category} vs Experimental")
+        ax.tick_params(axis="x", rotation=45)
+    axes[0].set_ylabel("Backbone RMSD to crystal-derived model (A)")
+
+    plt.suptitle("Fig 3: Convergence - crystal-relaxed vs predicted-relaxed models", fontsize=14)
+    plt.tight_layout()
+    plt.savefig(FIGURES_DIR / "fig3_convergence_rmsd.png", dpi=150)
+    plt.close()
+    print("  Saved fig3_convergence_rmsd.png")
+
+
 # =============================================================================
 # Table 1: Summary statistics
 # =============================================================================
-def table1_summary_stats(df):
+def summary_row(summary, category, subcategory, protocol):
+    """Table 1 row for one (category, subcategory) group; NaN stats if it has no rows."""
+    key = (category, subcategory)
+    row = summary.loc[key] if key in summary.index else pd.Series(dtype=float)
+    return {
+        "category": category,
+        "protocol": protocol,
+        "n": int(row.get("n", 0)),
+        "clashscore_mean": row.get("clashscore_mean", np.nan),
+        "clashscore_std": row.get("clashscore_std", np.nan),
+        "molprobity_mean": row.get("molprobity_score_mean", np.nan),
+        "molprobity_std": row.get("molprobity_score_std", np.nan),
+        "rama_outliers_mean": row.get("rama_outliers_pct_mean", np.nan),
+        "rota_outliers_mean": row.get("rota_outliers_pct_mean", np.nan),
+    }
+
+
+def table1_summary_stats(cube):
     """Generate summary statistics table."""
     results = []
+    # Rolled up from the cube cells; the full table is never loaded
+    summary = cube.grouped(["category", "subcategory"], KEY_METRICS)
+    summary = summary.wide(stats=("mean", "std")).set_index(["category", "subcategory"])
 
     for category in CATEGORIES:
-        cat_df = df[df["category"] == category]
-
         # Baseline stats
-        if category == "Experimental":
-            baseline = cat_df[cat_df["subcategory"] == "original"]
-            baseline_name = "original"
-        else:
-            baseline = cat_df[cat_df["subcategory"] == "raw"]
-            baseline_name = "raw"
-
-        results.append({
-            "category": category,
-            "protocol": baseline_name,
-            "n": len(baseline),
-            "clashscore_mean": baseline["clashscore"].mean(),
-            "clashscore_std": baseline["clashscore"].std(),
-            "molprobity_mean": baseline["molprobity_score"].mean(),
-            "molprobity_std": baseline["molprobity_score"].std(),
-            "rama_outliers_mean": baseline["rama_outliers_pct"].mean(),
-            "rota_outliers_mean": baseline["rota_outliers_pct"].mean(),
-        })
+        baseline_name = BASELINE[category]
+        results.append(summary_row(summary, category, baseline_name, baseline_name))
 
         # Relaxed stats
         for protocol in RELAXED_PROTOCOLS:
-            relaxed = cat_df[cat_df["subcategory"] == protocol]
-            if relaxed.empty:
+            if (category, protocol) not in summary.index:
                 continue
-
-            results.append({
-                "category": category,
-                "protocol": protocol.replace("relaxed_", ""),
-                "n": len(relaxed),
-                "clashscore_mean": relaxed["clashscore"].mean(),
-                "clashscore_std": relaxed["clashscore"].std(),
-                "molprobity_mean": relaxed["molprobity_score"].mean(),
-                "molprobity_std": relaxed["molprobity_score"].std(),
-                "rama_outliers_mean": relaxed["rama_outliers_pct"].mean(),
-                "rota_outliers_mean": relaxed["rota_outliers_pct"].mean(),
-            })
+            results.append(summary_row(summary, category, protocol,
+                                       protocol.replace("relaxed_", "")))
 
     summary_df = pd.DataFrame(results)
     summary_df.to_csv(FIGURES_DIR / "table1_summary_stats.csv", index=False)
@@ -203,52 +223,79 @@ def table1_summary_stats(df):
 
 
 # =============================================================================
-# Statistical tests
+# Table 2: Relaxation deltas with bootstrap CIs
 # =============================================================================
-def statistical_tests(df):
-    """Run statistical tests comparing protocols."""
-    print("\n=== Statistical Tests ===\n")
-
-    results = []
-
-    for category in CATEGORIES:
-        cat_df = df[df["category"] == category]
-
-        if category == "Experimental":
-            baseline = cat_df[cat_df["subcategory"] == "original"]
-        else:
-            baseline = cat_df[cat_df["subcategory"] == "raw"]
+def table2_delta_ci(cube):
+    """Mean per-protein change (relaxed - unrelaxed) with 95% bootstrap CIs.
+
+    One cell per category x protocol x metric; all cells are resampled in one
+    batched bootstrap over proteins.
+    """
+    rows, cells = [], []
+    for metric in KEY_METRICS:
+        pairs = cube.paired(metric, RELAXED_PROTOCOLS)
+        for category in CATEGORIES:
+            for protocol in RELAXED_PROTOCOLS:
+                matched = pairs[(pairs["category"] == category) & (pairs["subcategory"] == protocol)]
+                if matched.empty:
+                    continue
+                delta = (matched["relaxed"] - matched["baseline"]).to_numpy()
+                rows.append({
+                    "category": category,
+                    "protocol": protocol.replace("relaxed_", ""),
+                    "metric": metric,
+                    "n_proteins": len(delta),
+                    "delta_mean": delta.mean(),
+                })
+                cells.append(delta)
 
-        for protocol in RELAXED_PROTOCOLS:
-            relaxed = cat_df[cat_df["subcategory"] == protocol]
+    delta_df = pd.DataFrame(rows, columns=["category", "protocol", "metric", "n_proteins", "delta_mean"])
+    delta_df["ci_low"], delta_df["ci_high"] = mean_ci(cells)
+    delta_df.to_csv(FIGURES_DIR / "table2_delta_ci.csv", index=False)
+    print(f"  Saved table2_delta_ci.csv ({len(delta_df)} cells)")
 
-            # Match by protein for paired test
-            paired_baseline = []
-            paired_relaxed = []
+    return delta_df
 
-            for protein in baseline["protein"].unique():
-                b = baseline[baseline["protein"] == protein]["molprobity_score"].mean()
-                r = relaxed[relaxed["protein"] == protein]["molprobity_score"].mean()
-                if pd.notna(b) and pd.notna(r):
-                    paired_baseline.append(b)
-                    paired_relaxed.append(r)
 
-            if len(paired_baseline) >= 3:
-                # Wilcoxon signed-rank (non-parametric paired test)
-                stat, p_value = stats.wilcoxon(paired_baseline, paired_relaxed)
-                mean_diff = np.mean(np.array(paired_baseline) - np.array(paired_relaxed))
+# =============================================================================
+# Statistical tests
+# =============================================================================
+def statistical_tests(cube):
+    """Run statistical tests comparing protocols.
+
+    Paired Wilcoxon and t tests for every metric x category x protocol cell
+    in one batch, Benjamini-Hochberg q-values over all cells, and Cliff's
+    delta of relaxed vs unrelaxed values.
+    """
+    from batch_stats import paired_tests
+    print("\n=== Statistical Tests ===\n")
 
-                results.append({
-                    "category": category,
-                    "protocol": protocol.replace("relaxed_", ""),
-                    "n_pairs": len(paired_baseline),
-                    "mean_improvement": mean_diff,
-                    "wilcoxon_stat": stat,
-                    "p_value": p_value,
-                    "significant": p_value < 0.05
-                })
+    cells, baseline, relaxed = [], [], []
+    for metric in KEY_METRICS:
+        pairs = cube.paired(metric, RELAXED_PROTOCOLS)
+        for category in CATEGORIES:
+            for protocol in RELAXED_PROTOCOLS:
+                # Matched by protein for paired test
+                matched = pairs[(pairs["category"] == category) & (pairs["subcategory"] == protocol)]
+                if len(matched) >= 3:
+                    cells.append((category, protocol.replace("relaxed_", ""), metric))
+                    baseline.append(matched["baseline"].to_numpy())
+                    relaxed.append(matched["relaxed"].to_numpy())
+
+    tests = paired_tests(baseline, relaxed)
+    stats_df = pd.DataFrame(cells, columns=["category", "protocol", "metric"])
+    stats_df["n_pairs"] = tests["n"]
+    stats_df["mean_improvement"] = -tests["mean_change"]
+    stats_df["wilcoxon_stat"] = tests["wilcoxon_stat"]
+    stats_df["p_value"] = tests["wilcoxon_p"]
+    stats_df["q_value"] = tests["wilcoxon_q"]
+    stats_df["t_stat"] = tests["t_stat"]
+    stats_df["t_p_value"] = tests["t_p"]
+    stats_df["t_q_value"] = tests["t_q"]
+    stats_df["cliffs_delta"] = tests["cliffs_delta"]
+    stats_df["significant"] = stats_df["p_value"] < 0.05
+    stats_df["significant_fdr"] = stats_df["q_value"] < 0.05
 
-    stats_df = pd.DataFrame(results)
     stats_df.to_csv(FIGURES_DIR / "statistical_tests.csv", index=False)
     print(stats_df.to_string())
     print("\n  Saved statistical_tests.csv")
@@ -259,35 +306,26 @@ def statistical_tests(df):
 # =============================================================================
 # Outlier analysis
 # =============================================================================
-def outlier_analysis(df):
+def outlier_analysis(cube):
     """Which structures don't improve with relaxation?"""
     outliers = []
 
+    best_protocol = "relaxed_normal_beta"  # Best from pilot
+    pairs = cube.paired("molprobity_score", best_protocol)
+
     for category in CATEGORIES:
-        cat_df = df[df["category"] == category]
-
-        if category == "Experimental":
-            baseline = cat_df[cat_df["subcategory"] == "original"]
-        else:
-            baseline = cat_df[cat_df["subcategory"] == "raw"]
-
-        best_protocol = "relaxed_normal_beta"  # Best from pilot
-        relaxed = cat_df[cat_df["subcategory"] == best_protocol]
-
-        for protein in baseline["protein"].unique():
-            b = baseline[baseline["protein"] == protein]["molprobity_score"].mean()
-            r = relaxed[relaxed["protein"] == protein]["molprobity_score"].mean()
-
-            if pd.notna(b) and pd.notna(r):
-                improvement = b - r
-                if improvement < 0:  # Got worse
-                    outliers.append({
-                        "protein": protein,
-                        "category": category,
-                        "baseline_score": b,
-                        "relaxed_score": r,
-                        "degradation": -improvement
-                    })
+        matched = pairs[pairs["category"] == category]
+
+        for protein, b, r in zip(matched["protein"], matched["baseline"], matched["relaxed"]):
+            improvement = b - r
+            if improvement < 0:  # Got worse
+                outliers.append({
+                    "protein": protein,
+                    "category": category,
+                    "baseline_score": b,
+                    "relaxed_score": r,
+                    "degradation": -improvement
+                })
 
     if outliers:
         outlier_df = pd.DataFrame(outliers).sort_values("degradation", ascending=False)
@@ -303,27 +341,56 @@ def outlier_analysis(df):
 # Main
 # =============================================================================
 def main():
+    parser = argparse.ArgumentParser(description="Paper figures and tables (v2)")
+    parser.add_argument('--plot-mode', choices=PLOT_MODES, default='auto',
+                        help='Scatter panels as points or density grids (auto: by point count)')
+    args = parser.parse_args()
+
+    FIGURES_DIR.mkdir(exist_ok=True)
     print("Loading data...")
-    df = load_data()
-    print(f"Loaded {len(df)} rows\n")
+    cube = load_data()
+    print(f"Summary cube: {len(cube.cells)} cells over {cube.rows} rows\n")
 
-    print("Generating Fig 1: Clashscore Heatmap...")
-    pivot = fig1_clashscore_heatmap(df)
+    jobs = []
+    print("Preparing Fig 1: Clashscore Heatmap...")
+    pivot = clashscore_improvements(cube)
     if pivot is not None:
+        jobs.append(FigureJob("fig1_clashscore_heatmap.png", fig1_clashscore_heatmap, (pivot,),
+                              path=FIGURES_DIR / "fig1_clashscore_heatmap.png"))
         print("\nClashscore improvement matrix:")
         print(pivot)
+    else:
+        print("  No data for clashscore heatmap")
+
+    print("\nPreparing Fig 2: Paired Scatter...")
+    # Per-protein baseline vs relaxed means, matched by protein
+    pairs = cube.paired("molprobity_score", RELAXED_PROTOCOLS)
+    jobs.append(FigureJob("fig2_paired_scatter.png", fig2_paired_scatter, (pairs, args.plot_mode),
+                          path=FIGURES_DIR / "fig2_paired_scatter.png"))
 
-    print("\nGenerating Fig 2: Paired Scatter...")
-    fig2_paired_scatter(df)
+    print("\nPreparing Fig 3: Convergence RMSD...")
+    rmsd_df = load_convergence()
+    if rmsd_df is None:
+        print("  Skipped: run convergence_rmsd.py first")
+    else:
+        jobs.append(FigureJob("fig3_convergence_rmsd.png", fig3_convergence_rmsd, (rmsd_df,),
+                              path=FIGURES_DIR / "fig3_convergence_rmsd.png"))
+
+    print(f"\nRendering {len(jobs)} figures...")
+    table = run_jobs(jobs, manifest=FIGURES_DIR / MANIFEST)
+    print(f"Figures: {summarize(table)}")
 
     print("\nGenerating Table 1: Summary Stats...")
-    summary = table1_summary_stats(df)
+    summary = table1_summary_stats(cube)
+
+    print("\nGenerating Table 2: Delta CIs...")
+    table2_delta_ci(cube)
 
     print("\nRunning Statistical Tests...")
-    statistical_tests(df)
+    statistical_tests(cube)
 
     print("\nRunning Outlier Analysis...")
-    outlier_analysis(df)
+    outlier_analysis(cube)
 
     print(f"\n=== All outputs saved to {FIGURES_DIR} ===")
 
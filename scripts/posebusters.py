@@ -5,7 +5,6 @@ Validates geometry, connectivity, and energetics of protein structures.
 """
 
 import argparse
-import gzip
 import shutil
 import subprocess
 import tempfile
@@ -16,18 +15,20 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, as_completed
-from tqdm import tqdm
+from energy_cache import EnergyCache, rosetta_identity
+from manifest import refresh_manifest, load_structures, content_hash
+from shards import read_structure
+from results_store import write_partitions
+from result_channel import ResultChannel
+from streaming_stats import GroupedStats
+from summary_cube import ensure_cube
 import warnings
-warnings.filterwarnings('ignore')
 
 PROJECT_DIR = Path(__file__).parent.parent
 PROTEINS_DIR = PROJECT_DIR / "proteins"
 OUTPUT_DIR = PROJECT_DIR / "validation_results"
 TEMP_DIR = OUTPUT_DIR / "temp"
 
-for d in [OUTPUT_DIR, TEMP_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
-
 STANDARD_AA = {
     'ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
     'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL'
@@ -41,6 +42,19 @@ ROSETTA_BINS = [
     'score_jd2',
 ]
 
+# score_jd2 rescoring uses the default weights; embedded totals from other
+# score functions are not comparable and trigger a rescore instead
+ROSETTA_SCOREFXN = 'ref2015'
+
+# {content_hash: score} preloaded into each worker from the energy cache
+ENERGY_CACHE = None
+
+# Shared-memory result slots, attached in each worker (see result_channel.py)
+CHANNEL = None
+
+POSE_ENERGIES_BEGIN = '#BEGIN_POSE_ENERGIES_TABLE'
+POSE_ENERGIES_END = '#END_POSE_ENERGIES_TABLE'
+
 VDW_RADII = {'C': 1.7, 'N': 1.55, 'O': 1.52, 'S': 1.8, 'H': 1.2}
 
 RING_ATOMS = {
@@ -58,107 +72,121 @@ def find_rosetta():
     return None
 
 
+def posebusters_model(row: dict):
+    """(subcategory, model name) under the PoseBusters naming, or None to skip the file."""
+    stem = row['stem']
+    if row['subcategory'] == 'original':
+        return 'original', 'exp'
+    if row['subcategory'] == 'raw':
+        index = stem.split('_')[1] if row['category'] == 'AlphaFold' else stem.split('_')[-1]
+        return 'raw', f"model{index}"
+    if row['category'] == 'Experimental':
+        return row['subcategory'], f"r{stem.split('_r')[-1]}"
+
+    # relax/{AF,Boltz}/{model}/{protocol}/*.pdb.gz only
+    parts = row['rel_path'].split('/')
+    if len(parts) != 5 or parts[3] == 'log':
+        return None
+    rep = stem.split('_r')[-1] if '_r' in stem else stem
+    return f"relaxed_{parts[3]}", f"{parts[2]}_r{rep}"
+
+
 def find_structures():
     """Enumerate all PDB files across experimental, AlphaFold, and Boltz predictions."""
     structures = []
 
-    for protein_dir in sorted(PROTEINS_DIR.iterdir()):
-        if not protein_dir.is_dir():
+    for row in load_structures():
+        named = posebusters_model(row)
+        if named is None:
             continue
-
-        pid = protein_dir.name
-
-        # Experimental
-        exp_pdb = protein_dir / f"{pid}.pdb"
-        if exp_pdb.exists():
-            structures.append({
-                'path': str(exp_pdb), 'protein': pid,
-                'category': 'Experimental', 'subcategory': 'original', 'model': 'exp'
-            })
-
-        # AlphaFold raw
-        af_dir = protein_dir / "AF"
-        if af_dir.exists():
-            for pdb in sorted(af_dir.glob("ranked_*.pdb")):
-                structures.append({
-                    'path': str(pdb), 'protein': pid,
-                    'category': 'AlphaFold', 'subcategory': 'raw',
-                    'model': f"model{pdb.stem.split('_')[1]}"
-                })
-
-        # Boltz raw
-        boltz_dir = protein_dir / "Boltz"
-        if boltz_dir.exists():
-            for pdb in sorted(boltz_dir.glob("boltz_input_model_*.pdb")):
-                structures.append({
-                    'path': str(pdb), 'protein': pid,
-                    'category': 'Boltz', 'subcategory': 'raw',
-                    'model': f"model{pdb.stem.split('_')[-1]}"
-                })
-
-        # Relaxed structures (experimental)
-        for protocol in ['cartesian_beta', 'cartesian_ref15', 'dualspace_beta',
-                         'dualspace_ref15', 'normal_beta', 'normal_ref15']:
-            relax_dir = protein_dir / protocol
-            if relax_dir.exists():
-                for pdb_gz in sorted(relax_dir.glob(f"{pid}_r*.pdb.gz")):
-                    rep = pdb_gz.stem.replace('.pdb', '').split('_r')[-1]
-                    structures.append({
-                        'path': str(pdb_gz), 'protein': pid,
-                        'category': 'Experimental', 'subcategory': f'relaxed_{protocol}',
-                        'model': f"r{rep}", 'compressed': True
-                    })
-
-        # Relaxed structures (AF/Boltz)
-        relax_base = protein_dir / "relax"
-        if relax_base.exists():
-            for cat_name in ['AF', 'Boltz']:
-                cat_dir = relax_base / cat_name
-                if not cat_dir.exists():
-                    continue
-                for model_dir in sorted(cat_dir.iterdir()):
-                    if not model_dir.is_dir():
-                        continue
-                    for protocol_dir in sorted(model_dir.iterdir()):
-                        if not protocol_dir.is_dir() or protocol_dir.name == 'log':
-                            continue
-                        for pdb_gz in sorted(protocol_dir.glob("*.pdb.gz")):
-                            stem = pdb_gz.stem.replace('.pdb', '')
-                            rep = stem.split('_r')[-1] if '_r' in stem else stem
-                            structures.append({
-                                'path': str(pdb_gz), 'protein': pid,
-                                'category': 'AlphaFold' if cat_name == 'AF' else 'Boltz',
-                                'subcategory': f'relaxed_{protocol_dir.name}',
-                                'model': f"{model_dir.name}_r{rep}", 'compressed': True
-                            })
+        subcategory, model = named
+        struct = {
+            'path': row['path'], 'protein': row['protein'],
+            'category': row['category'], 'subcategory': subcategory, 'model': model,
+            'content_hash': row['content_hash'],
+        }
+        if row['compressed']:
+            struct['compressed'] = True
+        structures.append(struct)
 
     return structures
 
 
-def parse_pdb(pdb_path: str) -> list:
-    """Parse ATOM/HETATM records from PDB file."""
+def infer_score_function(terms) -> str:
+    """Identify the Rosetta score function from the terms of a pose energies table."""
+    name = 'beta_nov16' if 'lk_ball' in terms else 'ref2015'
+    if 'cart_bonded' in terms:
+        name += '_cart'
+    return name
+
+
+def parse_energy_row(fields: list) -> list:
+    values = []
+    for v in fields:
+        try:
+            values.append(float(v))
+        except ValueError:
+            values.append(None)
+    return values
+
+
+def parse_structure(pdb_path: str):
+    """Parse ATOM/HETATM records and the Rosetta pose energies table in one pass.
+
+    Returns (atoms, energies). energies is None unless the file carries a
+    #BEGIN_POSE_ENERGIES_TABLE block, as written by Rosetta relax; otherwise it
+    holds the score function, weights, pose total and per-residue totals.
+    """
     atoms = []
+    energies = None
+    in_table = False
+    terms = []
     try:
         with open(pdb_path, 'r') as f:
             for line in f:
-                if not (line.startswith('ATOM') or line.startswith('HETATM')):
-                    continue
-                try:
-                    atom = {
-                        'name': line[12:16].strip(),
-                        'resname': line[17:20].strip(),
-                        'chain': line[21].strip(),
-                        'resseq': int(line[22:26]),
-                        'x': float(line[30:38]),
-                        'y': float(line[38:46]),
-                        'z': float(line[46:54]),
-                        'element': line[76:78].strip() if len(line) > 76 else line[12:16].strip()[0]
-                    }
-                    atoms.append(atom)
-                except (ValueError, IndexError):
-                    continue
+                if line.startswith('ATOM') or line.startswith('HETATM'):
+                    try:
+                        atom = {
+                            'name': line[12:16].strip(),
+                            'resname': line[17:20].strip(),
+                            'chain': line[21].strip(),
+                            'resseq': int(line[22:26]),
+                            'x': float(line[30:38]),
+                            'y': float(line[38:46]),
+                            'z': float(line[46:54]),
+                            'element': line[76:78].strip() if len(line) > 76 else line[12:16].strip()[0]
+                        }
+                        atoms.append(atom)
+                    except (ValueError, IndexError):
+                        continue
+                elif line.startswith(POSE_ENERGIES_BEGIN):
+                    in_table = True
+                    energies = {'score_function': None, 'weights': {}, 'total': None, 'residues': {}}
+                elif line.startswith(POSE_ENERGIES_END):
+                    in_table = False
+                elif in_table:
+                    fields = line.split()
+                    if not fields:
+                        continue
+                    if fields[0] == 'label':
+                        terms = fields[1:]
+                        energies['score_function'] = infer_score_function(terms)
+                        continue
+                    values = dict(zip(terms, parse_energy_row(fields[1:])))
+                    if fields[0] == 'weights':
+                        energies['weights'] = {k: v for k, v in values.items() if v is not None}
+                    elif fields[0] == 'pose':
+                        energies['total'] = values.get('total')
+                    else:
+                        energies['residues'][fields[0]] = values.get('total')
     except Exception:
-        return []
+        return [], None
+    return atoms, energies
+
+
+def parse_pdb(pdb_path: str) -> list:
+    """Parse ATOM/HETATM records from PDB file."""
+    atoms, _ = parse_structure(pdb_path)
     return atoms
 
 
@@ -435,10 +463,48 @@ def test_complete_residues(atoms):
     }
 
 
-def test_internal_energy(pdb_path: str, rosetta_bin: str) -> dict:
-    if not rosetta_bin:
+# Checks run on the parsed atoms of every structure, in output column order
+GEOMETRY_TESTS = [
+    test_structure_loaded, test_valid_residues, test_backbone_connected,
+    test_bond_lengths, test_bond_angles, test_steric_clashes,
+    test_aromatic_flatness, test_peptide_planarity, test_chirality,
+    test_complete_residues,
+]
+
+
+def energy_result(score, source) -> dict:
+    if score is None:
         return {'internal_energy': None, 'raw_rosetta_score': None}
+    return {'internal_energy': score < 0, 'raw_rosetta_score': round(score, 2), 'energy_source': source}
+
 
+def test_internal_energy(pdb_path: str, rosetta_bin: str, pose_energies: dict = None,
+                         digest: str = None) -> dict:
+    """Rosetta total energy, taken from the embedded pose table when possible.
+
+    Relaxed outputs already carry their pose energies; these are used as-is when
+    they were computed with ROSETTA_SCOREFXN. Otherwise the energy cache is
+    consulted by content hash, and only a miss is rescored with score_jd2.
+    energy_cache_hit is set only when the cache was looked up.
+    """
+    if pose_energies and pose_energies.get('score_function') == ROSETTA_SCOREFXN:
+        if pose_energies.get('total') is not None:
+            return energy_result(pose_energies['total'], 'embedded')
+
+    if not rosetta_bin:
+        return energy_result(None, None)
+
+    lookup = {}
+    if digest and ENERGY_CACHE is not None:
+        if digest in ENERGY_CACHE:
+            return {**energy_result(ENERGY_CACHE[digest], 'cache'), 'energy_cache_hit': True}
+        lookup['energy_cache_hit'] = False
+
+    return {**rescore(pdb_path, rosetta_bin), **lookup}
+
+
+def rescore(pdb_path: str, rosetta_bin: str) -> dict:
+    """Total energy from a score_jd2 run on the structure."""
     try:
         with tempfile.TemporaryDirectory() as tmpdir:
             score_file = Path(tmpdir) / 'score.sc'
@@ -451,34 +517,40 @@ def test_internal_energy(pdb_path: str, rosetta_bin: str) -> dict:
             subprocess.run(cmd, capture_output=True, timeout=120)
 
             if not score_file.exists():
-                return {'internal_energy': None, 'raw_rosetta_score': None}
+                return energy_result(None, None)
 
             for line in score_file.read_text().split('\n'):
                 if line.startswith('SCORE:') and 'total_score' not in line:
                     parts = line.split()
                     if len(parts) > 1:
                         try:
-                            score = float(parts[1])
-                            return {'internal_energy': score < 0, 'raw_rosetta_score': round(score, 2)}
+                            return energy_result(float(parts[1]), 'rescored')
                         except ValueError:
                             pass
     except (subprocess.TimeoutExpired, Exception):
         pass
 
-    return {'internal_energy': None, 'raw_rosetta_score': None}
+    return energy_result(None, None)
 
 
 def decompress_pdb(gz_path: str) -> str:
     pdb_name = Path(gz_path).stem + f'_{uuid.uuid4().hex[:8]}'
     pdb_path = TEMP_DIR / pdb_name
-    with gzip.open(gz_path, 'rb') as f_in:
-        with open(pdb_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
+    with open(pdb_path, 'wb') as f_out:
+        f_out.write(read_structure(gz_path))
     return str(pdb_path)
 
 
+def init_worker(cached_scores, channel_spec=None):
+    global ENERGY_CACHE, CHANNEL
+    warnings.filterwarnings('ignore')
+    ENERGY_CACHE = cached_scores
+    if channel_spec is not None:
+        CHANNEL = ResultChannel.attach(channel_spec)
+
+
 def validate_structure(args) -> dict:
-    struct, rosetta_bin = args
+    struct, rosetta_bin, use_energy = args
 
     result = {
         'protein': struct['protein'],
@@ -495,16 +567,17 @@ def validate_structure(args) -> dict:
             pdb_path = decompress_pdb(pdb_path)
             temp_pdb = pdb_path
 
-        atoms = parse_pdb(pdb_path)
+        atoms, pose_energies = parse_structure(pdb_path)
 
-        for test_fn in [test_structure_loaded, test_valid_residues, test_backbone_connected,
-                        test_bond_lengths, test_bond_angles, test_steric_clashes,
-                        test_aromatic_flatness, test_peptide_planarity, test_chirality,
-                        test_complete_residues]:
+        for test_fn in GEOMETRY_TESTS:
             result.update(test_fn(atoms))
 
-        if rosetta_bin:
-            result.update(test_internal_energy(pdb_path, rosetta_bin))
+        if use_energy:
+            digest = None
+            if rosetta_bin and ENERGY_CACHE is not None:
+                digest = struct.get('content_hash') or content_hash(struct['path'])
+                result['content_hash'] = digest
+            result.update(test_internal_energy(pdb_path, rosetta_bin, pose_energies, digest))
         else:
             result['internal_energy'] = None
             result['raw_rosetta_score'] = None
@@ -539,6 +612,15 @@ def validate_structure(args) -> dict:
     return result
 
 
+def validate_to_channel(args):
+    """Validate one structure into its channel slot; returns (id, text fields)."""
+    sid, struct, rosetta_bin, use_energy = args
+    result = validate_structure((struct, rosetta_bin, use_energy))
+    for key in ['protein', 'category', 'subcategory', 'model']:
+        result.pop(key)
+    return sid, CHANNEL.write(sid, result)
+
+
 def sort_results(df: pd.DataFrame) -> pd.DataFrame:
     cat_order = {'Experimental': 0, 'AlphaFold': 1, 'Boltz': 2}
     sub_order = {
@@ -554,30 +636,72 @@ def sort_results(df: pd.DataFrame) -> pd.DataFrame:
     return df.reset_index(drop=True)
 
 
-def save_per_protein(results: list, protein: str):
-    df = sort_results(pd.DataFrame(results))
-    out_dir = PROTEINS_DIR / protein / "analysis"
-    out_dir.mkdir(parents=True, exist_ok=True)
+PASS_COLUMNS = ['protein', 'category', 'subcategory', 'model', 'structure_loaded', 'valid_residues',
+                'backbone_connected', 'bond_lengths', 'bond_angles', 'steric_clashes',
+                'aromatic_flatness', 'peptide_planarity', 'chirality', 'complete_residues',
+                'internal_energy', 'all_pass', 'n_pass']
+
+# Result fields written into the shared-memory channel by the workers
+BOOL_COLUMNS = ['structure_loaded', 'valid_residues', 'backbone_connected', 'bond_lengths',
+                'bond_angles', 'steric_clashes', 'aromatic_flatness', 'peptide_planarity',
+                'chirality', 'complete_residues', 'internal_energy', 'all_pass']
+METRIC_COLUMNS = [
+    'raw_n_atoms', 'raw_n_residue_types', 'raw_n_valid_residue_types',
+    'raw_n_backbone_breaks', 'raw_max_break_distance',
+    'raw_n_peptide_bonds', 'raw_n_bond_outliers', 'raw_mean_bond_length', 'raw_std_bond_length',
+    'raw_n_backbone_angles', 'raw_n_angle_outliers', 'raw_mean_backbone_angle', 'raw_std_backbone_angle',
+    'raw_n_clashes', 'raw_worst_clash',
+    'raw_n_aromatic_rings', 'raw_n_nonplanar_rings', 'raw_max_ring_deviation',
+    'raw_n_omega_angles', 'raw_n_cis', 'raw_n_trans', 'raw_n_twisted', 'raw_mean_abs_omega',
+    'raw_n_chiral_centers', 'raw_n_d_amino_acids',
+    'raw_n_residues', 'raw_n_incomplete_residues', 'raw_n_missing_backbone_atoms',
+    'raw_rosetta_score', 'n_pass',
+]
+# Counts get int64 slots so they keep their integer dtype; the rest are float64
+INT_COLUMNS = [c for c in METRIC_COLUMNS if c.startswith('raw_n_')] + ['n_pass']
+FLOAT_COLUMNS = [c for c in METRIC_COLUMNS if c not in INT_COLUMNS]
+
+
+def result_frame(channel: ResultChannel, structures: list, text: dict = None) -> pd.DataFrame:
+    """Results of one batch from the channel slots 0..len(structures), with keys and text fields."""
+    df = channel.frame(0, len(structures), METRIC_COLUMNS + BOOL_COLUMNS)
+    for i, key in enumerate(['protein', 'category', 'subcategory', 'model']):
+        df.insert(i, key, [s.get(key, 'exp') for s in structures])
+    if text:
+        extra = pd.DataFrame.from_dict(text, orient='index').reindex(range(len(structures)))
+        for col in extra.columns:
+            df[col] = extra[col].to_numpy()
+    return df
+
+
+def save_per_protein(df: pd.DataFrame, protein: str):
+    """Replace this protein's partitions of the posebusters_results/raw tables."""
+    df = sort_results(df)
+    df['protein'] = protein
 
-    pass_cols = ['category', 'subcategory', 'model', 'structure_loaded', 'valid_residues',
-                 'backbone_connected', 'bond_lengths', 'bond_angles', 'steric_clashes',
-                 'aromatic_flatness', 'peptide_planarity', 'chirality', 'complete_residues',
-                 'internal_energy', 'all_pass', 'n_pass']
-    df[[c for c in pass_cols if c in df.columns]].to_csv(out_dir / "posebusters_results.csv", index=False)
+    write_partitions('posebusters_results', df[[c for c in PASS_COLUMNS if c in df.columns]])
 
-    raw_cols = ['category', 'subcategory', 'model'] + [c for c in df.columns if c.startswith('raw_')]
-    df[[c for c in raw_cols if c in df.columns]].to_csv(out_dir / "posebusters_raw.csv", index=False)
+    raw_cols = ['protein', 'category', 'subcategory', 'model'] + [c for c in df.columns if c.startswith('raw_')]
+    write_partitions('posebusters_raw', df[raw_cols])
 
-    return len(results)
+    return len(df)
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--no-energy', action='store_true')
+    parser.add_argument('--no-energy-cache', action='store_true',
+                        help='Rescore every structure instead of reusing cached energies')
     parser.add_argument('--limit', type=int)
     parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--summary-every', type=int, default=0, metavar='N',
+                        help='Print running pass rates every N proteins')
     args = parser.parse_args()
 
+    from tqdm import tqdm
+    warnings.filterwarnings('ignore')
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+
     print("=" * 70)
     print("POSEBUSTERS - Protein Structure Validity Checks")
     print("=" * 70)
@@ -585,8 +709,18 @@ def main():
     print(f"Workers: {args.workers}")
 
     rosetta_bin = None if args.no_energy else find_rosetta()
-    print(f"Rosetta: {rosetta_bin}" if rosetta_bin else "(Rosetta disabled)")
-
+    if args.no_energy:
+        print("(Rosetta disabled)")
+    else:
+        print(f"Rosetta: {rosetta_bin or 'not found, embedded pose energies only'}")
+
+    cache, cached_scores, rosetta_id = None, None, rosetta_identity(rosetta_bin)
+    if rosetta_bin and not args.no_energy_cache:
+        cache = EnergyCache()
+        cached_scores = cache.preload(rosetta_id, ROSETTA_SCOREFXN)
+        print(f"Energy cache: {len(cached_scores)} scores preloaded from {cache.path}")
+
+    refresh_manifest().close()
     structures = find_structures()
     if args.limit:
         structures = structures[:args.limit]
@@ -599,58 +733,90 @@ def main():
     proteins = sorted(by_protein.keys())
     print(f"Processing {len(proteins)} proteins")
 
-    all_results = []
+    # One channel slot per structure of the largest protein, reused for every protein,
+    # and running per-group statistics: parent memory does not grow with the run
+    channel = ResultChannel(max(len(v) for v in by_protein.values()), FLOAT_COLUMNS, BOOL_COLUMNS,
+                            INT_COLUMNS)
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                   initargs=(cached_scores, channel.spec))
+    summary = GroupedStats(['category', 'subcategory'], BOOL_COLUMNS + METRIC_COLUMNS)
 
+    energy_sources = {}
     for idx, protein in enumerate(proteins, 1):
-        tasks = [(s, rosetta_bin) for s in by_protein[protein]]
-        protein_results = []
+        batch = by_protein[protein]
+        tasks = [(sid, s, rosetta_bin, not args.no_energy) for sid, s in enumerate(batch)]
+        text = {}
+
+        futures = [executor.submit(validate_to_channel, t) for t in tasks]
+        for future in tqdm(as_completed(futures), total=len(futures),
+                          desc=f"{protein} ({idx}/{len(proteins)})", leave=False):
+            sid, fields = future.result()
+            text[sid] = fields
+
+        protein_df = result_frame(channel, batch, text)
+        summary.update(protein_df)
+        if 'energy_source' in protein_df.columns:
+            for source, n in protein_df['energy_source'].value_counts().items():
+                energy_sources[source] = energy_sources.get(source, 0) + n
+
+        if cache is not None and 'energy_cache_hit' in protein_df.columns:
+            looked_up = protein_df[protein_df['energy_cache_hit'].notna()]
+            for hit in looked_up['energy_cache_hit']:
+                cache.record(bool(hit))
+            sources = looked_up['energy_source'] if 'energy_source' in looked_up else pd.Series(None, index=looked_up.index)
+            rescored = looked_up[sources == 'rescored']
+            cache.put_many(list(zip(rescored['content_hash'], rescored['raw_rosetta_score'])),
+                           rosetta_id, ROSETTA_SCOREFXN)
+
+        n = save_per_protein(protein_df, protein)
+        del protein_df
+        channel.reset()
+        print(f"[{idx}/{len(proteins)}] {protein}: {n} structures saved", flush=True)
+        if args.summary_every and idx % args.summary_every == 0 and idx < len(proteins):
+            print_summary(summary, energy_sources)
 
-        with ProcessPoolExecutor(max_workers=args.workers) as executor:
-            futures = {executor.submit(validate_structure, t): t for t in tasks}
-            for future in tqdm(as_completed(futures), total=len(futures),
-                              desc=f"{protein} ({idx}/{len(proteins)})", leave=False):
-                protein_results.append(future.result())
-                all_results.append(future.result())
+    executor.shutdown()
+    channel.close()
+    channel.unlink()
 
-        n = save_per_protein(protein_results, protein)
-        print(f"[{idx}/{len(proteins)}] {protein}: {n} structures saved", flush=True)
+    print_summary(summary, energy_sources)
+    print(f"\nSummary cube: {ensure_cube('posebusters')}")
+
+    if cache is not None:
+        print(f"Energy cache: {cache.summary()}")
+        cache.close()
+
+    print(f"\nEnd: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-        # Append to compiled
-        df = sort_results(pd.DataFrame(protein_results))
-        pass_cols = ['protein', 'category', 'subcategory', 'model', 'structure_loaded', 'valid_residues',
-                     'backbone_connected', 'bond_lengths', 'bond_angles', 'steric_clashes',
-                     'aromatic_flatness', 'peptide_planarity', 'chirality', 'complete_residues',
-                     'internal_energy', 'all_pass', 'n_pass']
-        raw_cols = ['protein', 'category', 'subcategory', 'model'] + [c for c in df.columns if c.startswith('raw_')]
-
-        compiled = OUTPUT_DIR / "posebusters_results.csv"
-        compiled_raw = OUTPUT_DIR / "posebusters_raw.csv"
-        header = not compiled.exists()
-        df[[c for c in pass_cols if c in df.columns]].to_csv(compiled, mode='a', header=header, index=False)
-        df[[c for c in raw_cols if c in df.columns]].to_csv(compiled_raw, mode='a', header=header, index=False)
-
-    # Summary
+
+def print_summary(summary: GroupedStats, energy_sources: dict):
+    """Pass rates from the running per-category/subcategory statistics."""
+    total = summary.total()
+    all_pass = total.get('all_pass')
     print("\n" + "=" * 70)
-    df = pd.DataFrame(all_results)
-    print(f"Total: {len(df)} structures")
-    print(f"All pass: {df['all_pass'].sum()} ({100*df['all_pass'].mean():.1f}%)")
+    print(f"Total: {total.rows} structures")
+    print(f"All pass: {int(all_pass['sum'])} ({100*all_pass['mean']:.1f}%)")
 
     print("\nBy category:")
+    by_category = summary.combine(['category'])
     for cat in ['Experimental', 'AlphaFold', 'Boltz']:
-        sub = df[df['category'] == cat]
-        if len(sub):
-            print(f"  {cat}: {sub['all_pass'].sum()}/{len(sub)} ({100*sub['all_pass'].mean():.1f}%)")
+        stats = by_category.get((cat,))
+        if stats is not None and stats.rows:
+            sub = stats.get('all_pass')
+            print(f"  {cat}: {int(sub['sum'])}/{stats.rows} ({100*sub['mean']:.1f}%)")
 
     print("\nTest pass rates:")
     for col in ['structure_loaded', 'valid_residues', 'backbone_connected', 'bond_lengths',
                 'bond_angles', 'steric_clashes', 'aromatic_flatness', 'peptide_planarity',
                 'chirality', 'complete_residues', 'internal_energy']:
-        if col in df.columns:
-            valid = df[col].notna()
-            if valid.any():
-                print(f"  {col}: {100*df.loc[valid, col].mean():.1f}%")
-
-    print(f"\nEnd: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        stats = total.get(col)
+        if stats['n']:
+            print(f"  {col}: {100*stats['mean']:.1f}%")
+
+    if energy_sources:
+        print(f"\nEnergy: {energy_sources.get('embedded', 0)} from embedded pose tables, "
+              f"{energy_sources.get('cache', 0)} from cache, "
+              f"{energy_sources.get('rescored', 0)} rescored with score_jd2")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the PoseBusters checks on synthetic structures.
+
+Structures of each size are generated with synthetic_structures.py (ideal
+helices, so every check does its full work) and written as PDB files. For
+each size these are timed, as the median of --repeat runs:
+
+    parse_structure       reading the PDB file
+    test_*                every check in posebusters.GEOMETRY_TESTS, on parsed atoms
+    validate_structure    the whole per-structure pipeline, without Rosetta
+
+Throughput is atoms per second. The scaling exponent of each stage is the
+slope of log(seconds) against log(atoms) over the sizes: 1 is linear, 2
+quadratic. test_steric_clashes samples 1000 atoms of larger structures, so
+it is close to flat beyond 1000 atoms, and it finds injected clashes in large
+structures only when they fall in the sample.
+
+With --json the report (parameters, timings, exponents) is written as JSON;
+with --record the timings are appended to validation_results/posebusters_bench.csv
+so they can be tracked across changes.
+
+Usage:
+    python scripts/posebusters_bench.py
+    python scripts/posebusters_bench.py --sizes 1000 10000 --repeat 5 --json bench.json
+    python scripts/posebusters_bench.py --aromatic 0.3 --clashes 20 --record
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from posebusters import GEOMETRY_TESTS, parse_structure, validate_structure
+from synthetic_structures import chains_for_residues, residues_for_atoms, synthetic_atoms, write_pdb
+
+RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
+HISTORY = RESULTS_DIR / "posebusters_bench.csv"
+
+SIZES = [1000, 3000, 10000, 30000, 100000]
+
+STAGES = ['parse_structure'] + [fn.__name__ for fn in GEOMETRY_TESTS] + ['validate_structure']
+
+
+def time_call(fn, args, repeat: int, seed: int) -> float:
+    """Median seconds of fn(*args); the global RNG is reseeded for the clash sample."""
+    times = []
+    for _ in range(repeat):
+        np.random.seed(seed)
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def benchmark_size(n_atoms: int, args, workdir: Path) -> tuple:
+    """(timing rows, validate_structure result) for one structure of about n_atoms atoms."""
+    n_residues = residues_for_atoms(n_atoms, args.aromatic)
+    n_chains = args.chains or chains_for_residues(n_residues)
+    atoms = synthetic_atoms(n_residues, n_chains, args.aromatic, args.clashes, args.seed)
+    path = workdir / f"synthetic_{n_atoms}.pdb"
+    write_pdb(atoms, path)
+    struct = {'path': str(path), 'protein': 'synthetic', 'category': 'Synthetic',
+              'subcategory': 'raw', 'model': str(n_atoms)}
+
+    parsed, _ = parse_structure(str(path))
+    timings = {'parse_structure': time_call(parse_structure, [str(path)], args.repeat, args.seed)}
+    for test_fn in GEOMETRY_TESTS:
+        timings[test_fn.__name__] = time_call(test_fn, [parsed], args.repeat, args.seed)
+    timings['validate_structure'] = time_call(validate_structure, [(struct, None, False)],
+                                              args.repeat, args.seed)
+
+    np.random.seed(args.seed)
+    result = validate_structure((struct, None, False))
+    rows = [{'stage': stage, 'atoms': len(atoms), 'residues': n_residues, 'chains': n_chains,
+             'seconds': seconds, 'atoms_per_s': len(atoms) / seconds if seconds else None}
+            for stage, seconds in timings.items()]
+    return rows, result
+
+
+def scaling_exponents(rows: list) -> dict:
+    """Slope of log(seconds) vs log(atoms) per stage; None with fewer than two sizes."""
+    exponents = {}
+    for stage in STAGES:
+        points = [(r['atoms'], r['seconds']) for r in rows if r['stage'] == stage and r['seconds'] > 0]
+        if len({a for a, _ in points}) < 2:
+            exponents[stage] = None
+            continue
+        atoms, seconds = np.log(np.array(points, dtype=float)).T
+        exponents[stage] = float(np.polyfit(atoms, seconds, 1)[0])
+    return exponents
+
+
+def print_report(rows: list, exponents: dict, checks: dict):
+    sizes = sorted({r['atoms'] for r in rows})
+    seconds = {(r['stage'], r['atoms']): r['seconds'] for r in rows}
+
+    print(f"\n{'Stage (ms)':<24}" + "".join(f"{n:>10}" for n in sizes) + f"{'Exponent':>10}")
+    print("-" * (34 + 10 * len(sizes)))
+    for stage in STAGES:
+        exponent = exponents[stage]
+        print(f"{stage:<24}" + "".join(f"{1000 * seconds[(stage, n)]:>10.2f}" for n in sizes)
+              + (f"{exponent:>10.2f}" if exponent is not None else f"{'-':>10}"))
+
+    print(f"\n{'validate_structure':<24}" + "".join(f"{n:>10}" for n in sizes))
+    print(f"{'  atoms/s':<24}" + "".join(f"{n / seconds[('validate_structure', n)]:>10.0f}" for n in sizes))
+    passed = [f"{checks[n]['n_pass']}/{len(GEOMETRY_TESTS)}" for n in sizes]
+    print(f"{'  checks passed':<24}" + "".join(f"{p:>10}" for p in passed))
+    print(f"{'  clashes found':<24}" + "".join(f"{checks[n]['raw_n_clashes']:>10}" for n in sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the PoseBusters checks on synthetic structures")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Approximate atom counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+    parser.add_argument('--chains', type=int, help='Chains per structure (default: one per 500 residues)')
+    parser.add_argument('--aromatic', type=float, default=0.1, help='Fraction of aromatic residues')
+    parser.add_argument('--clashes', type=int, default=0, help='Clashes injected per structure')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', type=Path, help='Write the report as JSON to this path')
+    parser.add_argument('--record', action='store_true', help=f'Append the timings to {HISTORY.name}')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("POSEBUSTERS BENCHMARK")
+    print("=" * 60)
+    print(f"Sizes: {', '.join(map(str, args.sizes))} atoms; aromatic {args.aromatic:.0%}, "
+          f"{args.clashes} injected clashes; median of {args.repeat}")
+
+    rows, checks = [], {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n_atoms in args.sizes:
+            t0 = time.perf_counter()
+            size_rows, result = benchmark_size(n_atoms, args, Path(tmpdir))
+            rows.extend(size_rows)
+            checks[size_rows[0]['atoms']] = result
+            print(f"  {size_rows[0]['atoms']} atoms ({size_rows[0]['residues']} residues, "
+                  f"{size_rows[0]['chains']} chains): {time.perf_counter() - t0:.1f}s")
+
+    exponents = scaling_exponents(rows)
+    print_report(rows, exponents, checks)
+
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    if args.json:
+        report = {
+            'timestamp': timestamp,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'parameters': {'sizes': args.sizes, 'repeat': args.repeat, 'chains': args.chains, 'aromatic': args.aromatic,
+                           'clashes': args.clashes, 'seed': args.seed},
+            'results': rows,
+            'scaling_exponents': exponents,
+        }
+        args.json.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nWrote {args.json}")
+
+    if args.record:
+        import pandas as pd
+        df = pd.DataFrame(rows)
+        df.insert(0, 'timestamp', timestamp)
+        df['scaling_exponent'] = df['stage'].map(exponents)
+        df['aromatic'] = args.aromatic
+        df['clashes'] = args.clashes
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_csv(HISTORY, mode='a', header=not HISTORY.exists(), index=False)
+        print(f"\nAppended {len(rows)} rows to {HISTORY}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Local query service holding the analysis data in memory.
+
+The analysis scripts are rerun many times a day while the paper is written,
+and every run loads its data again. The service loads the summary cubes and
+the typed row datasets (categorical keys, float arrays) once and answers
+queries over HTTP on localhost. Data is reloaded when a dataset's source files
+change (see datasets.fingerprint), so results are never stale.
+
+Queries (every result is a DataFrame):
+    scorecard       the scorecard.py table
+    pairing_table   baseline vs relaxed aggregates of metrics (see paired_deltas)
+    metric_deltas   initial value vs change after relaxation of one metric
+    correlations    Pearson r of initial value vs change, per metric and source
+    outliers        the top-k structures by one metric
+
+connect() returns a client of the running service, or a Queries object that
+loads the data in this process when no service is running (or the running one
+serves another store), so scripts work the same either way. Results are sent
+as Arrow IPC streams, so dtypes and values arrive exactly as computed, and the
+service keeps them until the data changes, so a repeated query is answered
+without recomputing it.
+
+Usage:
+    python scripts/query_service.py serve &
+    python scripts/query_service.py status
+    python scripts/query_service.py outliers --metric clashscore -k 10
+    python scripts/query_service.py correlations --dataset posebusters
+"""
+
+import argparse
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from datasets import DATASETS, fingerprint, load_dataset
+from paired_deltas import CATEGORIES, metric_deltas
+from results_store import KEYS, STORE_DIR
+from summary_cube import load_cube
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Seconds to wait for a running service before loading the data locally
+CONNECT_TIMEOUT = 0.25
+
+# Results kept by the service (per query and arguments, until the data changes)
+MAX_RESULTS = 256
+
+QUERIES = ['scorecard', 'pairing_table', 'metric_deltas', 'correlations', 'outliers']
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+
+def to_ipc(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def from_ipc(data: bytes) -> pd.DataFrame:
+    table = pa.ipc.open_stream(data).read_all()
+    df = table.to_pandas()
+    # Object columns (af_type, with None outside AlphaFold) come back as strings
+    for col in (table.schema.pandas_metadata or {}).get('columns', []):
+        if col['numpy_type'] == 'object' and col['name'] in df.columns:
+            values = df[col['name']]
+            df[col['name']] = values.astype(object).where(values.notna(), None)
+    return df
+
+
+class Queries:
+    """The query API, answered from data held by this process."""
+
+    def __init__(self, root: Path = STORE_DIR):
+        self.root = root
+        self.digests = {}
+        self.cubes = {}
+        self.frames = {}
+
+    def _check(self, name: str):
+        """Drop a dataset's data if its source files changed."""
+        digest = fingerprint(name, self.root)
+        if self.digests.get(name) != digest:
+            self.cubes.pop(name, None)
+            self.frames.pop(name, None)
+            self.digests[name] = digest
+
+    def cube(self, name: str):
+        self._check(name)
+        if name not in self.cubes:
+            self.cubes[name] = load_cube(name, root=self.root)
+        return self.cubes[name]
+
+    def rows(self, name: str) -> pd.DataFrame:
+        self._check(name)
+        if name not in self.frames:
+            self.frames[name] = load_dataset(name, categorical=True, root=self.root)
+        return self.frames[name]
+
+    def scorecard(self) -> pd.DataFrame:
+        from scorecard import build_scorecard
+        return build_scorecard(self.cube('molprobity'), self.cube('posebusters'))
+
+    def pairing_table(self, name: str, metrics: list, relaxed='relaxed_normal_beta',
+                      split_af: bool = True) -> pd.DataFrame:
+        return self.cube(name).pairing_table(metrics, relaxed, split_af)
+
+    def metric_deltas(self, name: str, metric: str, relaxed='relaxed_normal_beta',
+                      split_af: bool = True) -> pd.DataFrame:
+        return metric_deltas(self.pairing_table(name, [metric], relaxed, split_af), metric)
+
+    def correlations(self, name: str, metrics: list = None, relaxed='relaxed_normal_beta') -> pd.DataFrame:
+        """Pearson r of initial value vs change per metric, over all sources and per source.
+
+        r and p are NaN where there are fewer than three pairs or no spread.
+        """
+        from scipy import stats
+
+        cube = self.cube(name)
+        metrics = cube.metrics if metrics is None else [m for m in metrics if m in cube.metrics]
+        table = cube.pairing_table(metrics, relaxed)
+        rows = []
+        for metric in metrics:
+            deltas = metric_deltas(table, metric)
+            parts = [('all', deltas)] + [(c, deltas[deltas['category'] == c]) for c in CATEGORIES]
+            for source, part in parts:
+                r = p = np.nan
+                if len(part) > 2 and part['initial'].nunique() > 1 and part['change'].nunique() > 1:
+                    r, p = stats.pearsonr(part['initial'], part['change'])
+                rows.append({'metric': metric, 'source': source, 'n': len(part), 'r': r, 'p': p})
+        return pd.DataFrame(rows, columns=['metric', 'source', 'n', 'r', 'p'])
+
+    def outliers(self, name: str, metric: str, k: int = 10, filters: dict = None,
+                 largest: bool = True) -> pd.DataFrame:
+        """The k structures with the highest (largest=False: lowest) value of a metric."""
+        df = self.rows(name)
+        keep = np.ones(len(df), dtype=bool)
+        for col, value in (filters or {}).items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            keep &= df[col].isin(values).to_numpy()
+        values = df[metric].to_numpy(dtype=float, na_value=np.nan)
+        idx = np.flatnonzero(keep & ~np.isnan(values))
+        key = -values[idx] if largest else values[idx]
+        if len(idx) > k:
+            top = np.argpartition(key, k - 1)[:k]
+            idx, key = idx[top], key[top]
+        out = df.iloc[idx[np.argsort(key, kind='stable')]][KEYS + [metric]]
+        return out.astype({c: str for c in KEYS}).reset_index(drop=True)
+
+
+class QueryClient:
+    """The Queries API, answered by a running query service."""
+
+    def __init__(self, port: int = PORT):
+        self.url = f"http://{HOST}:{port}"
+
+    def status(self, timeout: float = None) -> dict:
+        with urllib.request.urlopen(f"{self.url}/status", timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def query(self, query: str, **kwargs) -> pd.DataFrame:
+        request = urllib.request.Request(f"{self.url}/query/{query}", data=json.dumps(kwargs).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return from_ipc(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"query service: {json.loads(e.read())['error']}") from None
+
+    def scorecard(self) -> pd.DataFrame:
+        return self.query('scorecard')
+
+    def pairing_table(self, name: str, metrics: list, relaxed='relaxed_normal_beta',
+                      split_af: bool = True) -> pd.DataFrame:
+        return self.query('pairing_table', name=name, metrics=list(metrics), relaxed=relaxed, split_af=split_af)
+
+    def metric_deltas(self, name: str, metric: str, relaxed='relaxed_normal_beta',
+                      split_af: bool = True) -> pd.DataFrame:
+        return self.query('metric_deltas', name=name, metric=metric, relaxed=relaxed, split_af=split_af)
+
+    def correlations(self, name: str, metrics: list = None, relaxed='relaxed_normal_beta') -> pd.DataFrame:
+        return self.query('correlations', name=name, metrics=metrics, relaxed=relaxed)
+
+    def outliers(self, name: str, metric: str, k: int = 10, filters: dict = None,
+                 largest: bool = True) -> pd.DataFrame:
+        return self.query('outliers', name=name, metric=metric, k=k, filters=filters, largest=largest)
+
+
+def connect(port: int = PORT, root: Path = STORE_DIR):
+    """Client of the query service on port, or in-process Queries if none serves root."""
+    client = QueryClient(port)
+    try:
+        status = client.status(timeout=CONNECT_TIMEOUT)
+    except OSError:
+        return Queries(root)
+    if status.get('store') != str(Path(root).resolve()):
+        return Queries(root)
+    return client
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /status, POST /query/<name> with the keyword arguments as a JSON object."""
+
+    def reply(self, code: int, body: bytes, content_type: str):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_json(self, code: int, payload: dict):
+        self.reply(code, json.dumps(payload).encode(), 'application/json')
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self.reply_json(404, {'error': f"unknown path {self.path}"})
+        queries = self.server.queries
+        self.reply_json(200, {'pid': os.getpid(), 'store': str(Path(queries.root).resolve()),
+                              'served': self.server.served, 'cached': len(self.server.results),
+                              'cubes': sorted(queries.cubes), 'rows': sorted(queries.frames)})
+
+    def do_POST(self):
+        query = self.path.rsplit('/', 1)[-1]
+        if not self.path.startswith('/query/') or query not in QUERIES:
+            return self.reply_json(404, {'error': f"unknown query {self.path}"})
+        t0 = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}'
+        results = self.server.results
+        key = (query, body, tuple(fingerprint(name, self.server.queries.root) for name in DATASETS))
+        cached = key in results
+        if not cached:
+            try:
+                df = getattr(self.server.queries, query)(**json.loads(body))
+            except Exception as e:
+                print(f"  {query}: {type(e).__name__}: {e}", flush=True)
+                return self.reply_json(400, {'error': f"{type(e).__name__}: {e}"})
+            if len(results) >= MAX_RESULTS:
+                results.clear()
+            results[key] = to_ipc(df)
+        self.reply(200, results[key], ARROW_STREAM)
+        self.server.served += 1
+        print(f"  {query}: {1000 * (time.perf_counter() - t0):.1f} ms{' (cached)' if cached else ''}", flush=True)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, root: Path):
+    queries = Queries(root)
+    print("=" * 60)
+    print("Query Service")
+    print("=" * 60)
+    for name in DATASETS:
+        t0 = time.perf_counter()
+        rows = queries.rows(name)
+        cube = queries.cube(name)
+        print(f"  {name}: {len(rows)} rows, {len(cube.cells)} cube cells "
+              f"({time.perf_counter() - t0:.1f}s)")
+
+    server = HTTPServer((HOST, port), QueryHandler)
+    server.queries = queries
+    server.results = {}
+    server.served = 0
+    print(f"\nServing on http://{HOST}:{port} (pid {os.getpid()}); Ctrl-C to stop", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local query service over the analysis datasets")
+    parser.add_argument('command', choices=['serve', 'status', 'scorecard', 'correlations', 'outliers'])
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--store', type=Path, default=STORE_DIR)
+    parser.add_argument('--dataset', choices=list(DATASETS), default='molprobity')
+    parser.add_argument('--metric', default='clashscore', help='Metric for outliers')
+    parser.add_argument('-k', type=int, default=10, help='Number of outliers')
+    parser.add_argument('--lowest', action='store_true', help='Outliers by lowest instead of highest value')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        return serve(args.port, args.store)
+
+    queries = connect(args.port, args.store)
+    if args.command == 'status':
+        if isinstance(queries, QueryClient):
+            print(json.dumps(queries.status(), indent=2))
+        else:
+            print(f"No query service on port {args.port}")
+        return
+
+    if args.command == 'scorecard':
+        df = queries.scorecard()
+    elif args.command == 'correlations':
+        df = queries.correlations(args.dataset)
+    else:
+        df = queries.outliers(args.dataset, args.metric, args.k, largest=not args.lowest)
+    with pd.option_context('display.max_rows', 500, 'display.width', 200):
+        print(df.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Shared-memory result channel for worker pools.
+
+The parent allocates a float64, an int64 and an int8 column block in
+multiprocessing.shared_memory, each laid out column-major with one slot per
+structure id. Workers attach by name and write their numeric and boolean
+metrics straight into the slots; only the few text fields (errors, energy
+source, content hashes) travel back with the completion notice.
+
+frame() exposes a row range as a DataFrame whose numeric columns are views
+of the shared blocks (no copy, no per-row dict merge). Integer fields (counts)
+are stored as int64 with MISSING_INT for missing and come back as nullable
+Int64, so they keep their integer dtype. Booleans are stored as int8 with -1
+for missing and come back as nullable booleans.
+
+Lifecycle: the parent creates the channel, passes channel.spec to the pool
+initializer, calls attach() in each worker, and close()/unlink() when done.
+A channel sized for the largest batch can be reset() and reused per batch.
+Frames returned by frame() must be dropped before reset() or close().
+"""
+
+import gc
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+MISSING_BOOL = -1
+MISSING_INT = np.iinfo(np.int64).min
+
+
+class ResultChannel:
+    """Columnar result slots in shared memory, indexed by structure id."""
+
+    def __init__(self, n_rows: int, float_columns: list, bool_columns: list, int_columns: list = (),
+                 names: tuple = None):
+        self.n_rows = n_rows
+        self.float_columns = list(float_columns)
+        self.int_columns = list(int_columns)
+        self.bool_columns = list(bool_columns)
+        self.float_index = {c: i for i, c in enumerate(self.float_columns)}
+        self.int_index = {c: i for i, c in enumerate(self.int_columns)}
+        self.bool_index = {c: i for i, c in enumerate(self.bool_columns)}
+        self.owner = names is None
+
+        float_size = max(len(self.float_columns) * n_rows * 8, 1)
+        int_size = max(len(self.int_columns) * n_rows * 8, 1)
+        bool_size = max(len(self.bool_columns) * n_rows, 1)
+        if self.owner:
+            self.float_shm = shared_memory.SharedMemory(create=True, size=float_size)
+            self.int_shm = shared_memory.SharedMemory(create=True, size=int_size)
+            self.bool_shm = shared_memory.SharedMemory(create=True, size=bool_size)
+        else:
+            self.float_shm = shared_memory.SharedMemory(name=names[0])
+            self.int_shm = shared_memory.SharedMemory(name=names[1])
+            self.bool_shm = shared_memory.SharedMemory(name=names[2])
+
+        self.floats = np.ndarray((len(self.float_columns), n_rows), dtype=np.float64,
+                                 buffer=self.float_shm.buf)
+        self.ints = np.ndarray((len(self.int_columns), n_rows), dtype=np.int64,
+                               buffer=self.int_shm.buf)
+        self.bools = np.ndarray((len(self.bool_columns), n_rows), dtype=np.int8,
+                                buffer=self.bool_shm.buf)
+        if self.owner:
+            self.reset()
+
+    def reset(self):
+        """Mark every slot missing so the channel can be reused for the next batch."""
+        self.floats.fill(np.nan)
+        self.ints.fill(MISSING_INT)
+        self.bools.fill(MISSING_BOOL)
+
+    @property
+    def spec(self) -> tuple:
+        """Picklable arguments for attach() in a worker process."""
+        return (self.n_rows, self.float_columns, self.bool_columns, self.int_columns,
+                (self.float_shm.name, self.int_shm.name, self.bool_shm.name))
+
+    @classmethod
+    def attach(cls, spec: tuple) -> 'ResultChannel':
+        n_rows, float_columns, bool_columns, int_columns, names = spec
+        return cls(n_rows, float_columns, bool_columns, int_columns, names)
+
+    def write(self, row: int, result: dict) -> dict:
+        """Store the numeric and boolean values of result in slot row.
+
+        Returns the remaining fields (text, or anything without a slot).
+        """
+        rest = {}
+        for key, value in result.items():
+            if key in self.bool_index:
+                self.bools[self.bool_index[key], row] = MISSING_BOOL if value is None else bool(value)
+            elif key in self.float_index and not isinstance(value, str):
+                self.floats[self.float_index[key], row] = np.nan if value is None else value
+            elif key in self.int_index and not isinstance(value, str):
+                self.ints[self.int_index[key], row] = MISSING_INT if value is None or value != value else value
+            else:
+                rest[key] = value
+        return rest
+
+    def frame(self, start: int = 0, stop: int = None, columns: list = None) -> pd.DataFrame:
+        """Rows start:stop as a DataFrame; numeric columns share the channel's memory.
+
+        columns orders the result (default: float, int, then bool columns).
+        """
+        stop = self.n_rows if stop is None else stop
+        data = {col: self.floats[i, start:stop] for i, col in enumerate(self.float_columns)}
+        for i, col in enumerate(self.int_columns):
+            values = self.ints[i, start:stop]
+            data[col] = pd.arrays.IntegerArray(values, values == MISSING_INT)
+        for i, col in enumerate(self.bool_columns):
+            values = self.bools[i, start:stop]
+            data[col] = pd.arrays.BooleanArray(values == 1, values == MISSING_BOOL)
+        return pd.DataFrame(data, columns=columns, index=pd.RangeIndex(stop - start), copy=False)
+
+    def close(self):
+        """Detach from the shared blocks (frames from frame() must be gone by now)."""
+        self.floats = self.ints = self.bools = None
+        gc.collect()
+        for shm in (self.float_shm, self.int_shm, self.bool_shm):
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+    def unlink(self):
+        if self.owner:
+            self.float_shm.unlink()
+            self.int_shm.unlink()
+            self.bool_shm.unlink()
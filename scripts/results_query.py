@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+SQL query layer over the results store.
+
+Every results table is exposed as a DuckDB view over its Parquet partitions,
+so filters on protein/subcategory prune files and only the selected columns
+are decoded. Tables that have not been migrated yet, and proteins with no
+partition in a stored table, are served from the legacy CSVs instead (see
+results_store.read_legacy).
+
+Common views:
+    select()   filtered rows, only the requested columns
+    grouped()  aggregates per group (mean, std, min, max, count, median)
+    paired()   per-protein unrelaxed baseline vs relaxed protocol means
+
+Usage:
+    python scripts/results_query.py "SELECT category, avg(clashscore) FROM molprobity_full GROUP BY 1"
+"""
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from results_store import STORE_DIR, TABLES, KEYS, BOOL_COLUMNS, BASELINE, finish, legacy_filters, read_legacy
+
+AGGREGATES = {
+    'mean': 'avg', 'std': 'stddev_samp', 'min': 'min', 'max': 'max',
+    'count': 'count', 'median': 'median',
+}
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def where_clause(filters: dict):
+    """SQL predicate and parameters for {column: value or list of values}."""
+    terms, params = [], []
+    for col, value in (filters or {}).items():
+        values = _as_list(value)
+        terms.append(f"{quote(col)} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return (' AND '.join(terms) or 'TRUE'), params
+
+
+def baseline_clause(baseline: dict):
+    terms, params = [], []
+    for category, subcategory in baseline.items():
+        terms.append("(category = ? AND subcategory = ?)")
+        params.extend([category, subcategory])
+    return '(' + ' OR '.join(terms) + ')', params
+
+
+class ResultsQuery:
+    """In-process DuckDB connection with one view per results table.
+
+    sources optionally maps a table name to a CSV path or DataFrame used in
+    place of the store.
+    """
+
+    def __init__(self, root: Path = STORE_DIR, sources: dict = None):
+        self.root = Path(root)
+        self.sources = dict(sources or {})
+        import duckdb
+        self.con = duckdb.connect()
+        self.views = set()
+
+    def view(self, table: str) -> str:
+        """Name of the view for table, created on first use."""
+        if table not in self.views:
+            source = self.sources.get(table)
+            base = self.root / table
+            if isinstance(source, pd.DataFrame):
+                self.con.register(table, source)
+            elif source is not None:
+                self.con.execute(f"CREATE VIEW {quote(table)} AS "
+                                 f"SELECT * FROM read_csv_auto('{Path(source)}')")
+            elif base.is_dir():
+                files = base / "protein=*" / "subcategory=*" / "*.parquet"
+                stored = (f"SELECT * FROM read_parquet('{files}', "
+                          "hive_partitioning = true, union_by_name = true, "
+                          "hive_types = {'protein': VARCHAR, 'subcategory': VARCHAR})")
+                legacy = legacy_filters(table, None, self.root)
+                if legacy is not None:
+                    rows = finish(read_legacy(table, filters=legacy), None, False)
+                    if len(rows):
+                        self.con.register(f"{table}_legacy", rows)
+                        stored += f" UNION ALL BY NAME SELECT * FROM {quote(table + '_legacy')}"
+                self.con.execute(f"CREATE VIEW {quote(table)} AS {stored}")
+            else:
+                rows = finish(read_legacy(table), None, False)
+                # A table not computed yet is an empty view with the key columns
+                self.con.register(table, rows if len(rows.columns) else pd.DataFrame(columns=KEYS, dtype=str))
+            self.views.add(table)
+        return quote(table)
+
+    def sql(self, query: str, params=None) -> pd.DataFrame:
+        """Run SQL against the table views (every table is registered first)."""
+        for table in TABLES:
+            self.view(table)
+        return self.con.execute(query, params or []).df()
+
+    def columns(self, table: str) -> list:
+        rows = self.con.execute(f"DESCRIBE SELECT * FROM {self.view(table)}").fetchall()
+        return [r[0] for r in rows]
+
+    def select(self, table: str, columns: list, filters: dict = None) -> pd.DataFrame:
+        """Rows matching filters, with only the requested (existing) columns."""
+        available = set(self.columns(table))
+        columns = [c for c in columns if c in available]
+        where, params = where_clause(filters)
+        df = self.con.execute(
+            f"SELECT {', '.join(map(quote, columns))} FROM {self.view(table)} WHERE {where}",
+            params).df()
+        for col in BOOL_COLUMNS & set(df.columns):
+            df[col] = df[col].astype('boolean')
+        return df
+
+    def count(self, table: str, filters: dict = None) -> int:
+        where, params = where_clause(filters)
+        return self.con.execute(f"SELECT count(*) FROM {self.view(table)} WHERE {where}",
+                                params).fetchone()[0]
+
+    def grouped(self, table: str, metrics: list, by: list, filters: dict = None,
+                stats=('mean',)) -> pd.DataFrame:
+        """One row per group with n (row count) and {metric}_{stat} columns.
+
+        With a single statistic the metric names are kept as column names.
+        """
+        where, params = where_clause(filters)
+        keys = ', '.join(map(quote, by))
+        aggs = ['count(*) AS n']
+        for m in metrics:
+            for s in stats:
+                name = m if len(stats) == 1 else f"{m}_{s}"
+                aggs.append(f"{AGGREGATES[s]}(CAST({quote(m)} AS DOUBLE)) AS {quote(name)}")
+        return self.con.execute(
+            f"SELECT {keys}, {', '.join(aggs)} FROM {self.view(table)} "
+            f"WHERE {where} GROUP BY {keys} ORDER BY {keys}", params).df()
+
+    def paired(self, table: str, metric: str, relaxed, filters: dict = None,
+               baseline: dict = BASELINE) -> pd.DataFrame:
+        """Per protein, category and relaxed subcategory: unrelaxed vs relaxed means.
+
+        Columns: protein, category, subcategory, baseline, relaxed, relaxed_min,
+        relaxed_max, n_baseline, n_relaxed. Only pairs where both means exist
+        are returned.
+        """
+        relaxed = _as_list(relaxed)
+        filters = dict(filters or {})
+        filters.setdefault('subcategory', sorted(set(baseline.values()) | set(relaxed)))
+        where, params = where_clause(filters)
+        base_where, base_params = baseline_clause(baseline)
+        rel_marks = ', '.join('?' * len(relaxed))
+        query = f"""
+            WITH rows AS (
+                SELECT protein, category, subcategory, CAST({quote(metric)} AS DOUBLE) AS value
+                FROM {self.view(table)} WHERE {where}
+            ), base AS (
+                SELECT protein, category, avg(value) AS baseline, count(value) AS n_baseline
+                FROM rows WHERE {base_where} GROUP BY protein, category
+            ), rel AS (
+                SELECT protein, category, subcategory, avg(value) AS relaxed,
+                       min(value) AS relaxed_min, max(value) AS relaxed_max,
+                       count(value) AS n_relaxed
+                FROM rows WHERE subcategory IN ({rel_marks})
+                GROUP BY protein, category, subcategory
+            )
+            SELECT r.protein, r.category, r.subcategory, b.baseline, r.relaxed,
+                   r.relaxed_min, r.relaxed_max, b.n_baseline, r.n_relaxed
+            FROM base b JOIN rel r ON b.protein = r.protein AND b.category = r.category
+            WHERE b.baseline IS NOT NULL AND r.relaxed IS NOT NULL
+            ORDER BY r.category, r.subcategory, r.protein
+        """
+        return self.con.execute(query, params + base_params + relaxed).df()
+
+    def close(self):
+        self.con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SQL against the results store")
+    parser.add_argument('query', help='SQL; tables: ' + ', '.join(TABLES))
+    parser.add_argument('--store', type=Path, default=STORE_DIR)
+    parser.add_argument('-o', '--output', type=Path, help='Write the result to CSV')
+    args = parser.parse_args()
+
+    q = ResultsQuery(args.store)
+    df = q.sql(args.query)
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print(f"Saved: {args.output} ({len(df)} rows)")
+    else:
+        with pd.option_context('display.max_rows', 200, 'display.width', 200):
+            print(df)
+
+
+if __name__ == "__main__":
+    main()
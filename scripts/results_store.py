@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Columnar results store shared by the validation pipelines.
+
+Each results table is one Parquet dataset under validation_results/store/,
+hive-partitioned by protein and subcategory:
+
+    store/<table>/protein=1AK4/subcategory=raw/part-0.parquet
+
+Key columns are dictionary-encoded, pass/fail checks are nullable booleans and
+all metrics are float64, so readers get the same dtypes whichever pipeline
+wrote the rows. read_table() loads only the requested columns and prunes
+partitions from equality filters on protein/subcategory; iter_batches() does
+the same but yields the rows in bounded-size chunks. Proteins that have no
+partition in a table yet (a store partly written before --migrate) are read
+from the legacy CSVs, so reads never silently drop them.
+
+Tables:
+    posebusters_results   PoseBusters pass/fail per structure
+    posebusters_raw       PoseBusters raw measurements
+    molprobity_results    core MolProbity metrics (run_validation_parallel.py)
+    molprobity_extended   extended MolProbity metrics (molprobity_extended.py)
+    molprobity_full       molprobity_results joined with molprobity_extended
+    convergence_rmsd      crystal vs predicted model RMSD (convergence_rmsd.py)
+
+Usage:
+    python scripts/results_store.py             # list stored tables
+    python scripts/results_store.py --migrate   # convert the legacy CSVs
+"""
+
+import argparse
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).parent.parent
+PROTEINS = ROOT / "proteins"
+RESULTS_DIR = ROOT / "validation_results"
+STORE_DIR = RESULTS_DIR / "store"
+
+KEYS = ['protein', 'category', 'subcategory', 'model']
+PARTITIONS = ['protein', 'subcategory']
+
+# Unrelaxed reference subcategory for each source
+BASELINE = {'Experimental': 'original', 'AlphaFold': 'raw', 'Boltz': 'raw'}
+
+# Legacy CSV sources, read by --migrate and when a table has not been stored yet
+PER_PROTEIN_CSV = {
+    'posebusters_results': 'posebusters_results.csv',
+    'posebusters_raw': 'posebusters_raw.csv',
+    'molprobity_results': 'molprobity_results.csv',
+}
+COMBINED_CSV = {
+    'molprobity_full': RESULTS_DIR / "molprobity_full.csv",
+    'molprobity_extended': RESULTS_DIR / "molprobity_extended.csv",
+    'convergence_rmsd': RESULTS_DIR / "convergence_rmsd.csv",
+}
+TABLES = list(PER_PROTEIN_CSV) + list(COMBINED_CSV)
+
+BOOL_COLUMNS = {'structure_loaded', 'valid_residues', 'backbone_connected', 'bond_lengths',
+                'bond_angles', 'steric_clashes', 'aromatic_flatness', 'peptide_planarity',
+                'chirality', 'complete_residues', 'internal_energy', 'all_pass'}
+TEXT_COLUMNS = {'raw_non_standard_residues', 'error', 'energy_source', 'content_hash', 'reference_model'}
+
+# Rows per chunk yielded by iter_batches()
+BATCH_ROWS = 65536
+
+BOOL_VALUES = {True: True, False: False, 'True': True, 'False': False}
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Store dtypes: categorical keys, nullable booleans, strings, everything else float64."""
+    df = df.copy()
+    for col in df.columns:
+        if col in KEYS:
+            df[col] = df[col].astype(str).astype('category')
+        elif col in BOOL_COLUMNS:
+            df[col] = df[col].map(BOOL_VALUES).astype('boolean')
+        elif col in TEXT_COLUMNS:
+            df[col] = df[col].astype('string')
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    return df
+
+
+def arrow_type(dtype) -> pa.DataType:
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(dtype, pd.BooleanDtype):
+        return pa.bool_()
+    if isinstance(dtype, pd.StringDtype):
+        return pa.string()
+    return pa.float64()
+
+
+def file_schema(df: pd.DataFrame) -> pa.Schema:
+    """Arrow schema of the columns stored in the files (partition keys live in the path)."""
+    return pa.schema([(c, arrow_type(df[c].dtype)) for c in df.columns if c not in PARTITIONS])
+
+
+def merge_schema(base: Path, schema: pa.Schema) -> pa.Schema:
+    """Union of schema with the table's _common_metadata, written back to disk.
+
+    Readers use the merged schema so partitions written before a column was
+    added read it as null instead of failing.
+    """
+    meta = base / "_common_metadata"
+    if meta.exists():
+        schema = pa.unify_schemas([pq.read_schema(meta), schema])
+    base.mkdir(parents=True, exist_ok=True)
+    pq.write_metadata(schema, meta)
+    return schema
+
+
+def write_partitions(table: str, df: pd.DataFrame, root: Path = STORE_DIR) -> int:
+    """Replace the stored rows of every protein present in df. Returns rows written."""
+    if df.empty:
+        return 0
+    df = normalize(df)
+    base = Path(root) / table
+    schema = file_schema(df)
+    merge_schema(base, schema)
+
+    for protein, prot_df in df.groupby('protein', observed=True, sort=False):
+        prot_dir = base / f"protein={protein}"
+        shutil.rmtree(prot_dir, ignore_errors=True)
+        for sub, part in prot_df.groupby('subcategory', observed=True, sort=False):
+            out = prot_dir / f"subcategory={sub}"
+            out.mkdir(parents=True)
+            data = pa.Table.from_pandas(part.drop(columns=PARTITIONS), schema=schema,
+                                        preserve_index=False)
+            pq.write_table(data, out / "part-0.parquet")
+    return len(df)
+
+
+def write_table(table: str, df: pd.DataFrame, root: Path = STORE_DIR) -> int:
+    """Replace a whole table."""
+    shutil.rmtree(Path(root) / table, ignore_errors=True)
+    return write_partitions(table, df, root)
+
+
+def has_protein(table: str, protein: str, root: Path = STORE_DIR) -> bool:
+    """Whether the table has rows for protein, in the store or in its legacy per-protein CSV."""
+    if (Path(root) / table / f"protein={protein}").is_dir():
+        return True
+    return table in PER_PROTEIN_CSV and (PROTEINS / protein / "analysis" / PER_PROTEIN_CSV[table]).exists()
+
+
+def legacy_filters(table: str, filters: dict, root: Path = STORE_DIR):
+    """filters restricted to the proteins with no partition in the stored table.
+
+    None when every (requested) protein directory has been stored, so a fully
+    written table never touches the legacy CSVs.
+    """
+    base = Path(root) / table
+    stored = {p.name.split('=', 1)[1] for p in base.glob("protein=*") if p.is_dir()}
+    missing = [d.name for d in sorted(PROTEINS.iterdir()) if d.is_dir() and d.name not in stored]
+    if filters and 'protein' in filters:
+        wanted = set(_as_list(filters['protein']))
+        missing = [p for p in missing if p in wanted]
+    if not missing:
+        return None
+    return {**(filters or {}), 'protein': missing}
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def filter_expression(filters: dict):
+    """pyarrow expression for {column: value or list of values}; None if no filters."""
+    expr = None
+    for col, value in (filters or {}).items():
+        term = ds.field(col).isin(_as_list(value))
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def filter_frame(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """Rows matching filters; none when a filtered column is missing (e.g. no legacy CSV)."""
+    for col, value in (filters or {}).items():
+        if col not in df.columns:
+            return df.iloc[0:0]
+        df = df[df[col].isin(_as_list(value))]
+    return df
+
+
+def finish(df: pd.DataFrame, columns, categorical: bool) -> pd.DataFrame:
+    """Key columns first (or in the requested order), keys as plain strings unless categorical."""
+    if columns is None:
+        columns = [c for c in KEYS if c in df.columns] + [c for c in df.columns if c not in KEYS]
+    df = df[[c for c in columns if c in df.columns]].reset_index(drop=True)
+    for col in KEYS:
+        if col in df.columns:
+            df[col] = df[col].astype('category') if categorical else df[col].astype(str).astype(object)
+    for col in TEXT_COLUMNS & set(df.columns):
+        df[col] = df[col].astype('string')
+    return df
+
+
+def read_legacy(table: str, columns=None, filters=None) -> pd.DataFrame:
+    """The same table assembled from the pre-store CSVs."""
+    usecols = None if columns is None else set(columns) | set(filters or {})
+    wanted = (lambda c: c in usecols) if usecols else None
+
+    if table in COMBINED_CSV:
+        path = COMBINED_CSV[table]
+        df = pd.read_csv(path, usecols=wanted) if path.exists() else pd.DataFrame()
+    else:
+        proteins = set(_as_list(filters['protein'])) if filters and 'protein' in filters else None
+        dfs = []
+        for protein_dir in sorted(PROTEINS.iterdir()):
+            if not protein_dir.is_dir() or (proteins and protein_dir.name not in proteins):
+                continue
+            csv_file = protein_dir / "analysis" / PER_PROTEIN_CSV[table]
+            if csv_file.exists():
+                df = pd.read_csv(csv_file, usecols=wanted)
+                df['protein'] = protein_dir.name
+                dfs.append(df)
+        df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+    return normalize(filter_frame(df, filters))
+
+
+def read_table(table: str, columns=None, filters=None, categorical: bool = False,
+               root: Path = STORE_DIR) -> pd.DataFrame:
+    """Load columns of a stored table, keeping rows that match filters.
+
+    filters maps a column to a value or list of values; protein and
+    subcategory filters skip whole partitions. Falls back to the legacy CSVs
+    when the table has not been written to the store yet, and for proteins
+    that have no partition in it.
+    """
+    base = Path(root) / table
+    if not base.is_dir():
+        return finish(read_legacy(table, columns, filters), columns, categorical)
+
+    dataset = open_dataset(base)
+    data = dataset.to_table(columns=load_columns(dataset, columns, filters),
+                            filter=filter_expression(filters))
+    df = to_frame(data)
+    legacy = legacy_filters(table, filters, root)
+    if legacy is not None:
+        rows = read_legacy(table, columns, legacy)
+        if len(rows):
+            df = normalize(pd.concat([df, rows], ignore_index=True))
+    return finish(df, columns, categorical)
+
+
+def open_dataset(base: Path) -> ds.Dataset:
+    """The partitioned Parquet dataset of a stored table."""
+    schema = pq.read_schema(base / "_common_metadata")
+    partitioning = ds.partitioning(pa.schema([(c, pa.string()) for c in PARTITIONS]), flavor='hive')
+    return ds.dataset(base, format='parquet', partitioning=partitioning,
+                      schema=pa.unify_schemas([schema, partitioning.schema]))
+
+
+def load_columns(dataset: ds.Dataset, columns, filters):
+    """Dataset columns needed for the requested columns and filters (None: all)."""
+    if columns is None:
+        return None
+    return [c for c in dataset.schema.names if c in set(columns) | set(filters or {})]
+
+
+def to_frame(data) -> pd.DataFrame:
+    """Arrow table or record batch as a DataFrame with nullable booleans."""
+    return data.to_pandas(types_mapper={pa.bool_(): pd.BooleanDtype()}.get)
+
+
+def iter_legacy(table: str, columns=None, filters=None, batch_size: int = BATCH_ROWS):
+    """read_legacy() in chunks of at most batch_size rows, one CSV at a time."""
+    usecols = None if columns is None else set(columns) | set(filters or {})
+    wanted = (lambda c: c in usecols) if usecols else None
+
+    if table in COMBINED_CSV:
+        sources = [(COMBINED_CSV[table], None)] if COMBINED_CSV[table].exists() else []
+    else:
+        proteins = set(_as_list(filters['protein'])) if filters and 'protein' in filters else None
+        sources = [(d / "analysis" / PER_PROTEIN_CSV[table], d.name) for d in sorted(PROTEINS.iterdir())
+                   if d.is_dir() and not (proteins and d.name not in proteins)]
+
+    for path, protein in sources:
+        if not path.exists():
+            continue
+        for chunk in pd.read_csv(path, usecols=wanted, chunksize=batch_size):
+            if protein is not None:
+                chunk['protein'] = protein
+            chunk = filter_frame(chunk, filters)
+            if len(chunk):
+                yield normalize(chunk)
+
+
+def iter_batches(table: str, columns=None, filters=None, batch_size: int = BATCH_ROWS,
+                 categorical: bool = False, root: Path = STORE_DIR):
+    """read_table() as a stream of DataFrames of at most batch_size rows.
+
+    Only one chunk is held in memory at a time, so tables larger than memory
+    can be aggregated (see streaming_stats.GroupedStats). Rows of proteins
+    not in the store yet follow, read from the legacy CSVs with the stored
+    columns.
+    """
+    base = Path(root) / table
+    if not base.is_dir():
+        for chunk in iter_legacy(table, columns, filters, batch_size):
+            yield finish(chunk, columns, categorical)
+        return
+
+    dataset = open_dataset(base)
+    names = load_columns(dataset, columns, filters) or dataset.schema.names
+    for batch in dataset.to_batches(columns=names, filter=filter_expression(filters),
+                                    batch_size=batch_size):
+        if batch.num_rows:
+            yield finish(to_frame(batch), columns, categorical)
+
+    legacy = legacy_filters(table, filters, root)
+    if legacy is not None:
+        for chunk in iter_legacy(table, columns, legacy, batch_size):
+            chunk = normalize(chunk.reindex(columns=list(dict.fromkeys(names + list(chunk.columns)))))
+            yield finish(chunk, columns, categorical)
+
+
+def refresh_molprobity_full(root: Path = STORE_DIR) -> int:
+    """Rebuild molprobity_full from the stored core and extended MolProbity tables."""
+    if not ((Path(root) / 'molprobity_results').is_dir()
+            and (Path(root) / 'molprobity_extended').is_dir()):
+        return 0
+    core = read_table('molprobity_results', root=root)
+    extended = read_table('molprobity_extended', root=root)
+    extended = extended.drop(columns=[c for c in extended.columns
+                                      if c in core.columns and c not in KEYS])
+    return write_table('molprobity_full', core.merge(extended, on=KEYS, how='outer'), root)
+
+
+def migrate(root: Path = STORE_DIR):
+    """Convert every legacy CSV table into the store."""
+    for table in TABLES:
+        df = read_legacy(table)
+        n = write_table(table, df, root)
+        n_proteins = df['protein'].nunique() if n else 0
+        print(f"  {table}: {n} rows, {n_proteins} proteins")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the results store or migrate legacy CSVs")
+    parser.add_argument('--migrate', action='store_true', help='Convert the existing CSVs')
+    parser.add_argument('--store', type=Path, default=STORE_DIR)
+    args = parser.parse_args()
+
+    if args.migrate:
+        print("=" * 60)
+        print(f"Migrating CSV results into {args.store}")
+        print("=" * 60)
+        migrate(args.store)
+
+    print(f"\nTables in {args.store}:")
+    for table in TABLES:
+        base = args.store / table
+        if not base.is_dir():
+            print(f"  {table}: not stored")
+            continue
+        files = list(base.glob("protein=*/subcategory=*/*.parquet"))
+        rows = sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+        size = sum(f.stat().st_size for f in files)
+        print(f"  {table}: {rows} rows in {len(files)} partitions ({size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,77 +3,43 @@
 MolProbity validation pipeline for protein structure analysis.
 Processes experimental, AlphaFold, and Boltz structures with relaxation variants.
 
-Output: proteins/{PDB}/analysis/{molprobity_results.csv, VALIDATION_SUMMARY.md}
+Output: molprobity_results table in the results store (see results_store.py)
+        and proteins/{PDB}/analysis/VALIDATION_SUMMARY.md
 """
 
+import argparse
 import subprocess
 import os
 import re
-import gzip
 import math
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from manifest import refresh_manifest, load_structures
+from shards import read_structure
+from results_store import write_partitions, has_protein, refresh_molprobity_full
+from summary_cube import ensure_cube, validation_stats, write_summary
 import warnings
 
-warnings.filterwarnings('ignore')
-
 ROOT = Path(__file__).parent.parent
 PROTEINS = ROOT / "proteins"
 REDUCE_DICT = str(Path.home() / "miniconda3/envs/molprobity/share/reduce/reduce_wwPDB_het_dict.txt")
-os.environ['CLIBD_MON'] = str(Path.home() / "miniconda3/envs/molprobity/chem_data/mon_lib")
+MON_LIB = str(Path.home() / "miniconda3/envs/molprobity/chem_data/mon_lib")
 
 WORKERS = 12
 RELAX_PROTOCOLS = ['cartesian_beta', 'cartesian_ref15', 'dualspace_beta',
                    'dualspace_ref15', 'normal_beta', 'normal_ref15']
 
-CAT_ORDER = ['Experimental', 'AlphaFold', 'Boltz']
-SUB_ORDER = ['original', 'raw'] + [f'relaxed_{p}' for p in
-             ['normal_ref15', 'normal_beta', 'cartesian_ref15',
-              'cartesian_beta', 'dualspace_ref15', 'dualspace_beta']]
-
 
 def find_structures(pdb_id):
-    pdir = PROTEINS / pdb_id
+    """Structure variants of one protein from the structure manifest (see manifest.py)."""
     structs = []
-
-    exp = pdir / f"{pdb_id}.pdb"
-    if exp.exists():
-        structs.append({'path': str(exp), 'protein': pdb_id,
-                       'category': 'Experimental', 'subcategory': 'original',
-                       'model': 'exp', 'gz': False})
-
-    for name, cat, pattern in [('AF', 'AlphaFold', 'ranked_*.pdb'),
-                                ('Boltz', 'Boltz', 'boltz_input_model_*.pdb')]:
-        d = pdir / name
-        if d.exists():
-            for f in d.glob(pattern):
-                structs.append({'path': str(f), 'protein': pdb_id,
-                               'category': cat, 'subcategory': 'raw',
-                               'model': f.stem, 'gz': False})
-
-    for proto in RELAX_PROTOCOLS:
-        d = pdir / proto
-        if d.exists():
-            for f in d.glob(f"{pdb_id}_r*.pdb.gz"):
-                structs.append({'path': str(f), 'protein': pdb_id,
-                               'category': 'Experimental',
-                               'subcategory': f'relaxed_{proto}',
-                               'model': f.stem.replace('.pdb', ''), 'gz': True})
-
-    relax = pdir / "relax"
-    if relax.exists():
-        for name, cat in [('AF', 'AlphaFold'), ('Boltz', 'Boltz')]:
-            d = relax / name
-            if not d.exists():
-                continue
-            for f in d.rglob("*.pdb.gz"):
-                proto = next((p for p in f.parts if p in RELAX_PROTOCOLS), 'unknown')
-                structs.append({'path': str(f), 'protein': pdb_id,
-                               'category': cat, 'subcategory': f'relaxed_{proto}',
-                               'model': f.stem.replace('.pdb', ''), 'gz': True})
-
+    for row in load_structures(pdb_id):
+        model = 'exp' if row['subcategory'] == 'original' else row['stem']
+        structs.append({'path': row['path'], 'protein': pdb_id,
+                       'category': row['category'], 'subcategory': row['subcategory'],
+                       'model': model, 'gz': bool(row['compressed'])})
     return structs
 
 
@@ -200,8 +166,7 @@ def validate(s):
     try:
         if s['gz']:
             tmp = tempfile.NamedTemporaryFile(suffix='.pdb', delete=False, mode='wb')
-            with gzip.open(s['path'], 'rb') as f:
-                tmp.write(f.read())
+            tmp.write(read_structure(s['path']))
             tmp.close()
             path = tmp.name
         else:
@@ -217,50 +182,10 @@ def validate(s):
     return result
 
 
-def write_summary(pdb_id, df, path):
-    def sort_sub(subs):
-        return sorted(subs, key=lambda x: SUB_ORDER.index(x) if x in SUB_ORDER else 999)
-
-    lines = [f"# {pdb_id} Validation", "",
-             f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-             "", "## Counts", "",
-             "| Metric | N |", "|--------|---|",
-             f"| Total | {len(df)} |"]
-
-    for cat in CAT_ORDER:
-        n = len(df[df['category'] == cat])
-        if n:
-            lines.append(f"| {cat} | {n} |")
-
-    metrics = [
-        ('rama_favored_pct', 'Ramachandran', 'Favored %'),
-        ('rota_favored_pct', 'Rotamer', 'Favored %'),
-        ('clashscore', 'Clashscore', 'Score'),
-        ('molprobity_score', 'MolProbity', 'Score'),
-    ]
-
-    for col, title, label in metrics:
-        if col not in df.columns or not df[col].notna().any():
-            continue
-        lines.extend(["", f"## {title}", "",
-                     f"| Category | Subcategory | {label} | N |",
-                     "|----------|-------------|---------|---|"])
-        for cat in CAT_ORDER:
-            cdf = df[df['category'] == cat]
-            if cdf.empty:
-                continue
-            for sub in sort_sub(cdf['subcategory'].unique()):
-                sdf = cdf[cdf['subcategory'] == sub]
-                if sdf[col].notna().any():
-                    lines.append(f"| {cat} | {sub} | {sdf[col].mean():.2f} | {len(sdf)} |")
-
-    path.write_text('\n'.join(lines))
-
-
 def process(pdb_id, skip_done=True):
     analysis = PROTEINS / pdb_id / "analysis"
 
-    if skip_done and (analysis / "molprobity_results.csv").exists():
+    if skip_done and has_protein('molprobity_results', pdb_id):
         return pdb_id, 0, True
 
     analysis.mkdir(exist_ok=True)
@@ -287,20 +212,26 @@ def process(pdb_id, skip_done=True):
             'clashscore', 'clash_count', 'atom_count', 'molprobity_score']
     cols = [c for c in cols if c in df.columns]
 
-    df[cols].to_csv(analysis / "molprobity_results.csv", index=False)
-    write_summary(pdb_id, df, analysis / "VALIDATION_SUMMARY.md")
+    write_partitions('molprobity_results', df[cols])
+    write_summary(pdb_id, validation_stats(df), analysis / "VALIDATION_SUMMARY.md")
 
     return pdb_id, len(structs), False
 
 
 def main():
+    argparse.ArgumentParser(description="MolProbity validation of every structure").parse_args()
+    warnings.filterwarnings('ignore')
+    os.environ['CLIBD_MON'] = MON_LIB
+
     print("=" * 60)
     print("MolProbity Validation Pipeline")
     print("=" * 60)
     t0 = datetime.now()
     print(f"Start: {t0.strftime('%H:%M:%S')}")
 
-    proteins = sorted(d.name for d in PROTEINS.iterdir() if d.is_dir())
+    manifest = refresh_manifest()
+    proteins = manifest.proteins()
+    manifest.close()
     print(f"Proteins: {len(proteins)}")
 
     total = skipped = 0
@@ -313,8 +244,12 @@ def main():
             total += n
             print(f"  {pid}: {n}")
 
+    n_full = refresh_molprobity_full()
     print(f"\nValidated: {total} structures")
     print(f"Skipped: {skipped} proteins (cached)")
+    if n_full:
+        print(f"molprobity_full: {n_full} rows")
+        print(f"Summary cube: {ensure_cube('molprobity')}")
     print(f"Done: {datetime.now().strftime('%H:%M:%S')}")
 
 
@@ -1,44 +1,66 @@
 #!/usr/bin/env python3
 """Generate composite MolProbity + PoseBusters scorecard for AF2 vs Boltz1 sources."""
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from bootstrap import bootstrap_means, percentile_ci
+from query_service import connect
 
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
-PROTEINS_DIR = Path(__file__).parent.parent / "proteins"
-
-# Load MolProbity
-mp_df = pd.read_csv(RESULTS_DIR / "molprobity_full.csv")
-
-# Load PoseBusters raw from per-protein directories
-pb_dfs = []
-for protein_dir in sorted(PROTEINS_DIR.iterdir()):
-    if not protein_dir.is_dir():
-        continue
-    pb_file = protein_dir / "analysis" / "posebusters_raw.csv"
-    if pb_file.exists():
-        df = pd.read_csv(pb_file)
-        df['protein'] = protein_dir.name
-        pb_dfs.append(df)
-pb_df = pd.concat(pb_dfs, ignore_index=True) if pb_dfs else pd.DataFrame()
-
-# Load PoseBusters pass/fail
-pb_pf_dfs = []
-for protein_dir in sorted(PROTEINS_DIR.iterdir()):
-    if not protein_dir.is_dir():
-        continue
-    pb_file = protein_dir / "analysis" / "posebusters_results.csv"
-    if pb_file.exists():
-        df = pd.read_csv(pb_file)
-        df['protein'] = protein_dir.name
-        pb_pf_dfs.append(df)
-pb_pf_df = pd.concat(pb_pf_dfs, ignore_index=True) if pb_pf_dfs else pd.DataFrame()
+
+# Metric columns: (column, display name, better direction)
+MP_METRICS = [
+    ('clashscore', 'Clashscore', '↓'),
+    ('molprobity_score', 'MolProbity Score', '↓'),
+    ('rama_outliers_pct', 'Rama Outliers %', '↓'),
+    ('rama_favored_pct', 'Rama Favored %', '↑'),
+    ('rota_outliers_pct', 'Rotamer Outliers %', '↓'),
+    ('cbeta_deviations', 'C-beta Deviations', '↓'),
+    ('bond_rmsz', 'Bond RMSZ', '↓'),
+    ('angle_rmsz', 'Angle RMSZ', '↓'),
+    ('clash_count', 'Clash Count (raw)', '↓'),
+    ('omega_twisted', 'Omega Twisted', '↓'),
+]
+
+# PoseBusters binary tests
+PB_BINARY = [
+    ('bond_lengths', 'Bond Lengths', '↑'),
+    ('bond_angles', 'Bond Angles', '↑'),
+    ('steric_clashes', 'Steric Clashes', '↑'),
+    ('aromatic_flatness', 'Aromatic Flatness', '↑'),
+    ('peptide_planarity', 'Peptide Planarity', '↑'),
+    ('internal_energy', 'Internal Energy', '↑'),
+    ('backbone_connected', 'Backbone Connected', '↑'),
+    ('chirality', 'Chirality', '↑'),
+    ('complete_residues', 'Complete Residues', '↑'),
+    ('all_pass', 'ALL TESTS PASS', '↑'),
+]
+
+# PoseBusters continuous
+PB_CONT = [
+    ('raw_n_clashes', 'PB Steric Clashes', '↓'),
+    ('raw_worst_clash', 'PB Worst Clash (Å)', '↓'),
+    ('raw_n_bond_outliers', 'PB Bond Outliers', '↓'),
+    ('raw_n_angle_outliers', 'PB Angle Outliers', '↓'),
+    ('raw_n_twisted', 'PB Twisted Omega', '↓'),
+    ('raw_rosetta_score', 'PB Rosetta Energy', '↓'),
+    ('raw_mean_bond_length', 'PB Mean Bond (Å)', '-'),
+    ('raw_mean_backbone_angle', 'PB Mean N-CA-C (°)', '-'),
+]
 
 # All relaxation protocols
 PROTOCOLS = ['relaxed_normal_beta', 'relaxed_normal_ref15', 'relaxed_cartesian_beta',
              'relaxed_cartesian_ref15', 'relaxed_dualspace_beta', 'relaxed_dualspace_ref15']
 
+# Scorecard row type -> section title
+SECTIONS = [
+    ('MolProbity', 'MolProbity Metrics'),
+    ('PB Binary', 'PoseBusters Binary Tests (% passing)'),
+    ('PB Continuous', 'PoseBusters Continuous Metrics'),
+]
+
 SOURCE_CONFIGS = [
     # (name, baseline_subcat, model_filter)
     ('Experimental', 'original', None),
@@ -48,65 +70,101 @@ SOURCE_CONFIGS = [
 ]
 
 
-def get_baseline_relaxed(df, category, baseline_subcat, model_filter, is_molprobity=True):
-    """Get baseline and all relaxed data for a source."""
-    cat_df = df[df['category'] == category]
-
-    # Baseline
-    baseline = cat_df[cat_df['subcategory'] == baseline_subcat]
-    if model_filter == 'ranked_0':
-        if is_molprobity:
-            baseline = baseline[baseline['model'] == 'ranked_0']
-        else:
-            baseline = baseline[baseline['model'] == 'model0']
-    elif model_filter == 'not_ranked_0':
-        if is_molprobity:
-            baseline = baseline[~baseline['model'].isin(['ranked_0'])]
-        else:
-            baseline = baseline[~baseline['model'].isin(['model0'])]
-
-    # Relaxed (all protocols)
-    relaxed_all = {}
-    for protocol in PROTOCOLS:
-        rel = cat_df[cat_df['subcategory'] == protocol]
-        if model_filter == 'ranked_0':
-            if is_molprobity:
-                rel = rel[rel['model'].str.startswith('ranked_0')]
-            else:
-                rel = rel[rel['model'].str.startswith('ranked_0')]
-        elif model_filter == 'not_ranked_0':
-            if is_molprobity:
-                rel = rel[~rel['model'].str.startswith('ranked_0')]
-            else:
-                rel = rel[~rel['model'].str.startswith('ranked_0')]
-        relaxed_all[protocol] = rel
-
-    return baseline, relaxed_all
-
-
-def compute_metric_stats(baseline, relaxed_all, metric_col):
+def index_sources(df):
+    """Label every summary cube cell with its source configuration and phase.
+
+    phase is 'before' for the source's baseline subcategory and 'after' for
+    the relaxation protocols; other cells are dropped.
+    """
+    source = pd.Series(np.where(df['category'] == 'AlphaFold', 'AF ' + df['af_type'], df['category']),
+                       index=df.index)
+    baseline_subcat = source.map({name: subcat for name, subcat, _ in SOURCE_CONFIGS})
+    phase = pd.Series(np.where(df['subcategory'] == baseline_subcat, 'before',
+                               np.where(df['subcategory'].isin(PROTOCOLS), 'after', '')), index=df.index)
+    keep = baseline_subcat.notna() & (phase != '')
+    out = df[keep].copy()
+    out['source'] = source[keep]
+    out['phase'] = phase[keep]
+    return out
+
+
+def aggregate_groups(cube, metrics):
+    """All metrics of a dataset aggregated per (source, phase) and per (source, protocol).
+
+    The dataset's summary cube (see summary_cube) is rolled up into statistics per (source,
+    phase, subcategory, protein), which are then merged down to the groupings
+    used by the scorecard. The per-protein before/after groups feed the
+    bootstrap intervals of the deltas.
+    """
+    stats = cube.grouped(['source', 'phase', 'subcategory', 'protein'], metrics, prepare=index_sources)
+    groups = {
+        'metrics': stats.seen,
+        'phase': stats.combine(['source', 'phase']),
+        'protocol': stats.combine(['source', 'subcategory']),
+    }
+    groups['delta_ci'] = delta_intervals(stats.combine(['source', 'phase', 'protein']), metrics)
+    return groups
+
+
+def delta_intervals(per_protein, metrics):
+    """95% CI of the after - before mean of every (source, metric), proteins resampled.
+
+    Each source's before and after means are resampled over the same protein
+    draws (a paired cluster bootstrap), weighted by the rows behind each
+    protein mean, so the interval is for the pooled delta the scorecard shows.
+    Returns {(source, metric): (lo, hi)}.
+    """
+    cells, weights, labels = [], [], []
+    for source, _, _ in SOURCE_CONFIGS:
+        proteins = sorted(p for s, phase, p in per_protein if s == source and phase == 'before'
+                          and (s, 'after', p) in per_protein)
+        if not proteins:
+            continue
+        for phase in ['before', 'after']:
+            groups = [per_protein[(source, phase, p)] for p in proteins]
+            means = np.array([g.means() for g in groups]).T
+            counts = np.array([g.n for g in groups]).T
+            cells.extend(means)
+            weights.extend(counts)
+        labels.append(source)
+
+    draws = bootstrap_means(cells, weights)
+    k = len(metrics)
+    intervals = {}
+    for i, source in enumerate(labels):
+        before = draws[2 * i * k:(2 * i + 1) * k]
+        after = draws[(2 * i + 1) * k:(2 * i + 2) * k]
+        lo, hi = percentile_ci(after - before)
+        intervals.update({(source, m): (lo[j], hi[j]) for j, m in enumerate(metrics)})
+    return intervals
+
+
+def group_value(groups, stat, key, metric_col):
+    stats = groups['phase'].get(key)
+    return stats.get(metric_col)[stat] if stats is not None else np.nan
+
+
+def compute_metric_stats(groups, source, metric_col):
     """Compute before/after stats with best/worst protocols."""
-    if metric_col not in baseline.columns:
+    if metric_col not in groups['metrics']:
+        return None
+    if (source, 'after') not in groups['phase']:
         return None
 
-    before_mean = baseline[metric_col].mean()
-    before_min = baseline[metric_col].min()
-    before_max = baseline[metric_col].max()
+    before_mean = group_value(groups, 'mean', (source, 'before'), metric_col)
+    before_min = group_value(groups, 'min', (source, 'before'), metric_col)
+    before_max = group_value(groups, 'max', (source, 'before'), metric_col)
 
     # Aggregate across all protocols
-    all_relaxed = pd.concat(relaxed_all.values())
-    if len(all_relaxed) == 0:
-        return None
-
-    after_mean = all_relaxed[metric_col].mean()
-    after_min = all_relaxed[metric_col].min()
-    after_max = all_relaxed[metric_col].max()
+    after_mean = group_value(groups, 'mean', (source, 'after'), metric_col)
+    after_min = group_value(groups, 'min', (source, 'after'), metric_col)
+    after_max = group_value(groups, 'max', (source, 'after'), metric_col)
 
     # Best and worst protocol (by mean)
     protocol_means = {}
-    for prot, rel_df in relaxed_all.items():
-        if len(rel_df) > 0:
-            protocol_means[prot] = rel_df[metric_col].mean()
+    for prot in PROTOCOLS:
+        if (source, prot) in groups['protocol']:
+            protocol_means[prot] = groups['protocol'][(source, prot)].get(metric_col)['mean']
 
     if protocol_means:
         best_protocol = min(protocol_means, key=protocol_means.get)  # Assuming lower is better
@@ -118,6 +176,7 @@ def compute_metric_stats(baseline, relaxed_all, metric_col):
         best_val = worst_val = np.nan
 
     delta = after_mean - before_mean
+    delta_lo, delta_hi = groups['delta_ci'].get((source, metric_col), (np.nan, np.nan))
 
     return {
         'before_mean': before_mean,
@@ -127,6 +186,8 @@ def compute_metric_stats(baseline, relaxed_all, metric_col):
         'after_min': after_min,
         'after_max': after_max,
         'delta': delta,
+        'delta_lo': delta_lo,
+        'delta_hi': delta_hi,
         'best_protocol': best_protocol.replace('relaxed_', '') if best_protocol else None,
         'best_val': best_val,
         'worst_protocol': worst_protocol.replace('relaxed_', '') if worst_protocol else None,
@@ -134,94 +195,49 @@ def compute_metric_stats(baseline, relaxed_all, metric_col):
     }
 
 
-def compute_passfail_rate(baseline, relaxed_all, metric_col):
+def compute_passfail_rate(groups, source, metric_col):
     """Compute pass rate before/after."""
-    if metric_col not in baseline.columns:
+    if metric_col not in groups['metrics']:
         return None
-
-    before_rate = baseline[metric_col].mean() * 100  # Convert to %
-
-    all_relaxed = pd.concat(relaxed_all.values())
-    if len(all_relaxed) == 0:
+    if (source, 'after') not in groups['phase']:
         return None
 
-    after_rate = all_relaxed[metric_col].mean() * 100
+    before_rate = group_value(groups, 'mean', (source, 'before'), metric_col) * 100  # Convert to %
+    after_rate = group_value(groups, 'mean', (source, 'after'), metric_col) * 100
 
     delta = after_rate - before_rate
+    delta_lo, delta_hi = groups['delta_ci'].get((source, metric_col), (np.nan, np.nan))
 
     return {
         'before': before_rate,
         'after': after_rate,
         'delta': delta,
+        'delta_lo': delta_lo * 100,
+        'delta_hi': delta_hi * 100,
     }
 
 
-def main():
-    print("=" * 100)
-    print("COMPREHENSIVE SCORECARD FOR WEDNESDAY PRESENTATION")
-    print("=" * 100)
-
-    # MolProbity metrics
-    MP_METRICS = [
-        ('clashscore', 'Clashscore', '↓'),
-        ('molprobity_score', 'MolProbity Score', '↓'),
-        ('rama_outliers_pct', 'Rama Outliers %', '↓'),
-        ('rama_favored_pct', 'Rama Favored %', '↑'),
-        ('rota_outliers_pct', 'Rotamer Outliers %', '↓'),
-        ('cbeta_deviations', 'C-beta Deviations', '↓'),
-        ('bond_rmsz', 'Bond RMSZ', '↓'),
-        ('angle_rmsz', 'Angle RMSZ', '↓'),
-        ('clash_count', 'Clash Count (raw)', '↓'),
-        ('omega_twisted', 'Omega Twisted', '↓'),
-    ]
-
-    # PoseBusters binary tests
-    PB_BINARY = [
-        ('bond_lengths', 'Bond Lengths', '↑'),
-        ('bond_angles', 'Bond Angles', '↑'),
-        ('steric_clashes', 'Steric Clashes', '↑'),
-        ('aromatic_flatness', 'Aromatic Flatness', '↑'),
-        ('peptide_planarity', 'Peptide Planarity', '↑'),
-        ('internal_energy', 'Internal Energy', '↑'),
-        ('backbone_connected', 'Backbone Connected', '↑'),
-        ('chirality', 'Chirality', '↑'),
-        ('complete_residues', 'Complete Residues', '↑'),
-        ('all_pass', 'ALL TESTS PASS', '↑'),
-    ]
-
-    # PoseBusters continuous
-    PB_CONT = [
-        ('raw_n_clashes', 'PB Steric Clashes', '↓'),
-        ('raw_worst_clash', 'PB Worst Clash (Å)', '↓'),
-        ('raw_n_bond_outliers', 'PB Bond Outliers', '↓'),
-        ('raw_n_angle_outliers', 'PB Angle Outliers', '↓'),
-        ('raw_n_twisted', 'PB Twisted Omega', '↓'),
-        ('raw_rosetta_score', 'PB Rosetta Energy', '↓'),
-        ('raw_mean_bond_length', 'PB Mean Bond (Å)', '-'),
-        ('raw_mean_backbone_angle', 'PB Mean N-CA-C (°)', '-'),
-    ]
+def build_scorecard(mp_cube, pb_cube) -> pd.DataFrame:
+    """One row per metric: before/after means, delta with CI and protocol extremes per source."""
+    # Roll each dataset's summary cube up to (source, phase/protocol) statistics
+    mp_groups = aggregate_groups(mp_cube, [c for c, _, _ in MP_METRICS])
+    pb_groups = aggregate_groups(pb_cube, [c for c, _, _ in PB_CONT + PB_BINARY])
 
     results = []
 
     # Process MolProbity
-    print("\n### MolProbity Metrics")
-    print("-" * 100)
-
     for col, name, direction in MP_METRICS:
         row = {'metric': name, 'direction': direction, 'type': 'MolProbity'}
 
-        for source_name, baseline_subcat, model_filter in SOURCE_CONFIGS:
-            category = source_name.split()[0] if source_name.startswith('AF') else source_name
-            if 'AF' in source_name:
-                category = 'AlphaFold'
-
-            baseline, relaxed_all = get_baseline_relaxed(mp_df, category, baseline_subcat, model_filter, True)
-            stats = compute_metric_stats(baseline, relaxed_all, col)
+        for source_name, _, _ in SOURCE_CONFIGS:
+            stats = compute_metric_stats(mp_groups, source_name, col)
 
             if stats:
                 row[f'{source_name}_before'] = stats['before_mean']
                 row[f'{source_name}_after'] = stats['after_mean']
                 row[f'{source_name}_delta'] = stats['delta']
+                row[f'{source_name}_delta_lo'] = stats['delta_lo']
+                row[f'{source_name}_delta_hi'] = stats['delta_hi']
                 row[f'{source_name}_range'] = f"[{stats['after_min']:.1f}, {stats['after_max']:.1f}]"
                 row[f'{source_name}_best'] = f"{stats['best_protocol']}: {stats['best_val']:.2f}" if stats['best_protocol'] else "N/A"
                 row[f'{source_name}_worst'] = f"{stats['worst_protocol']}: {stats['worst_val']:.2f}" if stats['worst_protocol'] else "N/A"
@@ -235,27 +251,20 @@ def main():
                     row[f'{source_name}_flag'] = ''
 
         results.append(row)
-        print(f"{name}: processed")
 
     # Process PoseBusters binary
-    print("\n### PoseBusters Binary Tests (% passing)")
-    print("-" * 100)
-
     for col, name, direction in PB_BINARY:
         row = {'metric': name, 'direction': direction, 'type': 'PB Binary'}
 
-        for source_name, baseline_subcat, model_filter in SOURCE_CONFIGS:
-            category = source_name.split()[0] if source_name.startswith('AF') else source_name
-            if 'AF' in source_name:
-                category = 'AlphaFold'
-
-            baseline, relaxed_all = get_baseline_relaxed(pb_pf_df, category, baseline_subcat, model_filter, False)
-            stats = compute_passfail_rate(baseline, relaxed_all, col)
+        for source_name, _, _ in SOURCE_CONFIGS:
+            stats = compute_passfail_rate(pb_groups, source_name, col)
 
             if stats:
                 row[f'{source_name}_before'] = stats['before']
                 row[f'{source_name}_after'] = stats['after']
                 row[f'{source_name}_delta'] = stats['delta']
+                row[f'{source_name}_delta_lo'] = stats['delta_lo']
+                row[f'{source_name}_delta_hi'] = stats['delta_hi']
 
                 # Flag if worse
                 if stats['delta'] < -5:
@@ -264,27 +273,20 @@ def main():
                     row[f'{source_name}_flag'] = ''
 
         results.append(row)
-        print(f"{name}: processed")
 
     # Process PoseBusters continuous
-    print("\n### PoseBusters Continuous Metrics")
-    print("-" * 100)
-
     for col, name, direction in PB_CONT:
         row = {'metric': name, 'direction': direction, 'type': 'PB Continuous'}
 
-        for source_name, baseline_subcat, model_filter in SOURCE_CONFIGS:
-            category = source_name.split()[0] if source_name.startswith('AF') else source_name
-            if 'AF' in source_name:
-                category = 'AlphaFold'
-
-            baseline, relaxed_all = get_baseline_relaxed(pb_df, category, baseline_subcat, model_filter, False)
-            stats = compute_metric_stats(baseline, relaxed_all, col)
+        for source_name, _, _ in SOURCE_CONFIGS:
+            stats = compute_metric_stats(pb_groups, source_name, col)
 
             if stats:
                 row[f'{source_name}_before'] = stats['before_mean']
                 row[f'{source_name}_after'] = stats['after_mean']
                 row[f'{source_name}_delta'] = stats['delta']
+                row[f'{source_name}_delta_lo'] = stats['delta_lo']
+                row[f'{source_name}_delta_hi'] = stats['delta_hi']
                 row[f'{source_name}_range'] = f"[{stats['after_min']:.1f}, {stats['after_max']:.1f}]"
 
                 # Flag if worse
@@ -294,10 +296,26 @@ def main():
                     row[f'{source_name}_flag'] = ''
 
         results.append(row)
-        print(f"{name}: processed")
+
+    return pd.DataFrame(results)
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__).parse_args()
+
+    print("=" * 100)
+    print("COMPREHENSIVE SCORECARD FOR WEDNESDAY PRESENTATION")
+    print("=" * 100)
+
+    # From the query service when one is running, else computed here
+    df_results = connect().scorecard()
+    for kind, title in SECTIONS:
+        print(f"\n### {title}")
+        print("-" * 100)
+        for name in df_results.loc[df_results['type'] == kind, 'metric']:
+            print(f"{name}: processed")
 
     # Save results
-    df_results = pd.DataFrame(results)
     df_results.to_csv(RESULTS_DIR / "scorecard.csv", index=False)
     print(f"\nSaved scorecard.csv")
 
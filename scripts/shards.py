@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tar shards of relaxation replicates with an offset index.
+
+Each replicate directory (proteins/{PDB}/{protocol}/ and
+proteins/{PDB}/relax/{AF,Boltz}/{model}/{protocol}/) holds one small .pdb.gz
+file per replicate. pack_directory() writes them, still gzipped, into one
+uncompressed tar in the same directory:
+
+    structures.tar       members in name order, plain ustar
+    structures.tar.idx   JSON: {name: [data offset, size, mtime_ns]}
+
+Member paths are unchanged (directory/name), so the manifest, the pipelines
+and the results keep their paths whether a directory is packed or not.
+read_bytes() serves a path from its directory's shard when one indexes it and
+from the loose file otherwise; shards are read with pread on one descriptor
+per directory.
+
+The shard takes precedence over a loose file of the same name. Re-pack after
+rewriting replicates in place. `tar -xf structures.tar` restores the loose
+layout.
+"""
+
+import gzip
+import io
+import json
+import os
+import tarfile
+from functools import lru_cache
+
+SHARD = 'structures.tar'
+SHARD_INDEX = 'structures.tar.idx'
+SHARD_CACHE = 64
+
+
+def is_member(name: str) -> bool:
+    return name.endswith('.pdb.gz')
+
+
+class ShardReader:
+    """Random and sequential access to the members of one shard."""
+
+    def __init__(self, directory: str):
+        self.fd = None
+        self.directory = directory
+        self.path = os.path.join(directory, SHARD)
+        with open(os.path.join(directory, SHARD_INDEX)) as f:
+            index = json.load(f)
+        self.members = index['members']
+        self.shard_size = index['shard_size']
+
+    def _open(self) -> int:
+        if self.fd is None:
+            fd = os.open(self.path, os.O_RDONLY)
+            if os.fstat(fd).st_size != self.shard_size:
+                os.close(fd)
+                raise ValueError(f"{self.path} does not match its index")
+            self.fd = fd
+        return self.fd
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def entries(self) -> list:
+        """(path, size, mtime_ns) of every member, as recorded when packed."""
+        prefix = self.directory + os.sep
+        return [(prefix + name, size, mtime) for name, (_, size, mtime) in self.members.items()]
+
+    def read(self, name: str) -> bytes:
+        offset, size, _ = self.members[name]
+        return os.pread(self._open(), size, offset)
+
+    def iter_members(self):
+        """(name, bytes) of every member in file order: one sequential pass."""
+        with open(self.path, 'rb') as f:
+            for name, (offset, size, _) in sorted(self.members.items(), key=lambda t: t[1][0]):
+                f.seek(offset)
+                yield name, f.read(size)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        self.close()
+
+
+@lru_cache(maxsize=SHARD_CACHE)
+def open_shard(directory: str):
+    """Cached reader for the shard in directory, or None if it has none.
+
+    Only the index is loaded here; the tar is opened on the first read.
+    """
+    try:
+        return ShardReader(directory)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_bytes(path) -> bytes:
+    """Raw bytes of a structure file, from its directory's shard or from disk."""
+    path = str(path)
+    directory, name = os.path.split(path)
+    shard = open_shard(directory)
+    if shard is not None and name in shard:
+        return shard.read(name)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def read_structure(path) -> bytes:
+    """Decompressed PDB text of a structure file as bytes."""
+    data = read_bytes(path)
+    return gzip.decompress(data) if str(path).endswith('.gz') else data
+
+
+def open_structure(path):
+    """Text stream over a structure file, packed or loose."""
+    path = str(path)
+    directory, name = os.path.split(path)
+    shard = open_shard(directory)
+    if shard is not None and name in shard:
+        data = io.BytesIO(shard.read(name))
+        return gzip.open(data, 'rt') if path.endswith('.gz') else io.TextIOWrapper(data)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def loose_members(directory: str) -> dict:
+    """{name: (size, mtime_ns)} of the loose replicate files in directory."""
+    members = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            if is_member(entry.name) and entry.is_file():
+                st = entry.stat()
+                members[entry.name] = (st.st_size, st.st_mtime_ns)
+    return members
+
+
+def pack_directory(directory: str, remove: bool = False) -> tuple:
+    """Pack the loose replicates of directory into its shard.
+
+    Members already in the shard are kept unless a loose file replaces them.
+    With remove, the loose files are deleted once the shard has been read back
+    and matches them. Returns (status, members) with status one of 'packed',
+    'current' or 'empty'.
+    """
+    directory = str(directory)
+    loose = loose_members(directory)
+    shard = open_shard(directory)
+    packed = {n: (size, mtime) for n, (_, size, mtime) in shard.members.items()} if shard else {}
+    if not loose:
+        return ('current' if packed else 'empty'), len(packed)
+
+    status = 'current'
+    if any(packed.get(n) != stat for n, stat in loose.items()):
+        status = 'packed'
+        names = sorted(set(packed) | set(loose))
+        tmp_tar = os.path.join(directory, SHARD + '.tmp')
+        mtimes = {}
+        with tarfile.open(tmp_tar, 'w', format=tarfile.USTAR_FORMAT) as tar:
+            for name in names:
+                if name in loose:
+                    with open(os.path.join(directory, name), 'rb') as f:
+                        data = f.read()
+                    mtime = loose[name][1]
+                else:
+                    data = shard.read(name)
+                    mtime = packed[name][1]
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = mtime // 1_000_000_000
+                tar.addfile(info, io.BytesIO(data))
+                mtimes[name] = mtime
+        with tarfile.open(tmp_tar) as tar:
+            members = {m.name: [m.offset_data, m.size, mtimes[m.name]] for m in tar}
+
+        index = {'members': members, 'shard_size': os.path.getsize(tmp_tar)}
+        tmp_idx = os.path.join(directory, SHARD_INDEX + '.tmp')
+        with open(tmp_idx, 'w') as f:
+            json.dump(index, f)
+        open_shard.cache_clear()
+        os.replace(tmp_tar, os.path.join(directory, SHARD))
+        os.replace(tmp_idx, os.path.join(directory, SHARD_INDEX))
+        shard = open_shard(directory)
+
+    if remove:
+        for name in loose:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                if shard is None or name not in shard or shard.read(name) != f.read():
+                    raise ValueError(f"{path} does not match {SHARD}; not removed")
+        for name in loose:
+            os.unlink(os.path.join(directory, name))
+    return status, len(shard.members)
+
+
+def replicate_directories(protein_dir) -> list:
+    """Directories under protein_dir that hold replicate files, loose or packed."""
+    found = []
+    for dirpath, _, filenames in os.walk(protein_dir):
+        if SHARD_INDEX in filenames or any(is_member(n) for n in filenames):
+            found.append(dirpath)
+    return sorted(found)
@@ -4,123 +4,129 @@ Split AF analysis: ranked_0 (AMBER-relaxed) vs ranked_1-4 (unrelaxed)
 Methodological note: ranked_0 is pre-relaxed by AMBER inside AlphaFold.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from scipy import stats
+from paired_deltas import AF_RANKED_0, AF_RANKED_REST
+from summary_cube import load_cube
 
 RESULTS_DIR = Path(__file__).parent.parent / "validation_results"
 
-df = pd.read_csv(RESULTS_DIR / "molprobity_full.csv")
-
-# Split AlphaFold raw models
-af = df[df['category'] == 'AlphaFold']
-af_raw = af[af['subcategory'] == 'raw']
-
-# ranked_0 = AMBER-relaxed by AF
-# ranked_1-4 = unrelaxed by AF
-af_ranked0 = af_raw[af_raw['model'] == 'ranked_0']
-af_ranked1_4 = af_raw[af_raw['model'].isin(['ranked_1', 'ranked_2', 'ranked_3', 'ranked_4'])]
-
-print("=" * 70)
-print("SPLIT AF ANALYSIS: ranked_0 (pre-relaxed) vs ranked_1-4 (unrelaxed)")
-print("=" * 70)
-
-print(f"\nModel counts:")
-print(f"  ranked_0 (AMBER-relaxed): {len(af_ranked0)} structures")
-print(f"  ranked_1-4 (unrelaxed): {len(af_ranked1_4)} structures")
-
-# Compare initial metrics
-print("\n### Initial metrics (before Rosetta relaxation)")
-for metric in ['clashscore', 'molprobity_score', 'rama_outliers_pct', 'rota_outliers_pct']:
-    r0_mean = af_ranked0[metric].mean()
-    r14_mean = af_ranked1_4[metric].mean()
-    print(f"  {metric}:")
-    print(f"    ranked_0: {r0_mean:.2f}")
-    print(f"    ranked_1-4: {r14_mean:.2f}")
-    print(f"    Difference: {r14_mean - r0_mean:+.2f}")
-
-# Now compare improvement from Rosetta relaxation
-print("\n### Improvement from Rosetta (normal_beta) relaxation")
-
-af_relaxed = af[af['subcategory'] == 'relaxed_normal_beta']
-
-# For each protein, compare unrelaxed → relaxed
-results = []
-
-for protein in af_ranked0['protein'].unique():
-    # ranked_0 path: already AMBER-relaxed, then Rosetta
-    r0_before = af_ranked0[af_ranked0['protein'] == protein]['molprobity_score'].mean()
-    r0_after = af_relaxed[
-        (af_relaxed['protein'] == protein) &
-        (af_relaxed['model'].str.startswith('ranked_0'))
-    ]['molprobity_score'].mean()
-
-    # ranked_1-4 path: unrelaxed, then Rosetta
-    r14_before = af_ranked1_4[af_ranked1_4['protein'] == protein]['molprobity_score'].mean()
-    r14_after = af_relaxed[
-        (af_relaxed['protein'] == protein) &
-        (~af_relaxed['model'].str.startswith('ranked_0'))
-    ]['molprobity_score'].mean()
-
-    if pd.notna(r0_before) and pd.notna(r0_after):
-        results.append({
-            'protein': protein,
-            'group': 'ranked_0',
-            'before': r0_before,
-            'after': r0_after,
-            'improvement': r0_before - r0_after
-        })
-
-    if pd.notna(r14_before) and pd.notna(r14_after):
-        results.append({
-            'protein': protein,
-            'group': 'ranked_1-4',
-            'before': r14_before,
-            'after': r14_after,
-            'improvement': r14_before - r14_after
-        })
-
-results_df = pd.DataFrame(results)
-
-# Statistics per group
-for group in ['ranked_0', 'ranked_1-4']:
-    group_data = results_df[results_df['group'] == group]
-    improvements = group_data['improvement'].values
-
-    stat, p = stats.wilcoxon(improvements)
-    mean_imp = improvements.mean()
-
-    print(f"\n{group}:")
-    print(f"  N proteins: {len(group_data)}")
-    print(f"  Mean improvement: {mean_imp:.3f}")
-    print(f"  Wilcoxon p-value: {p:.6f}")
-    print(f"  Significant (p<0.05): {'YES' if p < 0.05 else 'NO'}")
-
-# Direct comparison
-r0_imps = results_df[results_df['group'] == 'ranked_0']['improvement'].values
-r14_imps = results_df[results_df['group'] == 'ranked_1-4']['improvement'].values
-
-print("\n### Head-to-head comparison")
-print(f"ranked_0 mean improvement: {r0_imps.mean():.3f}")
-print(f"ranked_1-4 mean improvement: {r14_imps.mean():.3f}")
-
-# Mann-Whitney U test between groups
-stat, p = stats.mannwhitneyu(r0_imps, r14_imps)
-print(f"Mann-Whitney U test p-value: {p:.6f}")
-
-print("\n" + "=" * 70)
-print("CONCLUSION")
-print("=" * 70)
-
-if results_df[results_df['group'] == 'ranked_1-4']['improvement'].mean() > \
-   results_df[results_df['group'] == 'ranked_0']['improvement'].mean():
-    print("""
+METRICS = ['clashscore', 'molprobity_score', 'rama_outliers_pct', 'rota_outliers_pct']
+
+GROUPS = {AF_RANKED_0: 'ranked_0', AF_RANKED_REST: 'ranked_1-4'}
+
+
+def split_models(cube) -> tuple:
+    """Statistics of the unrelaxed (ranked_0, ranked_1-4) AlphaFold models.
+
+    ranked_0 = AMBER-relaxed by AF, ranked_1-4 = unrelaxed by AF.
+    """
+    af_raw = cube.select({'category': 'AlphaFold', 'subcategory': 'raw'}).grouped(['af_type'], METRICS)
+    return af_raw.groups[(AF_RANKED_0,)], af_raw.groups[(AF_RANKED_REST,)]
+
+
+def improvements(cube) -> pd.DataFrame:
+    """Per protein and group: MolProbity score before and after Rosetta relaxation.
+
+    ranked_0 path: already AMBER-relaxed, then Rosetta; ranked_1-4 path:
+    unrelaxed, then Rosetta (relaxed_normal_beta).
+    """
+    pairs = cube.select({'category': 'AlphaFold'}).pairing_table(['molprobity_score'])
+    pairs = pairs[pairs['molprobity_score_baseline'].notna() & pairs['molprobity_score_mean'].notna()]
+    return pd.DataFrame({
+        'protein': pairs['protein'],
+        'group': pairs['af_type'].map(GROUPS),
+        'before': pairs['molprobity_score_baseline'],
+        'after': pairs['molprobity_score_mean'],
+        'improvement': pairs['molprobity_score_baseline'] - pairs['molprobity_score_mean'],
+    }).reset_index(drop=True)
+
+
+def print_group_tests(results_df: pd.DataFrame):
+    """Statistics per group: both Wilcoxon tests in one batch, BH-corrected together."""
+    from batch_stats import bh_fdr, wilcoxon_signed_rank
+
+    groups = ['ranked_0', 'ranked_1-4']
+    group_improvements = [results_df[results_df['group'] == group]['improvement'].values for group in groups]
+    _, p_values = wilcoxon_signed_rank(group_improvements)
+    q_values = bh_fdr(p_values)
+
+    for group, improvements, p, q in zip(groups, group_improvements, p_values, q_values):
+        mean_imp = improvements.mean()
+
+        print(f"\n{group}:")
+        print(f"  N proteins: {len(improvements)}")
+        print(f"  Mean improvement: {mean_imp:.3f}")
+        print(f"  Wilcoxon p-value: {p:.6f} (BH q = {q:.6f})")
+        print(f"  Significant (p<0.05): {'YES' if p < 0.05 else 'NO'}")
+
+
+def print_head_to_head(results_df: pd.DataFrame):
+    from scipy import stats
+    from batch_stats import cliffs_delta
+
+    r0_imps = results_df[results_df['group'] == 'ranked_0']['improvement'].values
+    r14_imps = results_df[results_df['group'] == 'ranked_1-4']['improvement'].values
+
+    print("\n### Head-to-head comparison")
+    print(f"ranked_0 mean improvement: {r0_imps.mean():.3f}")
+    print(f"ranked_1-4 mean improvement: {r14_imps.mean():.3f}")
+
+    # Mann-Whitney U test between groups
+    stat, p = stats.mannwhitneyu(r0_imps, r14_imps)
+    print(f"Mann-Whitney U test p-value: {p:.6f}")
+    print(f"Cliff's delta (ranked_1-4 vs ranked_0): {cliffs_delta([r14_imps], [r0_imps])[0]:+.3f}")
+
+
+def main():
+    argparse.ArgumentParser(description="ranked_0 (AMBER-relaxed) vs ranked_1-4 (unrelaxed) AlphaFold models").parse_args()
+
+    cube = load_cube('molprobity')
+    af_ranked0, af_ranked1_4 = split_models(cube)
+
+    print("=" * 70)
+    print("SPLIT AF ANALYSIS: ranked_0 (pre-relaxed) vs ranked_1-4 (unrelaxed)")
+    print("=" * 70)
+
+    print(f"\nModel counts:")
+    print(f"  ranked_0 (AMBER-relaxed): {af_ranked0.rows} structures")
+    print(f"  ranked_1-4 (unrelaxed): {af_ranked1_4.rows} structures")
+
+    # Compare initial metrics
+    print("\n### Initial metrics (before Rosetta relaxation)")
+    for metric in METRICS:
+        r0_mean = af_ranked0.get(metric)['mean']
+        r14_mean = af_ranked1_4.get(metric)['mean']
+        print(f"  {metric}:")
+        print(f"    ranked_0: {r0_mean:.2f}")
+        print(f"    ranked_1-4: {r14_mean:.2f}")
+        print(f"    Difference: {r14_mean - r0_mean:+.2f}")
+
+    # Now compare improvement from Rosetta relaxation
+    print("\n### Improvement from Rosetta (normal_beta) relaxation")
+
+    results_df = improvements(cube)
+    print_group_tests(results_df)
+    print_head_to_head(results_df)
+
+    print("\n" + "=" * 70)
+    print("CONCLUSION")
+    print("=" * 70)
+
+    if results_df[results_df['group'] == 'ranked_1-4']['improvement'].mean() > \
+       results_df[results_df['group'] == 'ranked_0']['improvement'].mean():
+        print("""
 ranked_1-4 (unrelaxed AF models) benefit MORE from Rosetta relaxation
 than ranked_0 (AMBER-relaxed AF models).
 
 This confirms the hypothesis: Rosetta relaxation is redundant for
 already-relaxed structures but beneficial for unrelaxed ones.
 """)
-else:
-    print("Unexpected result - need to investigate further")
+    else:
+        print("Unexpected result - need to investigate further")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of every script entry point.
+
+Each entry point is measured in fresh interpreters, one at a time:
+
+    import   seconds to import the module (no work may happen at import)
+    help     wall seconds for `python scripts/<name>.py --help`
+    heavy    heavy libraries the import pulled in. pandas and pyarrow are
+             the data model of the results store and every analysis module,
+             so they are listed but expected; plotting, statistics and query
+             libraries (matplotlib, seaborn, scipy, duckdb, tqdm) should be
+             loaded lazily by the code that needs them
+
+The median of --repeat runs is reported; with --record the results are
+appended to validation_results/startup_bench.csv so the cost can be tracked
+across changes.
+
+Usage:
+    python scripts/startup_bench.py
+    python scripts/startup_bench.py --repeat 5 --record
+    python scripts/startup_bench.py scorecard paper_figures_v2
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).parent
+RESULTS_DIR = SCRIPTS_DIR.parent / "validation_results"
+HISTORY = RESULTS_DIR / "startup_bench.csv"
+
+HEAVY_MODULES = ['pandas', 'pyarrow', 'matplotlib', 'seaborn', 'scipy', 'duckdb', 'tqdm']
+
+IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def entry_points() -> list:
+    """Module names of the scripts that can be run directly."""
+    names = []
+    for path in sorted(SCRIPTS_DIR.glob("*.py")):
+        if path.name != Path(__file__).name and '__name__ == "__main__"' in path.read_text():
+            names.append(path.stem)
+    return names
+
+
+def time_import(module: str) -> dict:
+    probe = IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", probe], cwd=SCRIPTS_DIR,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def time_help(module: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, f"{module}.py", "--help"], cwd=SCRIPTS_DIR,
+                   capture_output=True, text=True, check=True)
+    return time.perf_counter() - t0
+
+
+def interpreter_startup(repeat: int) -> float:
+    """Bare interpreter startup, to read the other numbers against."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def benchmark(module: str, repeat: int) -> dict:
+    imports = [time_import(module) for _ in range(repeat)]
+    helps = [time_help(module) for _ in range(repeat)]
+    return {
+        'script': module,
+        'import_s': statistics.median(r['seconds'] for r in imports),
+        'help_s': statistics.median(helps),
+        'heavy': ",".join(imports[-1]['heavy']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start cost of every script entry point")
+    parser.add_argument('scripts', nargs='*', help='Entry points to measure (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh interpreters per measurement')
+    parser.add_argument('--record', action='store_true', help=f'Append the results to {HISTORY.name}')
+    args = parser.parse_args()
+
+    scripts = args.scripts or entry_points()
+    baseline = interpreter_startup(args.repeat)
+
+    print("=" * 60)
+    print("STARTUP BENCHMARK")
+    print("=" * 60)
+    print(f"Interpreter startup: {baseline:.3f}s (median of {args.repeat})\n")
+    print(f"{'Script':<28} {'Import':>8} {'--help':>8}  Heavy imports")
+    print("-" * 70)
+
+    rows = []
+    for script in scripts:
+        try:
+            row = benchmark(script, args.repeat)
+        except subprocess.CalledProcessError as e:
+            error = (e.stderr or '').strip().splitlines()
+            print(f"{script:<28} FAILED: {error[-1] if error else e}")
+            continue
+        rows.append(row)
+        print(f"{script:<28} {row['import_s']:>7.3f}s {row['help_s']:>7.3f}s  {row['heavy'] or '-'}")
+
+    if args.record and rows:
+        import pandas as pd
+        df = pd.DataFrame(rows)
+        df.insert(0, 'timestamp', datetime.now().isoformat(timespec='seconds'))
+        df['python_s'] = baseline
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_csv(HISTORY, mode='a', header=not HISTORY.exists(), index=False)
+        print(f"\nAppended {len(rows)} rows to {HISTORY}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Mergeable streaming statistics.
+
+RunningStats keeps count, sum, mean, M2 (for the variance), min and max of a
+fixed list of metrics. Chunks are folded in with the pairwise update of Chan,
+Golub & LeVeque, which reduces to Welford's update for single rows, so the
+result does not depend on how the data was chunked and two partial results
+can be merged. Missing values (NaN) are skipped per metric; booleans count as
+0/1, so the mean of a pass/fail column is its pass rate.
+
+With digest=True every metric also keeps a t-digest (Dunning & Ertl): a
+bounded set of weighted centroids, finer towards the tails, from which
+quantiles are interpolated. Digests merge like the moments, so medians and
+quartiles can be computed over data that is only ever seen one chunk at a
+time, at a fixed memory cost per group and metric.
+
+GroupedStats holds one RunningStats per group key and can combine groups over
+any subset of the key columns.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# t-digest compression; a digest keeps about COMPRESSION / 2 centroids
+COMPRESSION = 100
+DIGEST_BUFFER = 2000
+
+# Quantiles reported by get() and frame() when digests are kept
+QUANTILES = {'q25': 0.25, 'median': 0.5, 'q75': 0.75}
+
+
+class TDigest:
+    """Mergeable quantile sketch over a stream of values (k1 scale function)."""
+
+    def __init__(self, compression: int = COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.buffered = 0
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+
+    def update(self, values):
+        """Add values (NaN skipped)."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self._add(values, np.ones(len(values)))
+
+    def merge(self, other: 'TDigest'):
+        other._compress()
+        if len(other.means):
+            self._add(other.means, other.weights)
+
+    def _add(self, means, weights):
+        self.buffer.append((means, weights))
+        self.buffered += len(means)
+        if self.buffered > DIGEST_BUFFER:
+            self._compress()
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        means = np.concatenate([self.means] + [m for m, _ in self.buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self.buffer])
+        self.buffer, self.buffered = [], 0
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # Centroid = run of points whose midpoint quantiles share one unit of k
+        cum = np.cumsum(weights)
+        q = (cum - weights / 2) / cum[-1]
+        bucket = np.floor(self._k(q) - self._k(0.0)).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    @property
+    def count(self) -> float:
+        self._compress()
+        return float(self.weights.sum())
+
+    def quantile(self, q, lo: float = None, hi: float = None):
+        """Interpolated quantile(s); lo/hi (the exact min/max) pin the ends."""
+        self._compress()
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        lo = self.means[0] if lo is None else lo
+        hi = self.means[-1] if hi is None else hi
+        return np.interp(np.asarray(q) * total, np.r_[0.0, centers, total],
+                         np.r_[lo, self.means, hi])
+
+
+class RunningStats:
+    """Count, mean, variance, min and max per metric, updated chunk by chunk."""
+
+    def __init__(self, metrics: list, digest: bool = False):
+        k = len(metrics)
+        self.metrics = list(metrics)
+        self.digests = [TDigest() for _ in metrics] if digest else None
+        self.rows = 0
+        self.n = np.zeros(k, dtype=np.int64)
+        self.total = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+
+    def _merge(self, n, total, mean, m2, lo, hi):
+        n_a = self.n
+        n_ab = n_a + n
+        delta = mean - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(n_ab > 0, n / n_ab, 0.0)
+            self.mean = self.mean + delta * frac
+            self.m2 = self.m2 + m2 + delta ** 2 * n_a * frac
+        self.n = n_ab
+        self.total = self.total + total
+        self.min = np.minimum(self.min, lo)
+        self.max = np.maximum(self.max, hi)
+
+    @classmethod
+    def from_moments(cls, metrics: list, rows: int, n, total, sumsq, lo, hi) -> 'RunningStats':
+        """Stats of precomputed per-metric count, sum, sum of squares, min and max.
+
+        This is the form the summary cube stores (see summary_cube); quantiles
+        cannot be recovered from it, so there are no digests.
+        """
+        stats = cls(metrics)
+        n = np.asarray(n, dtype=np.int64)
+        total = np.asarray(total, dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, total / np.maximum(n, 1), 0.0)
+        m2 = np.maximum(np.asarray(sumsq, dtype=float) - total * mean, 0.0)
+        present = n > 0
+        stats.rows = int(rows)
+        stats._merge(n, total, mean, m2, np.where(present, lo, np.inf), np.where(present, hi, -np.inf))
+        return stats
+
+    def update(self, values):
+        """Fold in a (rows, metrics) array; NaN marks a missing value."""
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.metrics))
+        self.rows += len(values)
+        present = ~np.isnan(values)
+        n = present.sum(axis=0)
+        total = np.where(present, values, 0.0).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, total / np.maximum(n, 1), 0.0)
+        m2 = np.where(present, (values - mean) ** 2, 0.0).sum(axis=0)
+        lo = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+        hi = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+        self._merge(n, total, mean, m2, lo, hi)
+        if self.digests is not None:
+            for i, digest in enumerate(self.digests):
+                digest.update(values[:, i])
+
+    def merge(self, other: 'RunningStats'):
+        self.rows += other.rows
+        self._merge(other.n, other.total, other.mean, other.m2, other.min, other.max)
+        if self.digests is not None and other.digests is not None:
+            for digest, part in zip(self.digests, other.digests):
+                digest.merge(part)
+
+    def quantile(self, metric: str, q):
+        """Approximate quantile(s) of a metric; needs digest=True."""
+        if self.digests is None:
+            raise ValueError("quantiles need RunningStats(..., digest=True)")
+        i = self.metrics.index(metric)
+        if not self.n[i]:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        return self.digests[i].quantile(q, self.min[i], self.max[i])
+
+    def means(self) -> np.ndarray:
+        """sum / n per metric (NaN if empty): exact for counts and pass rates.
+
+        The running mean only feeds the variance update; reporting sum / n
+        keeps results independent of how groups were split and merged.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > 0, self.total / np.maximum(self.n, 1), np.nan)
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.n > ddof, np.sqrt(self.m2 / (self.n - ddof)), np.nan)
+
+    def get(self, metric: str) -> dict:
+        """n, sum, mean, std, min, max (and q25, median, q75 with digests) of a metric."""
+        i = self.metrics.index(metric)
+        n = int(self.n[i])
+        out = {'n': n, 'sum': self.total[i],
+               'mean': self.means()[i], 'std': self.std()[i],
+               'min': self.min[i] if n else np.nan, 'max': self.max[i] if n else np.nan}
+        if self.digests is not None:
+            out.update(zip(QUANTILES, np.atleast_1d(self.quantile(metric, list(QUANTILES.values())))))
+        return out
+
+    def frame(self) -> pd.DataFrame:
+        """One row per metric: n, mean, std, min, max, sum (and quantiles with digests)."""
+        empty = self.n == 0
+        df = pd.DataFrame({
+            'metric': self.metrics, 'n': self.n,
+            'mean': self.means(), 'std': self.std(),
+            'min': np.where(empty, np.nan, self.min), 'max': np.where(empty, np.nan, self.max),
+            'sum': self.total,
+        })
+        if self.digests is not None:
+            quantiles = np.array([self.quantile(m, list(QUANTILES.values())) for m in self.metrics])
+            for j, name in enumerate(QUANTILES):
+                df[name] = quantiles[:, j] if len(self.metrics) else []
+        return df
+
+
+class GroupedStats:
+    """RunningStats per group of rows, keyed by the values of the key columns."""
+
+    def __init__(self, keys: list, metrics: list, digest: bool = False):
+        self.keys = list(keys)
+        self.metrics = list(metrics)
+        self.digest = digest
+        self.groups = {}
+        self.seen = set()  # metrics that were present as columns in some update
+
+    def _new(self) -> RunningStats:
+        return RunningStats(self.metrics, self.digest)
+
+    def update(self, df: pd.DataFrame):
+        metrics = [m for m in self.metrics if m in df.columns]
+        self.seen.update(metrics)
+        for key, part in df.groupby(self.keys, observed=True, sort=False):
+            values = np.full((len(part), len(self.metrics)), np.nan)
+            for m in metrics:
+                values[:, self.metrics.index(m)] = part[m].to_numpy(dtype=float, na_value=np.nan)
+            self.groups.setdefault(key, self._new()).update(values)
+
+    def merge(self, other: 'GroupedStats'):
+        self.seen |= other.seen
+        for key, stats in other.groups.items():
+            self.groups.setdefault(key, self._new()).merge(stats)
+
+    def combine(self, keys: list = ()) -> dict:
+        """Groups merged down to the given key columns ({(): stats} for the grand total)."""
+        idx = [self.keys.index(k) for k in keys]
+        out = {}
+        for key, stats in self.groups.items():
+            sub = tuple(key[i] for i in idx)
+            out.setdefault(sub, self._new()).merge(stats)
+        return out
+
+    def total(self) -> RunningStats:
+        return self.combine().get((), self._new())
+
+    def frame(self) -> pd.DataFrame:
+        """Long table: key columns, metric, n, mean, std, min, max, sum."""
+        parts = []
+        for key, stats in sorted(self.groups.items()):
+            part = stats.frame()
+            for col, value in zip(self.keys, key):
+                part[col] = value
+            parts.append(part)
+        if not parts:
+            return pd.DataFrame(columns=self.keys + ['metric', 'n', 'mean', 'std', 'min', 'max', 'sum'])
+        df = pd.concat(parts, ignore_index=True)
+        return df[self.keys + [c for c in df.columns if c not in self.keys]]
+
+    def wide(self, stats=('mean',), keys: list = None) -> pd.DataFrame:
+        """One row per group (merged down to keys): n (rows) and {metric}_{stat} columns."""
+        keys = self.keys if keys is None else list(keys)
+        rows = []
+        for key, group in sorted(self.combine(keys).items()):
+            row = dict(zip(keys, key))
+            row['n'] = group.rows
+            for m in self.metrics:
+                values = group.get(m)
+                row.update({f"{m}_{s}": values[s] for s in stats})
+            rows.append(row)
+        return pd.DataFrame(rows, columns=keys + ['n'] + [f"{m}_{s}" for m in self.metrics for s in stats])
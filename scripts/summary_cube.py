@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Materialized summary cube of every metric of an analysis dataset.
+
+The cube holds one cell per (protein, category, af_type, subcategory): the
+row count and, per metric, the count of present values, their sum, sum of
+squares, min and max. af_type is the AlphaFold split of paired_deltas
+(ranked_0 (AMBER) / ranked_1-4 (unrelaxed)) and '' for the other sources.
+Every per-group mean, std, min and max the analysis scripts report is a
+roll-up of these cells, so they are computed from a few hundred rows instead
+of a scan of the full table.
+
+Cubes are built by streaming the cached datasets (see datasets.py), stored as
+Parquet next to them in validation_results/cache/ and rebuilt when the
+dataset's source files change. The validation pipelines refresh them when
+they finish. With --summaries the per-protein VALIDATION_SUMMARY.md files are
+rewritten from the cube.
+
+Usage:
+    python scripts/summary_cube.py               # build stale cubes and list them
+    python scripts/summary_cube.py --rebuild
+    python scripts/summary_cube.py --summaries   # rewrite every VALIDATION_SUMMARY.md
+"""
+
+import argparse
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from datasets import CACHE_DIR, DATASETS, cached_fingerprint, ensure, fingerprint, iter_dataset, write_cache
+from paired_deltas import GROUP, af_type, order_pairs
+from results_store import BASELINE, KEYS, PROTEINS, STORE_DIR
+from streaming_stats import GroupedStats, RunningStats
+
+CUBE_KEYS = ['protein', 'category', 'af_type', 'subcategory']
+
+# Stored per metric, and how cells are merged for each
+STATS = {'n': 'sum', 'sum': 'sum', 'sumsq': 'sum', 'min': 'min', 'max': 'max'}
+
+# VALIDATION_SUMMARY.md sections: (column, title, label)
+SUMMARY_METRICS = [
+    ('rama_favored_pct', 'Ramachandran', 'Favored %'),
+    ('rota_favored_pct', 'Rotamer', 'Favored %'),
+    ('clashscore', 'Clashscore', 'Score'),
+    ('molprobity_score', 'MolProbity', 'Score'),
+]
+
+CAT_ORDER = ['Experimental', 'AlphaFold', 'Boltz']
+SUB_ORDER = ['original', 'raw'] + [f'relaxed_{p}' for p in
+             ['normal_ref15', 'normal_beta', 'cartesian_ref15',
+              'cartesian_beta', 'dualspace_ref15', 'dualspace_beta']]
+
+
+def column(metric: str, stat: str) -> str:
+    return f"{metric}.{stat}"
+
+
+def cube_path(name: str) -> Path:
+    return CACHE_DIR / f"{name}_cube.parquet"
+
+
+def cube_metrics(name: str, root: Path = STORE_DIR) -> list:
+    """Numeric and boolean columns of a dataset."""
+    schema = pq.read_schema(ensure(name, root=root))
+    return [f.name for f in schema if f.name not in KEYS and
+            (pa.types.is_floating(f.type) or pa.types.is_integer(f.type) or pa.types.is_boolean(f.type))]
+
+
+def chunk_cells(chunk: pd.DataFrame, metrics: list) -> pd.DataFrame:
+    """Cells of one chunk of rows, in order of first appearance."""
+    values = pd.DataFrame({m: chunk[m].to_numpy(dtype=float, na_value=np.nan) for m in metrics},
+                          index=chunk.index)
+    by = [chunk['protein'], chunk['category'], af_type(chunk).fillna('').rename('af_type'),
+          chunk['subcategory']]
+    grouped = values.groupby(by, sort=False)
+    parts = {
+        'n': grouped.count(),
+        'sum': grouped.sum(),
+        'sumsq': (values ** 2).groupby(by, sort=False).sum(),
+        'min': grouped.min(),
+        'max': grouped.max(),
+    }
+    cells = pd.concat([parts[s].rename(columns=lambda m, s=s: column(m, s)) for s in STATS], axis=1)
+    cells.insert(0, 'rows', grouped.size())
+    return cells
+
+
+def merge_cells(cells: pd.DataFrame, by: list) -> pd.DataFrame:
+    """Cells merged down to the by columns (a single row for by=[])."""
+    reduce = {'rows': 'sum', **{c: STATS[c.rsplit('.', 1)[1]] for c in cells.columns if '.' in c}}
+    if not by:
+        return cells[list(reduce)].agg(reduce).to_frame().T
+    grouped = cells.groupby(by, sort=False, observed=True)
+    parts = [getattr(grouped[[c for c, how in reduce.items() if how == op]], op)()
+             for op in dict.fromkeys(reduce.values())]
+    return pd.concat(parts, axis=1)[list(reduce)].reset_index()
+
+
+def build_cube(name: str, root: Path = STORE_DIR) -> pd.DataFrame:
+    """Cells of a dataset, streamed one chunk at a time."""
+    metrics = cube_metrics(name, root)
+    parts = [chunk_cells(chunk, metrics) for chunk in iter_dataset(name, KEYS + metrics, root=root)]
+    if not parts:
+        return pd.DataFrame(columns=CUBE_KEYS + ['rows'] + [column(m, s) for s in STATS for m in metrics])
+    cells = merge_cells(pd.concat(parts).reset_index(), CUBE_KEYS)
+    cells['rows'] = cells['rows'].astype(np.int64)
+    for m in metrics:
+        cells[column(m, 'n')] = cells[column(m, 'n')].astype(np.int64)
+    return cells.astype({k: 'category' for k in CUBE_KEYS})
+
+
+def ensure_cube(name: str, rebuild: bool = False, root: Path = STORE_DIR) -> Path:
+    """Path of an up-to-date cube for the dataset, rebuilding it if stale."""
+    digest = fingerprint(name, root)
+    path = cube_path(name)
+    if rebuild or cached_fingerprint(path) != digest:
+        write_cache(name, build_cube(name, root), digest, path)
+    return path
+
+
+def load_cube(name: str, rebuild: bool = False, root: Path = STORE_DIR) -> 'SummaryCube':
+    cells = pd.read_parquet(ensure_cube(name, rebuild, root))
+    for k in CUBE_KEYS:
+        cells[k] = cells[k].astype(str)
+    return SummaryCube(cells)
+
+
+class SummaryCube:
+    """Cells of a dataset and their roll-ups."""
+
+    def __init__(self, cells: pd.DataFrame):
+        self.cells = cells
+        self.metrics = [c[:-len('.n')] for c in cells.columns if c.endswith('.n')]
+
+    @property
+    def rows(self) -> int:
+        return int(self.cells['rows'].sum())
+
+    def select(self, filters: dict = None) -> 'SummaryCube':
+        """Cells matching {column: value or list of values}."""
+        keep = pd.Series(True, index=self.cells.index)
+        for col, value in (filters or {}).items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            keep &= self.cells[col].isin(values)
+        return SummaryCube(self.cells[keep])
+
+    def rollup(self, by: list, metrics: list = None) -> pd.DataFrame:
+        """One row per group: by columns, rows and {metric}.{stat} moments."""
+        metrics = self.metrics if metrics is None else [m for m in metrics if m in self.metrics]
+        columns = ['rows'] + [column(m, s) for s in STATS for m in metrics]
+        return merge_cells(self.cells[list(by) + columns], list(by))
+
+    def grouped(self, by: list, metrics: list, prepare=None) -> GroupedStats:
+        """RunningStats per group, as aggregate_dataset() would return them.
+
+        prepare, if given, maps the cells to the frame that is grouped (e.g.
+        to derive the group columns from category, af_type and subcategory).
+        Metrics the dataset does not have are kept with no values.
+        """
+        cells = self.cells if prepare is None else prepare(self.cells)
+        present = [m for m in metrics if m in self.metrics]
+        stats = GroupedStats(by, metrics)
+        stats.seen.update(present)
+        moments = SummaryCube(cells).rollup(by, present)
+        for s in STATS:
+            for m in metrics:
+                if m not in present:
+                    moments[column(m, s)] = 0 if s in ('n', 'sum', 'sumsq') else np.nan
+        arrays = {s: moments[[column(m, s) for m in metrics]].to_numpy(dtype=float) for s in STATS}
+        for i, key in enumerate(moments[by].itertuples(index=False, name=None)):
+            stats.groups[key] = RunningStats.from_moments(
+                metrics, moments['rows'].iat[i], *(arrays[s][i] for s in STATS))
+        return stats
+
+    def pairing_table(self, metrics: list, relaxed='relaxed_normal_beta',
+                      split_af: bool = True, baseline: dict = BASELINE) -> pd.DataFrame:
+        """paired_deltas.pairing_table() over the cells: same columns and row order."""
+        relaxed = [relaxed] if isinstance(relaxed, str) else list(relaxed)
+        metrics = [m for m in metrics if m in self.metrics]
+        cells = self.cells.rename(columns={'subcategory': 'protocol'})
+        is_base = cells['protocol'] == cells['category'].map(baseline)
+        cells = cells[is_base | cells['protocol'].isin(relaxed)]
+        is_base = is_base[cells.index]
+        if not split_af:
+            cells = cells.assign(af_type='')
+
+        base = SummaryCube(cells[is_base]).rollup(GROUP, metrics)
+        base_table = pd.concat([base[GROUP], base['rows'].rename('n_baseline'),
+                                moments_mean(base, metrics).add_suffix('_baseline')], axis=1)
+
+        rel = SummaryCube(cells[~is_base]).rollup(GROUP + ['protocol'], metrics)
+        extremes = [rel[[column(m, s) for m in metrics]].set_axis([f'{m}_{s}' for m in metrics], axis=1)
+                    for s in ['min', 'max']]
+        rel_table = pd.concat([rel[GROUP + ['protocol']], rel['rows'].rename('n_relaxed'),
+                               moments_mean(rel, metrics).add_suffix('_mean')] + extremes, axis=1)
+
+        table = base_table.merge(rel_table, on=GROUP, how='inner')
+        table['af_type'] = table['af_type'].where(table['af_type'] != '', None)
+        return order_pairs(table, pd.unique(base['protein']), relaxed)
+
+    def paired(self, metric: str, relaxed, baseline: dict = BASELINE) -> pd.DataFrame:
+        """ResultsQuery.paired() over the cells: same columns and row order."""
+        relaxed = [relaxed] if isinstance(relaxed, str) else list(relaxed)
+        cells = self.cells
+        is_base = cells['subcategory'] == cells['category'].map(baseline)
+
+        base = SummaryCube(cells[is_base]).rollup(['protein', 'category'], [metric])
+        base = pd.DataFrame({'protein': base['protein'], 'category': base['category'],
+                             'baseline': moments_mean(base, [metric])[metric],
+                             'n_baseline': base[column(metric, 'n')]})
+        rel = SummaryCube(cells[cells['subcategory'].isin(relaxed)]).rollup(
+            ['protein', 'category', 'subcategory'], [metric])
+        rel = pd.DataFrame({'protein': rel['protein'], 'category': rel['category'],
+                            'subcategory': rel['subcategory'],
+                            'relaxed': moments_mean(rel, [metric])[metric],
+                            'relaxed_min': rel[column(metric, 'min')],
+                            'relaxed_max': rel[column(metric, 'max')],
+                            'n_relaxed': rel[column(metric, 'n')]})
+
+        pairs = base.merge(rel, on=['protein', 'category'])
+        pairs = pairs[pairs['baseline'].notna() & pairs['relaxed'].notna()]
+        pairs = pairs.sort_values(['category', 'subcategory', 'protein'])
+        return pairs[['protein', 'category', 'subcategory', 'baseline', 'relaxed',
+                      'relaxed_min', 'relaxed_max', 'n_baseline', 'n_relaxed']].reset_index(drop=True)
+
+
+def moments_mean(moments: pd.DataFrame, metrics: list) -> pd.DataFrame:
+    """sum / n per metric of rolled-up cells (NaN where a group has no values)."""
+    n = moments[[column(m, 'n') for m in metrics]].to_numpy(dtype=float)
+    total = moments[[column(m, 'sum') for m in metrics]].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, total / np.maximum(n, 1), np.nan)
+    return pd.DataFrame(mean, columns=metrics, index=moments.index)
+
+
+# =============================================================================
+# VALIDATION_SUMMARY.md
+# =============================================================================
+def validation_stats(df: pd.DataFrame) -> GroupedStats:
+    """Per (category, subcategory) statistics of a protein's validation rows."""
+    stats = GroupedStats(['category', 'subcategory'], [col for col, _, _ in SUMMARY_METRICS])
+    stats.update(df)
+    return stats
+
+
+def write_summary(pdb_id: str, stats: GroupedStats, path: Path):
+    """VALIDATION_SUMMARY.md from per (category, subcategory) statistics."""
+    def sort_sub(subs):
+        return sorted(subs, key=lambda x: SUB_ORDER.index(x) if x in SUB_ORDER else 999)
+
+    by_category = stats.combine(['category'])
+    lines = [f"# {pdb_id} Validation", "",
+             f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+             "", "## Counts", "",
+             "| Metric | N |", "|--------|---|",
+             f"| Total | {stats.total().rows} |"]
+
+    for cat in CAT_ORDER:
+        n = by_category[(cat,)].rows if (cat,) in by_category else 0
+        if n:
+            lines.append(f"| {cat} | {n} |")
+
+    total = stats.total()
+    for col, title, label in SUMMARY_METRICS:
+        if col not in stats.seen or not total.get(col)['n']:
+            continue
+        lines.extend(["", f"## {title}", "",
+                     f"| Category | Subcategory | {label} | N |",
+                     "|----------|-------------|---------|---|"])
+        for cat in CAT_ORDER:
+            subs = [sub for c, sub in stats.groups if c == cat]
+            for sub in sort_sub(subs):
+                group = stats.groups[(cat, sub)]
+                values = group.get(col)
+                if values['n']:
+                    lines.append(f"| {cat} | {sub} | {values['mean']:.2f} | {group.rows} |")
+
+    path.write_text('\n'.join(lines))
+
+
+def write_summaries(cube: SummaryCube) -> int:
+    """Rewrite VALIDATION_SUMMARY.md of every protein in a MolProbity cube."""
+    stats = cube.grouped(['protein', 'category', 'subcategory'], [col for col, _, _ in SUMMARY_METRICS])
+    written = 0
+    for protein in sorted({key[0] for key in stats.groups}):
+        analysis = PROTEINS / protein / "analysis"
+        if not analysis.is_dir():
+            continue
+        per_protein = GroupedStats(['category', 'subcategory'], stats.metrics)
+        per_protein.seen = stats.seen
+        per_protein.groups = {key[1:]: group for key, group in stats.groups.items() if key[0] == protein}
+        write_summary(protein, per_protein, analysis / "VALIDATION_SUMMARY.md")
+        written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the summary cubes of the analysis datasets")
+    parser.add_argument('--rebuild', action='store_true', help='Ignore existing cubes')
+    parser.add_argument('--summaries', action='store_true',
+                        help='Rewrite every VALIDATION_SUMMARY.md from the MolProbity cube')
+    parser.add_argument('--store', type=Path, default=STORE_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Summary Cubes")
+    print("=" * 60)
+    for name in DATASETS:
+        fresh = not args.rebuild and cached_fingerprint(cube_path(name)) == fingerprint(name, args.store)
+        path = ensure_cube(name, args.rebuild, args.store)
+        t0 = time.perf_counter()
+        cube = load_cube(name, root=args.store)
+        elapsed = time.perf_counter() - t0
+        print(f"  {name}: {len(cube.cells)} cells x {len(cube.metrics)} metrics over {cube.rows} rows "
+              f"({path.stat().st_size / 1e3:.0f} kB, {'cached' if fresh else 'rebuilt'}, "
+              f"loads in {1000 * elapsed:.0f} ms)")
+
+    if args.summaries:
+        n = write_summaries(load_cube('molprobity', root=args.store))
+        print(f"\nVALIDATION_SUMMARY.md rewritten for {n} proteins")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Markdown summary tables for the README, computed out of core.
+
+Means are rolled up from the MolProbity summary cube (see summary_cube). The
+quantiles cannot be, so for those the dataset is streamed in chunks through
+per-group running statistics with t-digest quantiles (see streaming_stats),
+and the tables can be regenerated from the full-scale results with bounded
+memory.
+
+Tables:
+    methods     unrelaxed means per prediction method (Phase 1 results table)
+    protocols   median [IQR] clashscore and MolProbity score per method and protocol
+
+Usage:
+    python scripts/summary_tables.py                  # both tables
+    python scripts/summary_tables.py --table methods
+"""
+
+import argparse
+
+import numpy as np
+
+from datasets import aggregate_dataset
+from results_store import BASELINE
+from summary_cube import load_cube
+
+METHODS = [
+    ('Experimental', 'Experimental'),
+    ('AlphaFold', 'AlphaFold 2'),
+    ('Boltz', 'Boltz 1'),
+]
+
+# (column, header, format)
+METHOD_COLUMNS = [
+    ('rama_favored_pct', 'Rama Favored', '{:.1f}%'),
+    ('rota_favored_pct', 'Rota Favored', '{:.1f}%'),
+    ('clashscore', 'Clashscore', '{:.1f}'),
+    ('molprobity_score', 'MP Score', '{:.2f}'),
+    ('bond_rmsz', 'Bond RMSZ', '{:.2f}'),
+    ('angle_rmsz', 'Angle RMSZ', '{:.2f}'),
+]
+
+PROTOCOLS = ['relaxed_normal_beta', 'relaxed_normal_ref15', 'relaxed_cartesian_beta',
+             'relaxed_cartesian_ref15', 'relaxed_dualspace_beta', 'relaxed_dualspace_ref15']
+
+PROTOCOL_COLUMNS = [
+    ('clashscore', 'Clashscore', '{:.1f}'),
+    ('molprobity_score', 'MP Score', '{:.2f}'),
+]
+
+
+def markdown(header: list, rows: list) -> str:
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines += ["| " + " | ".join(row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def fmt(value, spec: str) -> str:
+    return "-" if np.isnan(value) else spec.format(value)
+
+
+def methods_table(stats) -> str:
+    """Mean of each metric over the unrelaxed structures of each method."""
+    rows = []
+    for category, label in METHODS:
+        group = stats.groups.get((category, BASELINE[category]))
+        if group is None:
+            continue
+        rows.append([label] + [fmt(group.get(col)['mean'], spec) for col, _, spec in METHOD_COLUMNS])
+    return markdown(['Method'] + [header for _, header, _ in METHOD_COLUMNS], rows)
+
+
+def protocols_table(stats) -> str:
+    """Median [IQR] per method and protocol, unrelaxed baseline first."""
+    rows = []
+    for category, label in METHODS:
+        for subcategory in [BASELINE[category]] + PROTOCOLS:
+            group = stats.groups.get((category, subcategory))
+            if group is None:
+                continue
+            cells = [label, subcategory.replace('relaxed_', ''), str(group.rows)]
+            for col, _, spec in PROTOCOL_COLUMNS:
+                values = group.get(col)
+                cells.append(f"{fmt(values['median'], spec)} "
+                             f"[{fmt(values['q25'], spec)}, {fmt(values['q75'], spec)}]")
+            rows.append(cells)
+    return markdown(['Method', 'Protocol', 'n'] + [header for _, header, _ in PROTOCOL_COLUMNS], rows)
+
+
+def methods_stats():
+    return load_cube('molprobity').grouped(['category', 'subcategory'],
+                                           [col for col, _, _ in METHOD_COLUMNS])
+
+
+def protocols_stats():
+    return aggregate_dataset('molprobity', ['category', 'subcategory'],
+                             [col for col, _, _ in PROTOCOL_COLUMNS], digest=True)
+
+
+# name -> (title, statistics, table)
+TABLES = {
+    'methods': ('Phase 1 results (unrelaxed means)', methods_stats, methods_table),
+    'protocols': ('Relaxation protocols (median [IQR])', protocols_stats, protocols_table),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the README summary tables")
+    parser.add_argument('--table', choices=list(TABLES), action='append',
+                        help='Table to print (repeatable; default: all)')
+    args = parser.parse_args()
+
+    for name in args.table or list(TABLES):
+        title, stats, build = TABLES[name]
+        print(f"\n### {title}\n")
+        print(build(stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Synthetic protein structures with ideal geometry, for benchmarking.
+
+Each chain is an ideal alpha helix (standard bond lengths and angles, trans
+peptides, L amino acids) of alanine, with every tenth residue a glycine and a
+configurable fraction of aromatic residues (PHE, TYR, TRP, HIS) with flat
+rings. Residues are complete, so a clean structure passes every geometry test
+in posebusters.py. Chains are laid out side by side on a grid, far enough
+apart not to touch.
+
+Clashes are injected by moving the carbonyl O of a residue onto the CA of
+another residue of the same chain, at least three residues away.
+
+Atoms are returned as dicts in the format of posebusters.parse_structure,
+and can be written as a PDB file.
+
+Usage:
+    python scripts/synthetic_structures.py synthetic.pdb --residues 500
+    python scripts/synthetic_structures.py synthetic.pdb --atoms 100000 --aromatic 0.2 --clashes 10
+"""
+
+import argparse
+import string
+from pathlib import Path
+
+import numpy as np
+
+# Ideal backbone geometry (Engh & Huber) and alpha helix torsions, in Å and degrees
+BOND = {('N', 'CA'): 1.458, ('CA', 'C'): 1.525, ('C', 'N'): 1.329, ('C', 'O'): 1.231, ('CA', 'CB'): 1.530}
+ANGLE = {'N-CA-C': 111.2, 'CA-C-N': 116.2, 'C-N-CA': 121.7, 'CA-C-O': 120.5, 'N-CA-CB': 110.5}
+PHI, PSI, OMEGA = -57.8, -47.0, 180.0
+
+# Ring side chains: chi1, chi2 and the ring in its own plane, as (along CB->CG,
+# across) offsets from CG; CB-CG is 1.50 Å and every ring is planar
+CHI1, CHI2 = 180.0, 90.0
+CB_CG = 1.50
+
+AROMATIC_CYCLE = ['PHE', 'TYR', 'TRP', 'HIS']
+GLYCINE_EVERY = 10
+
+# Chains per grid row and the distance between chain axes (helix plus rings
+# reach about 9 Å from the axis)
+GRID_COLUMNS = 8
+CHAIN_SPACING = 24.0
+
+# Longest chain built when the chain count is derived from a size (the helix
+# rises 1.5 Å per residue, and PDB coordinates are limited to 9999.999)
+MAX_CHAIN_RESIDUES = 500
+
+CHAIN_IDS = string.ascii_uppercase + string.ascii_lowercase + string.digits
+
+ELEMENTS = {'N': 'N', 'O': 'O', 'S': 'S'}
+
+
+def polygon(n: int, side: float) -> np.ndarray:
+    """Vertices of a regular n-gon with its first vertex at the origin, extending along +x."""
+    radius = side / (2 * np.sin(np.pi / n))
+    theta = np.pi - 2 * np.pi * np.arange(n) / n
+    return np.column_stack([radius + radius * np.cos(theta), radius * np.sin(theta)])
+
+
+def fused_hexagon(p: np.ndarray, q: np.ndarray, inner: np.ndarray) -> np.ndarray:
+    """The four other vertices of the hexagon on edge p-q away from inner, starting next to q."""
+    mid, edge = (p + q) / 2, q - p
+    normal = np.array([-edge[1], edge[0]]) / np.linalg.norm(edge)
+    if np.dot(normal, mid - inner) < 0:
+        normal = -normal
+    center = mid + normal * np.linalg.norm(edge) * np.sqrt(3) / 2
+    (px, py), (qx, qy) = p - center, q - center
+    step = np.radians(60) * np.sign(px * qy - py * qx)
+    vertices, r = [], q - center
+    for _ in range(4):
+        c, s = np.cos(step), np.sin(step)
+        r = np.array([c * r[0] - s * r[1], s * r[0] + c * r[1]])
+        vertices.append(center + r)
+    return np.array(vertices)
+
+
+def ring_templates() -> dict:
+    """In-plane side chain coordinates beyond CB, with CG at the origin."""
+    hexagon = polygon(6, 1.39)
+    phe = dict(zip(['CG', 'CD1', 'CE1', 'CZ', 'CE2', 'CD2'], hexagon))
+    tyr = dict(phe, OH=hexagon[3] + [1.36, 0.0])
+    his = dict(zip(['CG', 'ND1', 'CE1', 'NE2', 'CD2'], polygon(5, 1.37)))
+    pyrrole = polygon(5, 1.40)
+    trp = dict(zip(['CG', 'CD1', 'NE1', 'CE2', 'CD2'], pyrrole))
+    benzene = fused_hexagon(trp['CE2'], trp['CD2'], pyrrole.mean(axis=0))
+    trp.update(zip(['CE3', 'CZ3', 'CH2', 'CZ2'], benzene))
+    return {'PHE': phe, 'TYR': tyr, 'TRP': trp, 'HIS': his}
+
+
+RINGS = ring_templates()
+
+
+def place(a, b, c, bond: float, angle: float, torsion: float) -> np.ndarray:
+    """Position of d with |cd| = bond, angle b-c-d and torsion a-b-c-d (NeRF)."""
+    angle, torsion = np.radians(angle), np.radians(torsion)
+    bc = (c - b) / np.linalg.norm(c - b)
+    n = np.cross(b - a, bc)
+    n /= np.linalg.norm(n)
+    m = np.cross(n, bc)
+    d = np.array([-bond * np.cos(angle),
+                  bond * np.sin(angle) * np.cos(torsion),
+                  bond * np.sin(angle) * np.sin(torsion)])
+    return c + d[0] * bc + d[1] * m + d[2] * n
+
+
+def sequence(n_residues: int, aromatic_fraction: float) -> list:
+    """Alanines with periodic glycines and evenly spaced aromatic residues."""
+    residues = ['GLY' if i % GLYCINE_EVERY == GLYCINE_EVERY - 1 else 'ALA' for i in range(n_residues)]
+    n_aromatic = int(round(n_residues * aromatic_fraction))
+    if n_aromatic:
+        for k, i in enumerate(np.linspace(0, n_residues, n_aromatic, endpoint=False).astype(int)):
+            residues[i] = AROMATIC_CYCLE[k % len(AROMATIC_CYCLE)]
+    return residues
+
+
+def build_chain(residues: list) -> list:
+    """(resname, {atom name: xyz}) per residue of one ideal helix."""
+    n = np.array([0.0, 0.0, 0.0])
+    ca = np.array([BOND[('N', 'CA')], 0.0, 0.0])
+    c = place(np.array([0.0, 1.0, 0.0]), n, ca, BOND[('CA', 'C')], ANGLE['N-CA-C'], 0.0)
+    chain = []
+    for i, resname in enumerate(residues):
+        if i:
+            prev_n, prev_ca, prev_c = n, ca, c
+            n = place(prev_n, prev_ca, prev_c, BOND[('C', 'N')], ANGLE['CA-C-N'], PSI)
+            ca = place(prev_ca, prev_c, n, BOND[('N', 'CA')], ANGLE['C-N-CA'], OMEGA)
+            c = place(prev_c, n, ca, BOND[('CA', 'C')], ANGLE['N-CA-C'], PHI)
+        atoms = {'N': n, 'CA': ca, 'C': c,
+                 'O': place(n, ca, c, BOND[('C', 'O')], ANGLE['CA-C-O'], PSI + 180.0)}
+        if resname != 'GLY':
+            atoms['CB'] = place(c, n, ca, BOND[('CA', 'CB')], ANGLE['N-CA-CB'], -122.5)
+        if resname in RINGS:
+            cg = place(n, ca, atoms['CB'], CB_CG, 114.0, CHI1)
+            toward = place(ca, atoms['CB'], cg, 1.0, 120.0, CHI2) - cg
+            along = (cg - atoms['CB']) / CB_CG
+            across = toward - np.dot(toward, along) * along
+            across /= np.linalg.norm(across)
+            for name, (x, y) in RINGS[resname].items():
+                atoms[name] = cg + x * along + y * across
+        chain.append((resname, atoms))
+    return chain
+
+
+def align_to_z(chain: list, origin: np.ndarray) -> list:
+    """Move a chain so its helix axis runs along z through origin."""
+    ca = np.array([atoms['CA'] for _, atoms in chain])
+    center = ca.mean(axis=0)
+    axes = np.linalg.svd(ca - center)[2] if len(ca) > 2 else np.eye(3)
+    rotation = axes[[1, 2, 0]]
+    if np.linalg.det(rotation) < 0:
+        rotation[0] = -rotation[0]
+    return [(resname, {name: rotation @ (xyz - center) + origin for name, xyz in atoms.items()})
+            for resname, atoms in chain]
+
+
+def inject_clashes(chains: list, n_clashes: int, rng: np.random.Generator):
+    """Move the O of one residue onto the CA of another, n_clashes times."""
+    for _ in range(n_clashes):
+        chain = chains[rng.integers(len(chains))]
+        if len(chain) < 4:
+            raise ValueError("clashes need chains of at least 4 residues")
+        i = rng.integers(len(chain))
+        j = rng.choice([k for k in range(len(chain)) if abs(k - i) >= 3])
+        direction = rng.normal(size=3)
+        chain[j][1]['O'] = chain[i][1]['CA'] + direction / np.linalg.norm(direction)
+
+
+def synthetic_atoms(n_residues: int, n_chains: int = 1, aromatic_fraction: float = 0.1,
+                    n_clashes: int = 0, seed: int = 0) -> list:
+    """Atoms of an ideal-geometry structure, in the posebusters.parse_structure format.
+
+    n_residues are split as evenly as possible over n_chains; each injected
+    clash makes at least one atom pair overlap by more than 2 Å.
+    """
+    if not 1 <= n_chains <= len(CHAIN_IDS):
+        raise ValueError(f"n_chains must be between 1 and {len(CHAIN_IDS)}")
+    if n_residues < n_chains or n_residues > n_chains * 9999:
+        raise ValueError(f"{n_residues} residues cannot be split over {n_chains} chains")
+    rng = np.random.default_rng(seed)
+
+    chains = []
+    for k, length in enumerate(np.array_split(np.arange(n_residues), n_chains)):
+        origin = CHAIN_SPACING * np.array([k % GRID_COLUMNS, k // GRID_COLUMNS, 0.0])
+        chains.append(align_to_z(build_chain(sequence(len(length), aromatic_fraction)), origin))
+    inject_clashes(chains, n_clashes, rng)
+
+    atoms = []
+    for chain_id, chain in zip(CHAIN_IDS, chains):
+        for resseq, (resname, residue) in enumerate(chain, start=1):
+            for name, xyz in residue.items():
+                atoms.append({'name': name, 'resname': resname, 'chain': chain_id, 'resseq': resseq,
+                              'x': round(float(xyz[0]), 3), 'y': round(float(xyz[1]), 3),
+                              'z': round(float(xyz[2]), 3), 'element': ELEMENTS.get(name[0], 'C')})
+    return atoms
+
+
+def residues_for_atoms(n_atoms: int, aromatic_fraction: float = 0.1) -> int:
+    """Residue count giving about n_atoms atoms at this aromatic fraction."""
+    ring = np.mean([len(RINGS[r]) for r in AROMATIC_CYCLE])
+    plain = 5 - 1 / GLYCINE_EVERY
+    per_residue = (1 - aromatic_fraction) * plain + aromatic_fraction * (5 + ring)
+    return max(1, int(round(n_atoms / per_residue)))
+
+
+def chains_for_residues(n_residues: int) -> int:
+    return -(-n_residues // MAX_CHAIN_RESIDUES)
+
+
+def write_pdb(atoms: list, path):
+    """Write atoms as ATOM records (serial numbers wrap past 99999)."""
+    with open(path, 'w') as f:
+        for serial, a in enumerate(atoms, start=1):
+            name = a['name'] if len(a['name']) == 4 else f" {a['name']}"
+            f.write(f"ATOM  {serial % 100000:>5} {name:<4} {a['resname']:>3} {a['chain']}{a['resseq']:>4}    "
+                    f"{a['x']:>8.3f}{a['y']:>8.3f}{a['z']:>8.3f}{1.0:>6.2f}{0.0:>6.2f}          "
+                    f"{a['element']:>2}\n")
+        f.write("END\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic ideal-geometry structure as PDB")
+    parser.add_argument('output', type=Path)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--residues', type=int, default=100)
+    size.add_argument('--atoms', type=int, help='Approximate atom count (sets --residues)')
+    parser.add_argument('--chains', type=int, help=f'Default: one per {MAX_CHAIN_RESIDUES} residues')
+    parser.add_argument('--aromatic', type=float, default=0.1, help='Fraction of aromatic residues')
+    parser.add_argument('--clashes', type=int, default=0, help='Clashes to inject')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    n_residues = residues_for_atoms(args.atoms, args.aromatic) if args.atoms else args.residues
+    n_chains = args.chains or chains_for_residues(n_residues)
+    atoms = synthetic_atoms(n_residues, n_chains, args.aromatic, args.clashes, args.seed)
+    write_pdb(atoms, args.output)
+    print(f"Wrote {len(atoms)} atoms ({n_residues} residues, {n_chains} chains) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()